@@ -0,0 +1,48 @@
+"""
+Measure the time of ``import pypvcell.solarcell`` in fresh Python processes.
+
+    python benchmarks/bench_import.py
+
+It exits with status 1 if the median import time exceeds ``--target`` seconds (default 0.5).
+The import time of numpy and scipy, about 0.2 s on a typical machine, is included.
+
+"""
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CODE = "import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+
+
+def import_time(module):
+    output = subprocess.check_output([sys.executable, '-c', CODE.format(module=module)], cwd=PACKAGE_DIR)
+    return float(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import time of pypvcell")
+    parser.add_argument('--module', default='pypvcell.solarcell', help="the module to import")
+    parser.add_argument('--repeat', type=int, default=7, help="number of fresh processes")
+    parser.add_argument('--target', type=float, default=0.5, help="the target of the median import time (s)")
+    args = parser.parse_args()
+
+    # The first run warms up the file system cache, and the disk caches if PYPVCELL_CACHE_DIR is set
+    import_time(args.module)
+
+    times = [import_time(args.module) for _ in range(args.repeat)]
+    median = statistics.median(times)
+
+    print("import %s: median %.3f s, min %.3f s, max %.3f s (target %.3f s)" %
+          (args.module, median, min(times), max(times), args.target))
+
+    if median > args.target:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
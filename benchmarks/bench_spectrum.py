@@ -0,0 +1,235 @@
+"""
+Benchmarks of the core operations of pypvcell.spectrum
+
+Run all the benchmarks and print the time per call: ::
+
+    python benchmarks/bench_spectrum.py
+
+Store the results as the new baseline, or compare the results with the stored baseline: ::
+
+    python benchmarks/bench_spectrum.py --save
+    python benchmarks/bench_spectrum.py --compare
+
+``--compare`` exits with status 1 if any benchmark is slower than the baseline by more than ``--threshold``
+(default 1.5, i.e. 50% slower). The timings depend on the machine, so the baseline should be regenerated
+with ``--save`` on the machine that runs the comparison.
+Use ``-k`` to run only the benchmarks whose names contain a given string, e.g. ``-k interp``.
+
+"""
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from pypvcell.spectrum import Spectrum, SpectrumBatch
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline_spectrum.json')
+
+GRID_SIZES = (100, 1000, 10000)
+
+# x range of the test spectra for each family of units
+UNIT_RANGES = {'nm': (300.0, 1800.0),
+               'eV': (0.7, 4.0),
+               'cm**-1': (5500.0, 33000.0),
+               'THz': (170.0, 990.0)}
+
+
+def make_spectrum(size, x_unit='nm', margin=0.0):
+    """
+    Make a smooth spectral density of the given grid size.
+    margin widens the range of x by a fraction of its span on both sides. A spectrum made with a margin has a
+    different grid that covers the one without margin.
+    """
+
+    start, end = UNIT_RANGES[x_unit]
+    span = end - start
+    x = np.linspace(start - margin * span, end + margin * span, num=size)
+    y = 1 + 0.5 * np.sin(x / span * 20)
+
+    return Spectrum(x, y, x_unit=x_unit, y_unit='m**-2', is_spec_density=True, is_photon_flux=False)
+
+
+def benchmarks():
+    """
+    Generate the benchmarks as (name, setup) pairs. setup() returns the function to be timed.
+    """
+
+    for size in GRID_SIZES:
+
+        for x_unit in UNIT_RANGES:
+            def setup(size=size, x_unit=x_unit):
+                start, end = UNIT_RANGES[x_unit]
+                x = np.linspace(start, end, num=size)
+                y = np.ones(size)
+                return lambda: Spectrum(x, y, x_unit=x_unit, y_unit='cm**-2', is_spec_density=True,
+                                        is_photon_flux=True)
+
+            yield 'construct[%s,%d]' % (x_unit, size), setup
+
+        for x_unit in ('nm', 'eV', 'cm**-1'):
+            def setup(size=size, x_unit=x_unit):
+                sp = make_spectrum(size)
+                return lambda: sp.convert_spectrum_unit(sp.core_x, sp.core_y, 'm', x_unit, 'm**-2', 'cm**-2',
+                                                        is_spec_density=True)
+
+            yield 'convert_spectrum_unit[%s,%d]' % (x_unit, size), setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            return lambda: sp.get_spectrum('eV', to_photon_flux=True)
+
+        yield 'get_spectrum[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            x = np.linspace(400, 1700, num=size)
+            return lambda: sp.get_interp_spectrum(x, 'nm', to_photon_flux=True)
+
+        yield 'get_interp_spectrum[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            other = make_spectrum(size, margin=0.1)
+            return lambda: other.get_interp_spectrum(sp.core_x, 'm')
+
+        yield 'get_interp_spectrum_onto_core_x[%d]' % size, setup
+
+        def setup(size=size):
+            sp1 = make_spectrum(size)
+            sp2 = make_spectrum(size, margin=0.1)
+            return lambda: sp1 * sp2
+
+        yield 'mul_mismatched_grid[%d]' % size, setup
+
+        def setup(size=size):
+            sp1 = make_spectrum(size)
+            sp2 = make_spectrum(size, x_unit='eV', margin=0.1)
+            return lambda: sp1 * sp2
+
+        yield 'mul_nm_by_eV[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            return lambda: sp * 2.0
+
+        yield 'mul_scalar[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            return lambda: sp.cut(500, 1200, 'nm')
+
+        yield 'cut[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            return sp.rsum
+
+        yield 'rsum[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            ends = np.linspace(400, 1800, num=100)
+            return lambda: sp.band_integral(300, ends, 'nm', photon_flux=True)
+
+        yield 'band_integral_100_bands[%d]' % size, setup
+
+        def setup(size=size):
+            sp = make_spectrum(size)
+            batch = SpectrumBatch.from_spectra([sp] * 100)
+            return batch.rsum
+
+        yield 'batch_rsum_100_spectra[%d]' % size, setup
+
+
+def time_per_call(func, repeat=5, min_time=0.05):
+    """
+    Get the best time per call of func in seconds
+    """
+
+    timer = timeit.Timer(func)
+
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 4
+
+    return min(timer.repeat(repeat=repeat, number=number)) / number
+
+
+def run(keyword=None):
+    results = {}
+
+    for name, setup in benchmarks():
+        if keyword is not None and keyword not in name:
+            continue
+
+        results[name] = time_per_call(setup())
+        print("%-45s %12.2f us" % (name, results[name] * 1e6))
+
+    return results
+
+
+def compare(results, baseline, threshold):
+    """
+    Compare the results with the baseline and return the names of the benchmarks that regressed
+    """
+
+    regressions = []
+
+    print("\n%-45s %12s %12s %8s" % ('benchmark', 'baseline', 'current', 'ratio'))
+    for name, current in results.items():
+        if name not in baseline:
+            continue
+
+        ratio = current / baseline[name]
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  <-- slower'
+
+        print("%-45s %9.2f us %9.2f us %8.2f%s" % (name, baseline[name] * 1e6, current * 1e6, ratio, flag))
+
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks of pypvcell.spectrum")
+    parser.add_argument('--save', action='store_true', help="store the results as the baseline")
+    parser.add_argument('--compare', action='store_true', help="compare the results with the baseline")
+    parser.add_argument('--threshold', type=float, default=1.5,
+                        help="the ratio to the baseline time that counts as a regression")
+    parser.add_argument('--baseline', default=BASELINE_FILE, help="the baseline file")
+    parser.add_argument('-k', dest='keyword', default=None, help="only run the benchmarks that contain this string")
+    args = parser.parse_args()
+
+    results = run(args.keyword)
+
+    if args.save:
+        baseline = {}
+        if args.keyword is not None and os.path.exists(args.baseline):
+            with open(args.baseline) as fp:
+                baseline = json.load(fp)
+        baseline.update(results)
+
+        with open(args.baseline, 'w') as fp:
+            json.dump(baseline, fp, indent=2, sort_keys=True)
+        print("\nSaved the baseline to %s" % args.baseline)
+
+    if args.compare:
+        with open(args.baseline) as fp:
+            baseline = json.load(fp)
+
+        regressions = compare(results, baseline, args.threshold)
+        if regressions:
+            print("\n%d benchmark(s) slower than %.2fx of the baseline: %s" %
+                  (len(regressions), args.threshold, ', '.join(regressions)))
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -21,7 +21,7 @@ import copy
 from .illumination import Illumination
 from .fom import voc
 from .ivsolver import calculate_j01, \
-    gen_rec_iv_with_rs_by_newton, solve_mj_iv, \
+    gen_rec_iv_with_rs_by_lambertw, solve_mj_iv, \
     calculate_j01_from_qe, gen_rec_iv_by_rad_eta, solve_ms_mj_iv
 from .fom import max_power
 from .photocurrent import gen_step_qe, calc_jsc, calc_jsc_from_eg
@@ -115,7 +115,7 @@ def extract_voc(voltage, current, qe, spectrum="AM1.5g"):
     return voc(voltage, gen_current)
 
 
-def calc_ere(qe, voc, T=300, ill=Illumination("AM1.5g"), verbose=0):
+def calc_ere(qe, voc, T=300, ill=None, verbose=0):
     """
     Calculate external radiative efficiency based on Martin Green's paper
     [1]	M. A. Green, “Radiative efficiency of state-of-the-art photovoltaic cells,”
@@ -124,10 +124,13 @@ def calc_ere(qe, voc, T=300, ill=Illumination("AM1.5g"), verbose=0):
     :param qe: input EQE, a spectrum_base object
     :param voc: Voc of the test cell
     :param T: test tempearture of the cell, default is 300 K
-    :param ill: illumination object, default is AM1.5d@1x
+    :param ill: illumination object, default is AM1.5g@1x
     :return: the calculated value of ERE
     """
 
+    if ill is None:
+        ill = Illumination("AM1.5g")
+
     jsc = calc_jsc(ill, qe)
 
     if verbose>0:
@@ -247,8 +250,8 @@ def calc_mj_eta(subcell_eg, subcell_qe, subcell_rad_eff, cell_temperature, conce
 
     # with series resistance, add the resistance to the first junction
     if rs > 0:
-        iv_list[0] = gen_rec_iv_with_rs_by_newton(subcell_j01[0], subcell_j02[0], \
-                                                  1, 2, cell_temperature, 1e15, rs, subcell_voltage, subcell_jsc[0])
+        iv_list[0] = gen_rec_iv_with_rs_by_lambertw(subcell_j01[0] / subcell_rad_eff[0], 0, \
+                                                    1, 2, cell_temperature, 1e15, rs, subcell_voltage, subcell_jsc[0])
 
     # plt.plot(iv_list[0][0],iv_list[0][1],'o')
     # plt.show()
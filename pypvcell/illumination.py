@@ -15,8 +15,12 @@
 """
 import numpy as np
 import os
+import sys
+import tempfile
+import zipfile
 import scipy.constants as sc
-from .spectrum import Spectrum
+from collections import OrderedDict, namedtuple
+from .spectrum import Spectrum, SpectrumBatch, _get_conversion_plan, _cache_dir
 import warnings
 
 
@@ -37,10 +41,84 @@ def load_default_spectrum(fname1, fname2):
     return cache_spectrum
 
 
-# Read default spectrum
 this_dir = os.path.split(__file__)[0]
-spec_data = load_default_spectrum(os.path.join(this_dir, "astmg173.csv"),
-                                  os.path.join(this_dir, "am15d.dat"))
+
+# Binary cache of the default spectra, generated the first time the text files are parsed. It is only used if a
+# cache directory is set by the environment variable PYPVCELL_CACHE_DIR.
+_spec_data_files = (os.path.join(this_dir, "astmg173.csv"), os.path.join(this_dir, "am15d.dat"))
+_spec_data_cache_file = None if _cache_dir() is None else os.path.join(_cache_dir(), "default_spectrum_cache.npz")
+
+_spec_data = None
+
+
+def _get_spec_data():
+    """
+    Get the default spectra. They are read when they are needed for the first time instead of at import time.
+    If PYPVCELL_CACHE_DIR is set, the parsed spectra are saved in a binary file in that directory, which is loaded
+    instead of the text files if it is newer than them.
+
+    :return: a dict of {spectrum name: (L, 2) array of wavelength (nm) and flux (W/m^2-nm)}
+    """
+
+    global _spec_data
+
+    if _spec_data is not None:
+        return _spec_data
+
+    if _spec_data_cache_file is None:
+        _spec_data = load_default_spectrum(*_spec_data_files)
+        return _spec_data
+
+    try:
+        cache_mtime = os.path.getmtime(_spec_data_cache_file)
+        if all(os.path.getmtime(fname) <= cache_mtime for fname in _spec_data_files):
+            with np.load(_spec_data_cache_file, allow_pickle=False) as data:
+                _spec_data = {name: data[name] for name in data.files}
+            return _spec_data
+    except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile):
+        # a missing or broken cache is rebuilt from the text files
+        pass
+
+    _spec_data = load_default_spectrum(*_spec_data_files)
+
+    _write_spec_data_cache(_spec_data)
+
+    return _spec_data
+
+
+def _write_spec_data_cache(spec_data):
+    """
+    Save the parsed default spectra into the cache file. The data are written into a temporary file in the same
+    directory, which then replaces the cache file, so that other processes never see a partially written cache.
+    """
+
+    cache_dir = os.path.dirname(_spec_data_cache_file)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(suffix='.npz.tmp', dir=cache_dir)
+    except OSError:
+        # e.g. the cache directory is not writable
+        return
+
+    try:
+        with os.fdopen(fd, 'wb') as fp:
+            np.savez(fp, **spec_data)
+        # mkstemp() creates the file readable by the owner only
+        os.chmod(tmp_name, 0o644)
+        os.replace(tmp_name, _spec_data_cache_file)
+    except OSError:
+        try:
+            os.remove(tmp_name)
+        except OSError:
+            pass
+
+
+def __getattr__(name):
+    # spec_data used to be read at import time. Keep it accessible as a module attribute.
+    if name == 'spec_data':
+        return _get_spec_data()
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
 
 
 def load_blackbody(T=6000, normalize_to=None):
@@ -71,6 +149,49 @@ def load_blackbody(T=6000, normalize_to=None):
     return sp * factor
 
 
+def load_blackbody_batch(T, normalize_to=None, x_data=None, x_unit='nm'):
+    """
+    Load the Blackbody spectra of many temperatures at once.
+    All the spectra are evaluated in one vectorized expression of Planck's law in wavelength, i.e.,
+    2*pi*h*c^2/wl^5/(exp(h*c/(wl*k*T))-1) in W/m^2/m, on a common grid.
+
+    :param T: temperatures (K), a scalar or an 1D array of N temperatures
+    :param normalize_to: the values in W/m^2 that the output spectra are normalized to, a scalar or an array of N
+        values. Set to None if no renormalization is required.
+    :param x_data: the grid of x. Default is the same grid as ``load_blackbody()``, from 20 nm to 1980 nm in steps
+        of 20 nm.
+    :param x_unit: the unit of x_data, e.g. 'nm', 'eV'
+    :return: SpectrumBatch of N spectra
+    """
+
+    T = np.atleast_1d(np.asarray(T, dtype=float))
+    if T.ndim != 1:
+        raise ValueError("T should be a scalar or an 1D array")
+
+    if x_data is None:
+        x_data = np.arange(20, 2000, step=20)
+        x_unit = 'nm'
+
+    # Convert x to wavelength in m in ascending order
+    x_data = np.asarray(x_data, dtype=float)
+    wl, _ = _get_conversion_plan(x_unit, 'm', '', '', False).apply(x_data, x_data)
+    wl = np.sort(wl)
+
+    # Spectral irradiance of Blackbody in W/m^2-m. exp() overflows at short wavelengths and low temperatures,
+    # where the irradiance is zero anyway.
+    with np.errstate(over='ignore'):
+        blackbody_i = 2 * sc.pi * sc.h * sc.c ** 2 / np.power(wl, 5) / np.expm1(
+            sc.h * sc.c / (sc.k * np.outer(T, wl)))
+
+    batch = SpectrumBatch(wl, blackbody_i, x_unit='m', y_unit='m**-2', is_spec_density=True, is_photon_flux=False)
+
+    if normalize_to is not None:
+        factor = np.asarray(normalize_to, dtype=float) / batch.rsum()
+        batch = batch * factor[:, np.newaxis]
+
+    return batch
+
+
 def load_astm(spec_type="AM1.5g"):
     """
     Load ASTMG173-03 spectrum
@@ -79,6 +200,8 @@ def load_astm(spec_type="AM1.5g"):
     :return: designated ASTM ``Spectrum``
     """
 
+    spec_data = _get_spec_data()
+
     if spec_type in spec_data.keys():
         flux = spec_data[spec_type]
         sp = Spectrum(flux[:, 0], flux[:, 1], x_unit='nm', y_unit='m**-2',
@@ -101,7 +224,7 @@ class Illumination(Spectrum):
 
         warnings.warn("Illumination class will be deprecated in future version.", DeprecationWarning)
 
-        flux = spec_data[spectrum]
+        flux = _get_spec_data()[spectrum]
 
         Spectrum.__init__(self, flux[:, 0], flux[:, 1] * concentration, 'nm',
                           y_unit='m**-2', is_photon_flux=False, is_spec_density=True)
@@ -151,5 +274,279 @@ class material_filter(Spectrum):
         Spectrum.__init__(self, abs_spec[0, :], attenuation, 'm')
 
 
+def bp_filter_batch(edges_in_eV, f_type="high_pass", OD=2, energy_bound=(0.5, 6)):
+    """
+    Create the band pass filters of many edges at once. Row i of the batch is the same filter as
+    ``BpFilter(edges_in_eV[i], f_type, OD[i], energy_bound)``, but all the filters are put on a common grid that has
+    the transition points of every filter, so that they can be applied to an illumination in one multiplication: ::
+
+        filtered = ill * bp_filter_batch(np.linspace(1.0, 2.0, num=1000), energy_bound=(0.3, 6))
+
+    The transmission is constant outside the transitions. Like the grid of BpFilter, the grid starts at
+    energy_bound[0] and does not include energy_bound[1]. It ends at the last grid point of the filter with the
+    lowest edge, so that the batch covers exactly the energies that every BpFilter covers.
+
+    :param edges_in_eV: the cutoff energies (in eV) of the filters, a scalar or an 1D array
+    :param f_type: high_pass or low_pass. high_pass: photons with energy higher than band edge passes.
+    :param OD: optical density for attenuation, a scalar or an array of the same length as edges_in_eV
+    :param energy_bound: the bound of photon energies
+    :return: SpectrumBatch of the transmission of the filters
+    """
+
+    edges = np.atleast_1d(np.asarray(edges_in_eV, dtype=float))
+    attenuation = np.power(10, -np.broadcast_to(np.asarray(OD, dtype=float), edges.shape))
+
+    # The transmission of a filter changes linearly (in wavelength) between the two points of its grid around the
+    # edge, see BpFilter
+    if f_type == "high_pass":
+        lower = edges
+        upper = edges + 0.01
+        t_lower, t_upper = attenuation, np.ones_like(attenuation)
+    elif f_type == "low_pass":
+        lower = edges - (edges - energy_bound[0]) / 99
+        upper = edges
+        t_lower, t_upper = np.ones_like(attenuation), attenuation
+    else:
+        raise ValueError("f_type should be high_pass or low_pass")
+
+    # The last point of np.linspace(edge + 0.01, energy_bound[1], num=100, endpoint=False) in BpFilter
+    start = edges.min() + 0.01
+    end = 99 * ((energy_bound[1] - start) / 100) + start
+
+    energy = np.unique(np.concatenate(([energy_bound[0], end], lower, upper)))
+    energy = energy[energy <= end]
+
+    # Fraction of the transition in wavelength, which is proportional to 1/energy
+    fraction = (1 / energy - 1 / lower[:, np.newaxis]) / (1 / upper - 1 / lower)[:, np.newaxis]
+    fraction = np.clip(fraction, 0, 1)
+
+    transmission = t_lower[:, np.newaxis] + fraction * (t_upper - t_lower)[:, np.newaxis]
+
+    return SpectrumBatch(energy, transmission, x_unit='eV')
+
+
+def material_filter_batch(material_abs, thicknesses):
+    """
+    Create the filters of a material with many thicknesses at once. Row i of the batch is the same filter as
+    ``material_filter(material_abs, thicknesses[i])``.
+
+    :param material_abs: absorption coefficient of the material
+    :type material_abs: Spectrum
+    :param thicknesses: the thicknesses, a scalar or an 1D array. The unit is the inverse of the unit of material_abs.
+    :return: SpectrumBatch of the transmission of the filters
+    """
+
+    assert isinstance(material_abs, Spectrum)
+
+    abs_spec = material_abs.get_spectrum(to_x_unit='m')
+
+    thicknesses = np.atleast_1d(np.asarray(thicknesses, dtype=float))
+    attenuation = np.exp(-np.outer(thicknesses, abs_spec[1, :]))
+
+    return SpectrumBatch(abs_spec[0, :], attenuation, x_unit='m')
+
+
+RegistryInfo = namedtuple('RegistryInfo', ['spectra', 'hits', 'misses', 'entries', 'nbytes', 'max_bytes'])
+
+
+def _nbytes(value):
+    """
+    Estimate the memory used by a cached value
+    """
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    elif isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    else:
+        return sys.getsizeof(value)
+
+
+class SpectrumRegistry(object):
+    """
+    A registry of spectra identified by the fingerprints of their data, together with an LRU cache of the results
+    derived from them.
+
+    ``add()`` returns the registered spectrum with the same data if there is one, so loading the same spectrum from
+    many places keeps only one copy. The derived results, e.g. ``photon_flux()``, ``cumulative_integral()`` and
+    ``total_power()``, are cached by the fingerprint of the spectrum, so they are computed only once for identical
+    spectra even if they are different objects. The cache holds at most max_bytes of arrays and max_entries
+    results, and evicts the least recently used results beyond that. Only the derived results are evicted: the
+    registered spectra are not counted against max_bytes or max_entries, and the registry keeps them alive until they
+    are unregistered by ``remove()``. Example: ::
+
+        registry = SpectrumRegistry(max_bytes=16 * 2 ** 20)
+        ill = registry.add(load_astm("AM1.5g"))
+        power = registry.total_power(ill)
+        nm, flux = registry.photon_flux(ill, 'nm')
+
+    """
+
+    def __init__(self, max_bytes=64 * 2 ** 20, max_entries=None):
+        """
+        :param max_bytes: the memory limit (in bytes) of the cached derived results
+        :param max_entries: the maximum number of cached derived results. None for no limit.
+        """
+
+        self.max_bytes = max_bytes
+        self.max_entries = max_entries
+
+        self._spectra = OrderedDict()
+        self._results = OrderedDict()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def add(self, spectrum):
+        """
+        Register a spectrum.
+
+        :param spectrum: the spectrum to register
+        :type spectrum: Spectrum
+        :return: the registered spectrum with the same fingerprint, which is spectrum itself if it is new
+        :rtype: Spectrum
+        """
+
+        if not isinstance(spectrum, Spectrum):
+            raise TypeError("spectrum should be an instance of Spectrum")
+
+        return self._spectra.setdefault(spectrum.fingerprint(), spectrum)
+
+    def get(self, fingerprint):
+        """
+        Get the registered spectrum of a fingerprint
+
+        :param fingerprint: the fingerprint returned by ``Spectrum.fingerprint()``
+        :return: the registered spectrum, or None if no spectrum has this fingerprint
+        """
+
+        return self._spectra.get(fingerprint)
+
+    def remove(self, spectrum):
+        """
+        Unregister a spectrum and drop its cached results
+        """
+
+        fp = spectrum.fingerprint()
+        self._spectra.pop(fp, None)
+
+        for key in [key for key in self._results if key[0] == fp]:
+            self._nbytes -= self._results.pop(key)[1]
+
+    def __contains__(self, spectrum):
+
+        return spectrum.fingerprint() in self._spectra
+
+    def __len__(self):
+
+        return len(self._spectra)
+
+    def derived(self, spectrum, name, func):
+        """
+        Get a result derived from the spectrum, computing it with func(spectrum) on a cache miss.
+        The result should not be changed in place, since it is shared by all the spectra with the same data.
+
+        :param spectrum: the spectrum. It does not have to be registered.
+        :type spectrum: Spectrum
+        :param name: a hashable name of the result, e.g. ('photon_flux', 'nm')
+        :param func: the function that computes the result from the spectrum
+        :return: the cached or computed result
+        """
+
+        key = (spectrum.fingerprint(), name)
+
+        entry = self._results.get(key)
+        if entry is not None:
+            self._results.move_to_end(key)
+            self._hits += 1
+            return entry[0]
+
+        self._misses += 1
+        value = func(spectrum)
+        size = _nbytes(value)
+
+        # Do not cache the results that are larger than the whole cache
+        if size <= self.max_bytes:
+            self._results[key] = (value, size)
+            self._nbytes += size
+            self._evict()
+
+        return value
+
+    def _evict(self):
+
+        while self._results and (self._nbytes > self.max_bytes or
+                                 (self.max_entries is not None and len(self._results) > self.max_entries)):
+            _, (_, size) = self._results.popitem(last=False)
+            self._nbytes -= size
+
+    def photon_flux(self, spectrum, x_unit='nm', y_area_unit='m**-2'):
+        """
+        Get the photon flux of the spectrum
+
+        :param spectrum: the spectrum
+        :param x_unit: the unit of x
+        :param y_area_unit: the unit of area of y
+        :return: a tuple of read-only arrays (x, photon_flux), sorted by x
+        """
+
+        def func(sp):
+            view = sp.get_spectrum(x_unit, y_area_unit, to_photon_flux=True)
+            return view[0], view[1]
+
+        return self.derived(spectrum, ('photon_flux', x_unit, y_area_unit), func)
+
+    def cumulative_integral(self, spectrum, x_unit='eV', photon_flux=True):
+        """
+        Get the cumulative integral of the spectrum, i.e., the integral of y from the smallest x up to each x.
+
+        :param spectrum: the spectrum
+        :param x_unit: the unit of x
+        :param photon_flux: True if integrating the photon flux
+        :return: a tuple of read-only arrays (x, cumulative integral), sorted by x
+        """
+
+        def func(sp):
+            x, _, _, prefix = sp._prefix_table(x_unit, photon_flux)
+            return x, prefix
+
+        return self.derived(spectrum, ('cumulative_integral', x_unit, photon_flux), func)
+
+    def total_power(self, spectrum):
+        """
+        Get the integral of the spectrum, e.g. the total power (W/m^2) of an illumination spectrum
+
+        :param spectrum: the spectrum
+        :return: the value of ``spectrum.rsum()``
+        """
+
+        return self.derived(spectrum, 'total_power', lambda sp: sp.rsum())
+
+    def cache_info(self):
+        """
+        Get the statistics of the registry
+
+        :return: a RegistryInfo of the number of registered spectra, cache hits, cache misses, cached results,
+            the memory used by the cached results and the memory limit
+        """
+
+        return RegistryInfo(len(self._spectra), self._hits, self._misses, len(self._results), self._nbytes,
+                            self.max_bytes)
+
+    def clear(self):
+        """
+        Unregister all the spectra and clear the cached results
+        """
+
+        self._spectra.clear()
+        self._results.clear()
+        self._nbytes = 0
+        self._hits = 0
+        self._misses = 0
+
+
+#: The default registry of pypvcell
+spectrum_registry = SpectrumRegistry()
+
+
 if __name__ == "__main__":
     pass
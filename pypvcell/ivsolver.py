@@ -29,8 +29,9 @@ from typing import List, Tuple, Callable,Iterable
 import numpy as np
 from scipy.interpolate import interp1d
 from scipy.optimize import newton_krylov, bisect
+from scipy.special import lambertw, bernoulli, zeta, factorial
 import scipy.constants as sc
-from .spectrum import Spectrum
+from .spectrum import Spectrum, _array_key, _freeze, _LRUCache
 from .fom import max_power
 
 
@@ -198,10 +199,475 @@ def gen_rec_iv_with_rs_by_newton(j01, j02, n1, n2, temperature, rshunt, rseries,
     return voltage, np.array(solved_current)
 
 
+# exponents are clipped at this value to avoid overflow
+_max_exponent = 700.0
+
+
+def _lambertw_exp(z):
+    """
+    Calculate W(exp(z)) of the principal branch of the Lambert W function without evaluating exp(z),
+    so that it does not overflow for large z.
+
+    :param z: the log of the argument of W (scalar or array)
+    :return: W(exp(z))
+    """
+
+    z = np.asarray(z, dtype=np.float64)
+    w = np.empty_like(z)
+
+    small = z < 500
+    w[small] = lambertw(np.exp(z[small])).real
+
+    # solve w+log(w)=z by Newton's method, starting from the asymptotic expansion of W
+    zl = z[~small]
+    wl = zl - np.log(zl)
+    for _ in range(4):
+        wl -= (wl + np.log(wl) - zl) / (1 + 1 / wl)
+    w[~small] = wl
+
+    return w
+
+
+def _log_lambertw_exp(z, w):
+    """
+    Calculate log(W(exp(z))) from z and w=W(exp(z)).
+    log(W)=z-W holds exactly, and is used where W is too small to take the log of it.
+    """
+
+    return np.where(z > 1, np.log(np.maximum(w, 1e-300)), z - w)
+
+
+def one_diode_j_from_v(j01, n1, temperature, rshunt, rseries, voltage, jsc=0):
+    """
+    Solve the current of a one-diode model with series and shunt resistances at the given voltages, i.e.
+    J=j01*(exp(q(V-J*Rs)/(n1*kT))-1)+(V-J*Rs)/Rsh-Jsc, with the explicit Lambert-W solution.
+    The parameters can be arrays that broadcast against voltage.
+
+    :param j01: saturation current density [A/m^2]
+    :param n1: ideality factor
+    :param temperature: temperature [K]
+    :param rshunt: shunt resistance [ohm m^2]. It can be np.inf.
+    :param rseries: series resistance [ohm m^2]
+    :param voltage: an array of voltages
+    :param jsc: [A/m^2], positive value if photocurrent is generated
+    :return: voltage, current
+    """
+
+    voltage = np.asarray(voltage, dtype=np.float64)
+    rseries = np.asarray(rseries, dtype=np.float64)
+    shape = np.broadcast_shapes(voltage.shape, np.shape(j01), np.shape(n1), np.shape(temperature),
+                                np.shape(rshunt), rseries.shape, np.shape(jsc))
+    vt = n1 * sc.k * temperature / sc.e
+    g = 1.0 / np.asarray(rshunt, dtype=np.float64)
+
+    current = j01 * np.expm1(np.minimum(voltage / vt, _max_exponent)) + voltage * g - jsc
+
+    if np.any(rseries > 0):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            # the current without the exponential term
+            k = (voltage * g - j01 - jsc) / (1 + rseries * g)
+
+            log_theta = np.log(rseries * j01 / (vt * (1 + rseries * g))) + (voltage - rseries * k) / vt
+
+            current = np.where(rseries > 0, k + vt / rseries * _lambertw_exp(log_theta), current)
+
+    # rseries is not used above if it is all zero, but the current still has its shape
+    if current.shape != shape:
+        current = np.broadcast_to(current, shape).copy()
+
+    return voltage, current
+
+
+def one_diode_v_from_j(j01, n1, temperature, rshunt, rseries, current, jsc=0):
+    """
+    Solve the voltage of a one-diode model with series and shunt resistances at the given currents.
+    This is the inverse of one_diode_j_from_v(). The voltage is NaN if the current is below the
+    reverse saturation limit -(jsc+j01) of a cell without shunt resistance.
+    The parameters can be arrays that broadcast against current.
+
+    :param j01: saturation current density [A/m^2]
+    :param n1: ideality factor
+    :param temperature: temperature [K]
+    :param rshunt: shunt resistance [ohm m^2]. It can be np.inf.
+    :param rseries: series resistance [ohm m^2]
+    :param current: an array of currents
+    :param jsc: [A/m^2], positive value if photocurrent is generated
+    :return: voltage, current
+    """
+
+    current = np.asarray(current, dtype=np.float64)
+    vt = n1 * sc.k * temperature / sc.e
+    g = 1.0 / np.asarray(rshunt, dtype=np.float64)
+
+    # the current through the diode and the shunt
+    s = current + jsc + j01
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        junction_v = np.where(s > 0, vt * np.log(s / j01), np.nan)
+
+        if np.any(g > 0):
+            z = np.log(j01 / (g * vt)) + s / (g * vt)
+            # V=s/g-vt*W(exp(z)) is rewritten as vt*log(g*vt*W/j01) to avoid the cancellation when g is small
+            shunt_v = vt * (np.log(g * vt / j01) + _log_lambertw_exp(z, _lambertw_exp(z)))
+            junction_v = np.where(g > 0, shunt_v, junction_v)
+
+    return junction_v + rseries * current, current
+
+
+def _two_diode_current(j01, j02, vt1, vt2, g, jsc, junction_v):
+    """
+    Calculate the current of a two-diode model and its derivative with respect to the junction voltage
+    """
+
+    e1 = j01 * np.exp(np.minimum(junction_v / vt1, _max_exponent))
+    e2 = j02 * np.exp(np.minimum(junction_v / vt2, _max_exponent))
+
+    current = (e1 - j01) + (e2 - j02) + junction_v * g - jsc
+    derivative = e1 / vt1 + e2 / vt2 + g
+
+    return current, derivative
+
+
+def _two_diode_params(shape, j01, j02, n1, n2, temperature, rshunt, rseries, jsc):
+    """
+    Broadcast the parameters of a two-diode model to the shape of the solution, and flatten them.
+
+    :return: j01, j02, vt1, vt2, g, rseries, jsc as 1D arrays
+    """
+
+    vt1 = n1 * sc.k * temperature / sc.e
+    vt2 = n2 * sc.k * temperature / sc.e
+    g = 1.0 / np.asarray(rshunt, dtype=np.float64)
+
+    return [np.broadcast_to(np.asarray(p, dtype=np.float64), shape).ravel()
+            for p in (j01, j02, vt1, vt2, g, rseries, jsc)]
+
+
+def _solve_junction_voltage(func, x_init, xtol=1e-12, maxiter=100):
+    """
+    Solve func(x)=0 for an array of x with Newton's method. func returns the value and the derivative.
+    The functions solved here are increasing and convex, so the iterations approach the roots monotonically
+    after the first step.
+    """
+
+    x = np.array(x_init, dtype=np.float64)
+    active = np.flatnonzero(np.isfinite(x))
+
+    for _ in range(maxiter):
+        if active.size == 0:
+            break
+
+        f, fp = func(x[active], active)
+        dx = f / fp
+        x[active] -= dx
+
+        converged = ~(np.abs(dx) > xtol * (1 + np.abs(x[active])))
+        active = active[~converged]
+
+    return x
+
+
+def gen_rec_iv_with_rs_by_lambertw(j01, j02, n1, n2, temperature, rshunt, rseries, voltage, jsc=0):
+    """
+    Solve the current of a two-diode model with series and shunt resistances at the given voltages, i.e.
+    J=j01*(exp(q(V-J*Rs)/(n1*kT))-1)+j02*(exp(q(V-J*Rs)/(n2*kT))-1)+(V-J*Rs)/Rsh-Jsc.
+    This uses the explicit Lambert-W solution where j02 is zero. Otherwise, the Lambert-W solution of the
+    j01 diode is the initial guess of Newton's method that solves all the voltages at once.
+    The parameters can be arrays that broadcast against voltage.
+
+    :param j01: saturation current density of the first diode [A/m^2]
+    :param j02: saturation current density of the second diode [A/m^2]
+    :param n1: ideality factor of the first diode
+    :param n2: ideality factor of the second diode
+    :param temperature: temperature [K]
+    :param rshunt: shunt resistance [ohm m^2]. It can be np.inf.
+    :param rseries: series resistance [ohm m^2]
+    :param voltage: an array of voltages
+    :param jsc: [A/m^2], positive value if photocurrent is generated
+    :return: voltage, current
+    """
+
+    voltage, current = one_diode_j_from_v(j01, n1, temperature, rshunt, rseries, voltage, jsc)
+
+    if np.all(np.asarray(j02) == 0):
+        return voltage, current
+
+    shape = np.broadcast_shapes(current.shape, np.shape(j01), np.shape(j02), np.shape(n1), np.shape(n2),
+                                np.shape(temperature), np.shape(rshunt), np.shape(rseries), np.shape(jsc))
+    j01, j02, vt1, vt2, g, rseries, jsc = _two_diode_params(shape, j01, j02, n1, n2, temperature, rshunt,
+                                                            rseries, jsc)
+    flat_v = np.broadcast_to(voltage, shape).ravel()
+
+    def func(x, index):
+        j, jp = _two_diode_current(j01[index], j02[index], vt1[index], vt2[index], g[index], jsc[index], x)
+        return x + rseries[index] * j - flat_v[index], 1 + rseries[index] * jp
+
+    junction_v = _solve_junction_voltage(func, flat_v - rseries * np.broadcast_to(current, shape).ravel())
+    current, _ = _two_diode_current(j01, j02, vt1, vt2, g, jsc, junction_v)
+
+    return voltage, current.reshape(shape)
+
+
+def solve_v_from_j_with_rs(j01, j02, n1, n2, temperature, rshunt, rseries, current, jsc=0):
+    """
+    Solve the voltage of a two-diode model with series and shunt resistances at the given currents.
+    This is the inverse of gen_rec_iv_with_rs_by_lambertw(). The voltage is NaN if the current is below
+    the reverse saturation limit of a cell without shunt resistance.
+    The parameters can be arrays that broadcast against current.
+
+    :param j01: saturation current density of the first diode [A/m^2]
+    :param j02: saturation current density of the second diode [A/m^2]
+    :param n1: ideality factor of the first diode
+    :param n2: ideality factor of the second diode
+    :param temperature: temperature [K]
+    :param rshunt: shunt resistance [ohm m^2]. It can be np.inf.
+    :param rseries: series resistance [ohm m^2]
+    :param current: an array of currents
+    :param jsc: [A/m^2], positive value if photocurrent is generated
+    :return: voltage, current
+    """
+
+    if np.all(np.asarray(j02) == 0):
+        return one_diode_v_from_j(j01, n1, temperature, rshunt, rseries, current, jsc)
+
+    current = np.asarray(current, dtype=np.float64)
+    shape = np.broadcast_shapes(current.shape, np.shape(j01), np.shape(j02), np.shape(n1), np.shape(n2),
+                                np.shape(temperature), np.shape(rshunt), np.shape(rseries), np.shape(jsc))
+    j01, j02, vt1, vt2, g, rseries, jsc = _two_diode_params(shape, j01, j02, n1, n2, temperature, rshunt,
+                                                            rseries, jsc)
+    flat_j = np.broadcast_to(current, shape).ravel()
+
+    # The junction voltage of each diode alone (without the shunt) is above the root when the diode current
+    # is positive, and zero is above the root otherwise.
+    s = flat_j + jsc
+    with np.errstate(divide='ignore', invalid='ignore'):
+        x_init = np.where(s > 0, np.minimum(vt1 * np.log1p(s / j01), vt2 * np.log1p(s / j02)), 0.0)
+    x_init[(g == 0) & (s + j01 + j02 <= 0)] = np.nan
+
+    def func(x, index):
+        j, jp = _two_diode_current(j01[index], j02[index], vt1[index], vt2[index], g[index], jsc[index], x)
+        return j - flat_j[index], jp
+
+    junction_v = _solve_junction_voltage(func, x_init)
+
+    return (junction_v + rseries * flat_j).reshape(shape), current
+
+
+def _batch_params(params):
+    """
+    Turn scalars or arrays of shape (N,) into arrays of shape (N,1) that broadcast against a grid of shape (M,)
+    """
+
+    return [np.atleast_1d(np.asarray(p, dtype=np.float64))[:, np.newaxis] for p in params]
+
+
+def gen_rec_iv_batch(j01, j02, n1, n2, temperature, rshunt, rseries, voltage, jsc=0):
+    """
+    Generate the I-V characteristics of N two-diode models on a common voltage grid at once,
+    e.g. the cells of a fleet of modules. Each parameter is either a scalar or an array of shape (N,).
+    Use j02=0 and j01/rad_eta as j01 for the models of gen_rec_iv_by_rad_eta().
+
+    :param j01: saturation current densities of the first diode [A/m^2]
+    :param j02: saturation current densities of the second diode [A/m^2]
+    :param n1: ideality factors of the first diode
+    :param n2: ideality factors of the second diode
+    :param temperature: temperatures [K]
+    :param rshunt: shunt resistances [ohm m^2]. They can be np.inf.
+    :param rseries: series resistances [ohm m^2]
+    :param voltage: voltage grid of shape (M,)
+    :param jsc: [A/m^2], positive value if photocurrent is generated
+    :return: voltage, current of shape (N,M)
+    """
+
+    voltage = np.asarray(voltage, dtype=np.float64)
+    params = _batch_params((j01, j02, n1, n2, temperature, rshunt, rseries, jsc))
+    shape = np.broadcast_shapes(voltage.shape, *[p.shape for p in params])
+
+    j01, j02, n1, n2, temperature, rshunt, rseries, jsc = params
+    _, current = gen_rec_iv_with_rs_by_lambertw(j01, j02, n1, n2, temperature, rshunt, rseries, voltage, jsc)
+
+    return voltage, np.broadcast_to(current, shape).copy()
+
+
+def solve_v_from_j_batch(j01, j02, n1, n2, temperature, rshunt, rseries, current, jsc=0):
+    """
+    Solve the voltages of N two-diode models on a common current grid at once.
+    This is the inverse of gen_rec_iv_batch(). Each parameter is either a scalar or an array of shape (N,).
+
+    :param j01: saturation current densities of the first diode [A/m^2]
+    :param j02: saturation current densities of the second diode [A/m^2]
+    :param n1: ideality factors of the first diode
+    :param n2: ideality factors of the second diode
+    :param temperature: temperatures [K]
+    :param rshunt: shunt resistances [ohm m^2]. They can be np.inf.
+    :param rseries: series resistances [ohm m^2]
+    :param current: current grid of shape (M,)
+    :param jsc: [A/m^2], positive value if photocurrent is generated
+    :return: voltage of shape (N,M), current
+    """
+
+    current = np.asarray(current, dtype=np.float64)
+    params = _batch_params((j01, j02, n1, n2, temperature, rshunt, rseries, jsc))
+    shape = np.broadcast_shapes(current.shape, *[p.shape for p in params])
+
+    j01, j02, n1, n2, temperature, rshunt, rseries, jsc = params
+    voltage, _ = solve_v_from_j_with_rs(j01, j02, n1, n2, temperature, rshunt, rseries, current, jsc)
+
+    return np.broadcast_to(voltage, shape).copy(), current
+
+
 j01_lead_term = np.power(sc.e, 4) * 2 * sc.pi / (np.power(sc.c, 2) * np.power(sc.h, 3))
 
 
-def calculate_j01_from_qe(qe: Spectrum, n_c=3.5, n_s=1, threshold=1e-3, step_in_ev=1e-5, lead_term=None, T=300):
+# B_j/j! of the Bernoulli series t/(exp(t)-1)=sum_j B_j t^j/j!, which converges for |t|<2*pi
+_bernoulli_coefficients = bernoulli(40) / factorial(np.arange(41))
+
+# the number of Gauss-Legendre nodes used to integrate the Planck kernel over a narrow interval
+_gauss_legendre_nodes, _gauss_legendre_weights = np.polynomial.legendre.leggauss(6)
+
+_planck_weight_cache = _LRUCache(maxsize=256)
+
+_j01_cache = _LRUCache(maxsize=1024)
+
+
+def _bose_einstein_tail(n, x):
+    """
+    Calculate the upper tail of the Bose-Einstein integral for x>=0, i.e. G_n(x), the integral of t^n/(exp(t)-1)
+    from x to infinity.
+    It is the sum of exp(-kx) series for x>=2, and the zeta function minus the Bernoulli series of the lower
+    part for x<2.
+
+    :param n: the power of t
+    :param x: an array of the lower limits of the integration
+    :return: G_n(x)
+    """
+
+    x = np.asarray(x, dtype=np.float64)
+    g = np.empty_like(x)
+
+    # The integral of t^n*exp(-kt) from x to infinity is n!*exp(-kx)*sum_m (kx)^m/m!/k^(n+1).
+    # Each x stops adding terms once the next one is below exp(-40) of the first term, which takes
+    # at most 20 terms for x>=2.
+    large = x >= 2
+    xl = x[large]
+    gl = np.zeros_like(xl)
+    coefficients = 1 / factorial(np.arange(n + 1))
+    active = np.arange(xl.size)
+    for k in range(1, 21):
+        y = k * xl[active]
+        gl[active] += np.exp(-y) * np.polynomial.polynomial.polyval(y, coefficients) / k ** (n + 1)
+        active = active[y < 40]
+        if active.size == 0:
+            break
+    g[large] = factorial(n) * gl
+
+    # t^n/(exp(t)-1) = sum_j B_j t^(n+j-1)/j!
+    xs = x[~large]
+    j = np.arange(_bernoulli_coefficients.size)
+    lower = np.polynomial.polynomial.polyval(xs, _bernoulli_coefficients / (n + j)) * np.power(xs, n)
+    g[~large] = factorial(n) * zeta(n + 1) - lower
+
+    return g
+
+
+def _planck_interval_weights(e_a, e_b, v_t):
+    """
+    Integrate the Planck kernel E^2/(exp(E/kT)-1) times the two linear interpolation basis functions over each
+    interval [e_a, e_b], i.e. the integrals of (e_b-E)/(e_b-e_a)*K(E) and (E-e_a)/(e_b-e_a)*K(E).
+    Intervals narrower than kT are integrated by Gauss-Legendre quadrature. The wide ones are integrated
+    exactly with the differences of _bose_einstein_tail(), which lose precision for narrow intervals.
+
+    :param e_a: an array of the lower ends of the intervals in eV
+    :param e_b: an array of the upper ends of the intervals in eV
+    :param v_t: kT in eV
+    :return: the weights of the lower ends and the upper ends
+    """
+
+    e_a = np.asarray(e_a, dtype=np.float64)
+    e_b = np.asarray(e_b, dtype=np.float64)
+    width = e_b - e_a
+
+    w_a = np.empty_like(width)
+    w_b = np.empty_like(width)
+
+    narrow = width <= v_t
+    t = (_gauss_legendre_nodes + 1) / 2
+    energy = e_a[narrow, np.newaxis] + width[narrow, np.newaxis] * t
+    with np.errstate(over='ignore'):
+        kernel = np.power(energy, 2) / np.expm1(energy / v_t) * (_gauss_legendre_weights / 2)
+    w_a[narrow] = width[narrow] * np.dot(kernel, 1 - t)
+    w_b[narrow] = width[narrow] * np.dot(kernel, t)
+
+    xa = e_a[~narrow] / v_t
+    xb = e_b[~narrow] / v_t
+    i2 = v_t ** 3 * (_bose_einstein_tail(2, xa) - _bose_einstein_tail(2, xb))
+    i3 = v_t ** 4 * (_bose_einstein_tail(3, xa) - _bose_einstein_tail(3, xb))
+    w_a[~narrow] = (e_b[~narrow] * i2 - i3) / width[~narrow]
+    w_b[~narrow] = (i3 - e_a[~narrow] * i2) / width[~narrow]
+
+    return w_a, w_b
+
+
+def _planck_weights(energy, T):
+    """
+    Get the Planck kernel weights of each interval of an energy grid. See _planck_interval_weights().
+    The results are cached by the temperature and the fingerprint of the grid.
+
+    :param energy: a sorted energy grid in eV
+    :param T: temperature in Kelvin
+    :return: the weights of the lower ends and the upper ends of the intervals (read-only)
+    """
+
+    key = (_array_key(energy), T)
+
+    entry = _planck_weight_cache.get(key)
+    if entry is None:
+        w_a, w_b = _planck_interval_weights(energy[:-1], energy[1:], sc.k * T / sc.e)
+
+        # keep energy, so that the key stays valid
+        entry = (_freeze(w_a), _freeze(w_b), energy)
+        _planck_weight_cache.put(key, entry)
+
+    return entry[0], entry[1]
+
+
+def _integrate_qe_planck(energy, qe, T, threshold):
+    """
+    Integrate the linear interpolant of QE times E^2/(exp(E/kT)-1) exactly, leaving out the part where
+    the QE is not larger than the threshold.
+
+    :param energy: a sorted energy grid in eV
+    :param qe: QE on the energy grid
+    :param T: temperature in Kelvin
+    :param threshold: ignore the QE whose values are under the threshold
+    :return: the integral in eV^3
+    """
+
+    w_a, w_b = _planck_weights(energy, T)
+
+    above = qe > threshold
+    full = above[:-1] & above[1:]
+    total = np.dot(qe[:-1][full], w_a[full]) + np.dot(qe[1:][full], w_b[full])
+
+    # the intervals that cross the threshold are integrated from the crossing point
+    cross = np.flatnonzero(above[:-1] != above[1:])
+    if cross.size > 0:
+        e_a, e_b = energy[cross], energy[cross + 1]
+        q_a, q_b = qe[cross], qe[cross + 1]
+        e_c = e_a + (threshold - q_a) * (e_b - e_a) / (q_b - q_a)
+
+        rising = q_b > q_a
+        e_a, q_a = np.where(rising, e_c, e_a), np.where(rising, threshold, q_a)
+        e_b, q_b = np.where(rising, e_b, e_c), np.where(rising, q_b, threshold)
+
+        c_a, c_b = _planck_interval_weights(e_a, e_b, sc.k * T / sc.e)
+        total += np.dot(q_a, c_a) + np.dot(q_b, c_b)
+
+    return total
+
+
+def calculate_j01_from_qe(qe: Spectrum, n_c=3.5, n_s=1, threshold=1e-3, step_in_ev=1e-5, lead_term=None, T=300,
+                          method='exact'):
     r"""
     Calculate j01 from known absorptivity or QE using the following expression:
     
@@ -219,8 +685,12 @@ def calculate_j01_from_qe(qe: Spectrum, n_c=3.5, n_s=1, threshold=1e-3, step_in_
     :type qe: Spectrum
     :param threshold: ignore the QE whose values are under the threshold
     :type threshold: float
-    :param step_in_ev: meshgrid size when doing numerical integration trapz()
+    :param step_in_ev: meshgrid size when doing numerical integration trapz(). Only used by method='trapz'.
     :type step_in_ev: float 
+    :param method: 'exact' integrates the linearly interpolated QE (in eV) exactly against the cached Planck kernel
+        weights of the QE grid, and memoizes the results by the fingerprint of the QE.
+        'trapz' interpolates the QE onto a grid of step_in_ev and integrates it by trapz().
+    :type method: str
     :return: j01
     :rtype: float
     """
@@ -237,6 +707,18 @@ def calculate_j01_from_qe(qe: Spectrum, n_c=3.5, n_s=1, threshold=1e-3, step_in_
 
     qe_a = qe.get_spectrum(to_x_unit='eV')
 
+    if method == 'exact':
+        key = (_array_key(qe_a[0, :]), _array_key(qe_a[1, :]), threshold, T)
+        entry = _j01_cache.get(key)
+        if entry is None:
+            # keep qe_a, so that the key stays valid
+            entry = (_integrate_qe_planck(qe_a[0, :], qe_a[1, :], T, threshold), qe_a)
+            _j01_cache.put(key, entry)
+
+        return lead_term * entry[0]
+    elif method != 'trapz':
+        raise ValueError("method should be 'exact' or 'trapz'")
+
     qe_a = qe.get_interp_spectrum(np.arange(np.min(qe_a[0, :]), np.max(qe_a[0, :]), step=step_in_ev), 'eV')
 
     qe_a = qe_a[:, qe_a[1, :] > threshold]
@@ -269,20 +751,29 @@ def get_v_from_j(voltage, current, target_current):
     return interp(target_current)
 
 
-def calculate_j01(eg_in_ev, temperature, n1, n_c=3.5, n_s=1, approx=False):
+_j01_from_eg_cache = _LRUCache(maxsize=4096)
+
+
+def calculate_j01(eg_in_ev, temperature, n1, n_c=3.5, n_s=1, approx=False, exact=False):
     r"""
     Calculate the saturation radiative recombination current J01 from known band gap using the following expression:
     
     .. math::
-        J_{01}=\frac{2\pi q (n_c^2+n_s^2)}{\mbox{h}^3 \mbox{c}^2}\int_{0}^{E_g} \frac{E^2 dE}{\exp\left(\frac{E}{kT}\right)-1}
+        J_{01}=\frac{2\pi q (n_c^2+n_s^2)}{\mbox{h}^3 \mbox{c}^2}\int_{E_g}^{\infty} \frac{E^2 dE}{\exp\left(\frac{E}{kT}\right)-1}
     
     
-    If the parameter ``approx`` is set True, it uses an approximation of the above equation to calculate J01:
+    By default, it uses the Boltzmann approximation of the above equation to calculate J01:
     
     
     .. math::
         J_{01}=\frac{2\pi k T q(n_c^2+n_s^2)}{\mbox{h}^3\mbox{c}^2}\exp(\frac{-E_g}{nkT})\left(E_g^2+2E_gkT+2k^2T^2\right)
     
+    If the parameter ``approx`` is set True, it only keeps the term :math:`E_g^2` in the parentheses.
+    If the parameter ``exact`` is set True, it evaluates the full Bose-Einstein integral instead.
+    
+    The parameters eg_in_ev, temperature, n1, n_c and n_s can be numpy arrays that broadcast together.
+    The results of scalar parameters are memoized.
+    
 
     :param eg_in_ev: band gap in eV
     :type eg_in_ev: float
@@ -296,13 +787,38 @@ def calculate_j01(eg_in_ev, temperature, n1, n_c=3.5, n_s=1, approx=False):
     :type n_s: float
     :param approx: Set ``true`` to use approximation    
     :type approx: bool
+    :param exact: Set ``true`` to evaluate the full Bose-Einstein integral. ``approx`` is ignored in this case.
+    :type exact: bool
     :return: the value of J01
-    :rtype: float
+    :rtype: float or numpy.ndarray
+    """
+
+    if all(isinstance(p, (int, float, np.number)) or np.ndim(p) == 0 for p in (eg_in_ev, temperature, n1, n_c, n_s)):
+        key = (float(eg_in_ev), float(temperature), float(n1), float(n_c), float(n_s), bool(approx), bool(exact))
+        j01 = _j01_from_eg_cache.get(key)
+        if j01 is None:
+            j01 = float(_calculate_j01(*key))
+            _j01_from_eg_cache.put(key, j01)
+        return j01
+
+    return _calculate_j01(np.asarray(eg_in_ev, dtype=np.float64), np.asarray(temperature, dtype=np.float64),
+                          np.asarray(n1, dtype=np.float64), np.asarray(n_c, dtype=np.float64),
+                          np.asarray(n_s, dtype=np.float64), approx, exact)
+
+
+def _calculate_j01(eg_in_ev, temperature, n1, n_c, n_s, approx, exact):
+    """
+    Calculate J01 from band gap. See calculate_j01().
     """
 
     eg = eg_in_ev * sc.e
     Term1 = 2 * sc.pi * (n_c ** 2 + n_s ** 2) * sc.e / (
             np.power(sc.h, 3) * np.power(sc.c, 2))
+    if exact:
+        # the Boltzmann approximation below is the first term of the exp(-kx) series of the Bose-Einstein integral
+        x = eg / (sc.k * temperature)
+        return Term1 * np.power(sc.k * temperature, 3) * _bose_einstein_tail(2, x) * np.exp(x - x / n1)
+
     Term2 = sc.k * temperature * np.exp(-eg / (n1 * sc.k * temperature))
     if approx == False:
         Term3 = np.power(eg, 2) + (2 * eg * sc.k * temperature) + (2 * np.power(sc.k, 2) * np.power(temperature, 2))
@@ -610,14 +1126,78 @@ def solve_iv_range_obj(subcells: List, i_min, i_max, disc_num=1000):
 
     return voltage_sum, current_range
 
+def find_root_bracket(func: Callable[[np.ndarray], np.ndarray], target, x_min, x_max,
+                      xtol=2e-12, rtol=8.881784197001252e-16, maxiter=100):
+    """
+    Solve func(x)=target for an array of targets at once by bisection, e.g. solve V from an array of J with an
+    I(V) function. Each element takes the same steps as scipy.optimize.bisect() and stops when it converges,
+    but each iteration evaluates func only once, on the array of the elements that have not converged yet.
+    func should therefore take and return numpy arrays.
+
+    :param func: a vectorized function f(x)
+    :param target: an array of the values of f to be solved
+    :param x_min: the lower end of the bracket (scalar or array)
+    :param x_max: the upper end of the bracket (scalar or array)
+    :param xtol: absolute tolerance of x, the same as scipy.optimize.bisect()
+    :param rtol: relative tolerance of x, the same as scipy.optimize.bisect()
+    :param maxiter: maximum number of iterations
+    :return: an array of the solved x in the shape of target. It is NaN if func(x)-target does not change sign
+        between x_min and x_max.
+    """
+
+    target = np.asarray(target, dtype=np.float64)
+    shape = target.shape
+    target = target.ravel()
+
+    xa = np.array(np.broadcast_to(x_min, shape), dtype=np.float64).ravel()
+    xb = np.array(np.broadcast_to(x_max, shape), dtype=np.float64).ravel()
+
+    fa = func(xa) - target
+    fb = func(xb) - target
+
+    roots = np.full(target.size, np.nan)
+    roots[fb == 0] = xb[fb == 0]
+    roots[fa == 0] = xa[fa == 0]
+
+    # the elements that are being solved
+    active = np.flatnonzero(np.sign(fa) * np.sign(fb) < 0)
+
+    dm = xb - xa
+    xm = xa[active]
+    for _ in range(maxiter):
+        if active.size == 0:
+            break
+
+        dm[active] *= 0.5
+        xm = xa[active] + dm[active]
+        fm = func(xm) - target[active]
+
+        # move the lower end of the bracket if f(xm) has the same sign as f(xa)
+        move = np.sign(fm) * np.sign(fa[active]) >= 0
+        xa[active[move]] = xm[move]
+
+        converged = (fm == 0) | (np.abs(dm[active]) < xtol + rtol * np.abs(xm))
+        roots[active[converged]] = xm[converged]
+        active = active[~converged]
+        xm = xm[~converged]
+
+    roots[active] = xm
+
+    return roots.reshape(shape)
+
+
 def solve_v_from_j_adding_epsilon(iv_func:Callable[[np.ndarray],np.ndarray],
-                                  current:np.ndarray,equation_solver_func,epsilon):
+                                  current:np.ndarray,equation_solver_func,epsilon,v_min=-23,v_max=5):
     """
 
     :param iv_func: a I(V) function
     :param current: an array of current that needs to be solved
-    :param equation_solver_func: bisect, newton, or other scipy solvers
+    :param equation_solver_func: bisect, newton, or other scipy solvers. Pass ``find_root_bracket`` to solve all the
+        currents at once by bisection, which gives the same results as bisect. iv_func should then take and return
+        numpy arrays. If iv_func raises ValueError, the currents are solved one by one with bisect instead.
     :param epsilon: small offset added to current. The solver will solve current*(1+epsilon) and current*(1-epsilon)
+    :param v_min: the lower end of the voltage range
+    :param v_max: the upper end of the voltage range
     :return: a 2xN [voltage,current] array
     """
 
@@ -629,12 +1209,30 @@ def solve_v_from_j_adding_epsilon(iv_func:Callable[[np.ndarray],np.ndarray],
         ratio=[1-epsilon,1+epsilon]
     else:
         ratio=[1]
+
+    if equation_solver_func is find_root_bracket:
+        jj = np.ravel(np.outer(current, ratio))
+        try:
+            solved_v = find_root_bracket(iv_func, jj, v_min, v_max)
+        except ValueError:
+            # iv_func cannot evaluate some of the voltages. Solve the currents one by one, so that only the currents
+            # that run into the error are dropped.
+            equation_solver_func = bisect
+        else:
+            found = ~np.isnan(solved_v)
+            for j0 in jj[~found]:
+                print("no solution found for {}".format(j0))
+
+            if not np.any(found):
+                return np.array(solved_iv_pair)
+
+            return np.stack((solved_v[found], jj[found]), axis=-1)
+
     for j1 in current:
         for r in ratio:
             jj = j1 * r
             try:
-                # TODO the voltage range is hard-coded here. Should be modified.
-                solved_iv_pair.append((equation_solver_func(eqn_func, -23, 5, args=jj), jj))
+                solved_iv_pair.append((equation_solver_func(eqn_func, v_min, v_max, args=jj), jj))
             except ValueError:
                 print("no solution found for {}".format(jj))
 
@@ -644,6 +1242,31 @@ def solve_v_from_j_adding_epsilon(iv_func:Callable[[np.ndarray],np.ndarray],
 
 def solve_v_from_j_by_bracket_root_finding(iv_func: Callable[[np.ndarray], np.ndarray], current: np.ndarray,
                                            v_range_min: float, v_range_max: float, root_finding_func):
+    """
+    Solve the voltages of an array of currents from an I(V) function
+
+    :param iv_func: a I(V) function
+    :param current: an array of current that needs to be solved
+    :param v_range_min: the lower end of the voltage range
+    :param v_range_max: the upper end of the voltage range
+    :param root_finding_func: a bracketed scipy solver, such as bisect or brentq. Pass ``find_root_bracket`` to solve
+        all the currents at once by bisection, which gives the same results as bisect. iv_func should then take and
+        return numpy arrays. If iv_func raises ValueError, the currents are solved one by one with bisect instead.
+    :return: a 2xN [voltage,current] array
+    """
+
+    if root_finding_func is find_root_bracket and np.size(current) > 0:
+        current = np.asarray(current, dtype=np.float64)
+        try:
+            solved_v = find_root_bracket(iv_func, current, v_range_min, v_range_max)
+        except ValueError:
+            root_finding_func = bisect
+        else:
+            if np.any(np.isnan(solved_v)):
+                raise ValueError("f(a) and f(b) must have different signs")
+
+            return np.stack((solved_v, current), axis=0)
+
     def eqn_func(x, j0):
         return iv_func(x) - j0
 
@@ -673,6 +1296,17 @@ def _add_epsilon(j_to_solve:np.ndarray,epsilon:float)->np.ndarray:
 
 def solve_series_connected_ivs(iv_funcs:Iterable[Callable[[np.ndarray],np.ndarray]],
                                vmin: float, vmax: float, vnum: int = 20, return_subcell_iv=False, add_epsilon=0.01):
+    """
+    Solve the I-V of series-connected cells by solving the voltage of each cell at the same currents
+
+    :param iv_funcs: a list of I(V) functions of the cells
+    :param vmin: the minimum voltage for sampling the currents to be solved
+    :param vmax: the maximum voltage for sampling the currents to be solved
+    :param vnum: the number of voltages for sampling the currents to be solved
+    :param return_subcell_iv: True if also returning the I-V of each cell
+    :param add_epsilon: the relative offset added to the currents to be solved, see ``solve_v_from_j_adding_epsilon()``
+    :return: a 2xN [voltage,current] array, and the I-Vs of the cells if return_subcell_iv is True
+    """
 
     junc_num=len(iv_funcs)
     j_to_solve=np.empty((junc_num,vnum))
@@ -691,7 +1325,7 @@ def solve_series_connected_ivs(iv_funcs:Iterable[Callable[[np.ndarray],np.ndarra
     # solve the voltage from each current value
     subcell_ivs = []
     for v_idx, iv in enumerate(iv_funcs):
-        iv_values=solve_v_from_j_adding_epsilon(iv,j_to_solve,bisect,epsilon=0)
+        iv_values=solve_v_from_j_adding_epsilon(iv,j_to_solve,find_root_bracket,epsilon=0)
         solved_v[v_idx,:]=iv_values[:,0]
         subcell_ivs.append(iv_values.T)
 
@@ -17,7 +17,39 @@ from typing import Tuple, List
 import numpy as np
 import scipy.constants as sc
 from pypvcell.illumination import Illumination
-from pypvcell.spectrum import Spectrum, _energy_to_length
+from pypvcell.spectrum import Spectrum, SpectrumBatch, _array_key, _freeze, _LRUCache, _energy_to_photon_flux, \
+    _get_conversion_plan, get_resampler
+
+_merged_grid_cache = _LRUCache(maxsize=256)
+
+
+def _merge_grids(ix, qx):
+    """
+    Merge two grids into a sorted grid that covers the intersection of their ranges.
+    The results are cached by the fingerprints of the two grids.
+
+    :param ix: a sorted grid
+    :param qx: another sorted grid
+    :return: the merged grid (read-only)
+    """
+
+    key = (_array_key(ix), _array_key(qx))
+
+    entry = _merged_grid_cache.get(key)
+    if entry is None:
+        lower_bound = max([ix[0], qx[0]])
+        upper_bound = min([ix[-1], qx[-1]])
+
+        new_x = np.concatenate((ix, qx))
+        new_x = np.sort(new_x)
+        new_x = new_x[(new_x > lower_bound) & (new_x < upper_bound)]
+        new_x = np.concatenate(([lower_bound], new_x, [upper_bound]))
+
+        # keep ix and qx, so that the key stays valid
+        entry = (_freeze(new_x), ix, qx)
+        _merged_grid_cache.put(key, entry)
+
+    return entry[0]
 
 
 def gen_step_qe_array(bandEdge_in_eV, qe_in_ratio, qe_below_edge=1e-3, wl_bound=(0.01, 5)):
@@ -84,6 +116,38 @@ def gen_sub_qe_array(eg1, qe1, eg2, qe2,
     return qe
 
 
+def _absorption_matrix(absorption):
+    """
+    Interpolate the absorption coefficients of the layers onto the grid of the first layer
+
+    :param absorption: a list of absorption coefficients (Spectrum) of the layers, in 1/m
+    :return: a tuple (x, alpha). x is the sorted wavelengths of the first layer in m, and alpha is an
+        (n_layers, L) array
+    """
+
+    standard_x, y = absorption[0].get_spectrum('m')
+
+    alpha = np.empty((len(absorption), standard_x.size))
+    for idx in range(len(absorption)):
+        x, alpha[idx] = absorption[idx].get_interp_spectrum(standard_x, to_x_unit='m')
+
+    return standard_x, alpha
+
+
+def _thickness_matrix(layer_thicknesses):
+    """
+    Broadcast the thicknesses of the layers against each other
+
+    :param layer_thicknesses: a list of the thicknesses of each layer. Each item can be a scalar or an array.
+    :return: a tuple (shape, t). shape is the broadcast shape of the thicknesses, and t is an (n_combinations,
+        n_layers) array of the thicknesses.
+    """
+
+    thicknesses = np.broadcast_arrays(*[np.asarray(t, dtype=np.float64) for t in layer_thicknesses])
+
+    return thicknesses[0].shape, np.stack([t.ravel() for t in thicknesses], axis=-1)
+
+
 def lambert_abs(absorption: List[Spectrum], layer_thicknesses: List[float]):
     """
     Calculate transmission of stacked layers using Beer-Lambert's law
@@ -95,17 +159,35 @@ def lambert_abs(absorption: List[Spectrum], layer_thicknesses: List[float]):
 
     assert len(absorption) == len(layer_thicknesses)
 
-    standard_x, y = absorption[0].get_spectrum('m')
-
-    term = np.zeros_like(y)
-    for idx in range(len(absorption)):
-        x, y = absorption[idx].get_interp_spectrum(standard_x, to_x_unit='m')
-        term += y * layer_thicknesses[idx]
+    standard_x, alpha = _absorption_matrix(absorption)
 
-    t = np.exp(-term)
+    t = np.exp(-np.dot(layer_thicknesses, alpha))
     return t
 
 
+def lambert_abs_sweep(absorption: List[Spectrum], layer_thicknesses):
+    """
+    Calculate the transmission of stacked layers for many combinations of layer thicknesses using Beer-Lambert's law.
+
+    The thicknesses of the layers are broadcast against each other. For example, pass
+    ``[t1[:, np.newaxis], t2[np.newaxis, :]]`` to sweep all the combinations of t1 and t2,
+    or ``[t1, t2]`` to sweep the pairs (t1[i], t2[i]).
+
+    :param absorption: a list of absorption coefficients (Spectrum) of the layers, the unit of absorption should be 1/m
+    :param layer_thicknesses: a list of the thicknesses (m) of each layer. Each item can be a scalar or an array.
+    :return: the transmission in an array of shape (*S, L), where S is the broadcast shape of the thicknesses and L
+        is the number of wavelengths of ``absorption[0].get_spectrum('m')``.
+    """
+
+    assert len(absorption) == len(layer_thicknesses)
+
+    standard_x, alpha = _absorption_matrix(absorption)
+    shape, thickness = _thickness_matrix(layer_thicknesses)
+
+    t = np.exp(-np.dot(thickness, alpha))
+    return t.reshape(shape + (standard_x.size,))
+
+
 def conv_abs_to_qe(absorption, layer_thickness):
     """
     Calculate the QE (absorptivity) from absorption coefficient and layer_thickness
@@ -114,9 +196,10 @@ def conv_abs_to_qe(absorption, layer_thickness):
 
     :param absorption: Spectrum class instance, the unit of absorption: 1/m
     :type absorption: Spectrum
-    :param layer_thickness: layer thickness, unit: m
+    :param layer_thickness: layer thickness, unit: m. If it is a 1D array of thicknesses, the QEs of
+        all the thicknesses are returned as a SpectrumBatch.
     :type layer_thickness: float
-    :return: QE, a Spectrum class instance
+    :return: QE, a Spectrum class instance, or a SpectrumBatch if layer_thickness is an array
     :rtype: Spectrum
     """
 
@@ -125,6 +208,10 @@ def conv_abs_to_qe(absorption, layer_thickness):
 
     wl, alpha = absorption.get_spectrum('m')
 
+    if np.ndim(layer_thickness) > 0:
+        abty = -np.expm1(-np.outer(layer_thickness, alpha))
+        return SpectrumBatch(wl, abty, x_unit='m')
+
     abty = 1 - np.exp(-alpha * layer_thickness)
 
     qe = Spectrum(x_data=wl, y_data=abty, x_unit='m')
@@ -149,20 +236,19 @@ def calc_jsc(input_illumination, qe):
     if not isinstance(qe, Spectrum):
         raise TypeError("qe should be an instance of Spectrum class")
 
+    # Jsc is linear in the illumination. For a scaled view, e.g. the illumination at a concentration,
+    # use the unscaled illumination and its cached results.
+    scale = input_illumination.scale
+    input_illumination = input_illumination.unscaled()
+
     # initialise a QE interp object
 
     ix, _ = input_illumination.get_spectrum(to_x_unit='m')
     qx, _ = qe.get_spectrum(to_x_unit='m')
 
-    lower_bound = max([ix[0], qx[0]])
-    upper_bound = min([ix[-1], qx[-1]])
-
     # Rearrange the new x-axis. This procedure ensures that the new wavelength range is the intersection of
     # illumination spectrum and qe
-    new_x = np.concatenate((ix, qx))
-    new_x = np.sort(new_x)
-    new_x = new_x[(new_x > lower_bound) & (new_x < upper_bound)]
-    new_x = np.concatenate(([lower_bound], new_x, [upper_bound]))
+    new_x = _merge_grids(ix, qx)
 
     ill_array = input_illumination.get_interp_spectrum(new_x, to_x_unit='m', to_y_area_unit='m**-2',
                                                        to_photon_flux=True,
@@ -170,31 +256,322 @@ def calc_jsc(input_illumination, qe):
 
     qe_array = qe.get_interp_spectrum(new_x, to_x_unit='m')
 
-    return sc.e * np.trapz(ill_array[1, :] * qe_array[1, :], ill_array[0, :])
+    return scale * sc.e * np.trapz(ill_array[1, :] * qe_array[1, :], ill_array[0, :])
+
+
+def _spectra_list(spectra):
+    """
+    Wrap a single Spectrum or SpectrumBatch into a list, and check the types of the items.
+    """
+
+    if isinstance(spectra, (Spectrum, SpectrumBatch)):
+        spectra = [spectra]
+
+    for sp in spectra:
+        if not isinstance(sp, (Spectrum, SpectrumBatch)):
+            raise TypeError("The spectra should be instances of Spectrum or SpectrumBatch")
+
+    return list(spectra)
+
+
+def _sample_qe(qes, grid):
+    """
+    Sample the QEs on a grid in m. Each interval of the grid that is not within the range of a QE is masked out.
+
+    :param qes: a list of Spectrum or SpectrumBatch
+    :param grid: a sorted grid of wavelengths in m
+    :return: a tuple (values, mask). values is an (n_qe, M) array, and mask is an (n_qe, M-1) boolean array
+    """
+
+    values = []
+    masks = []
+    for qe in qes:
+        qx = np.sort(qe.core_x)
+        _, y = qe.get_interp_spectrum(grid, 'm', raise_error=False)
+        y = np.atleast_2d(y)
+        mask = (grid[:-1] >= qx[0]) & (grid[1:] <= qx[-1])
+
+        values.append(y)
+        masks.append(np.broadcast_to(mask, (y.shape[0], mask.size)))
+
+    return np.vstack(values), np.vstack(masks)
+
+
+def _jsc_weights(input_illumination, qes, qe_grid):
+    """
+    Calculate the weights W of the photocurrents of the QEs on the grid of an illumination, so that
+    sc.e * W.dot(core_y.T) is the Jsc of each QE under each spectrum of the illumination.
+
+    :param input_illumination: a Spectrum or a SpectrumBatch
+    :param qes: a list of Spectrum or SpectrumBatch
+    :param qe_grid: the union of the grids of the QEs in m
+    :return: an (n_qe, L) array, where L is the size of core_x of the illumination
+    """
+
+    order = np.argsort(input_illumination.core_x)
+    ix = input_illumination.core_x[order]
+
+    # The range of integration is the intersection of the illumination and each QE, as in calc_jsc()
+    lower_bound = max(ix[0], qe_grid[0])
+    upper_bound = min(ix[-1], qe_grid[-1])
+    grid = np.unique(np.concatenate((ix, qe_grid)))
+    grid = grid[(grid >= lower_bound) & (grid <= upper_bound)]
+
+    n_qe = sum(np.atleast_2d(qe.core_y).shape[0] for qe in qes)
+    weights = np.zeros((n_qe, ix.size))
+    if grid.size < 2:
+        return weights
+
+    qe, mask = _sample_qe(qes, grid)
+
+    # The trapezoidal rule on interval k is dx_k/2*(f_k+f_(k+1)). An interval only contributes if it is within
+    # the range of the QE.
+    half_dx = mask * (np.diff(grid) / 2)
+    node_weights = np.zeros_like(qe)
+    node_weights[:, :-1] += qe[:, :-1] * half_dx
+    node_weights[:, 1:] += qe[:, 1:] * half_dx
+
+    # The illumination on the grid is a linear interpolation of the illumination on its own grid, so that the
+    # weights are carried back to its own grid by the transpose of the interpolation
+    weights[:, order] = get_resampler(ix, grid).transpose_dot(node_weights)
+
+    # core_y is energy flux per m**-2 (or per the area unit). Fold the conversion to photon flux into the weights.
+    plan = _get_conversion_plan('m', 'm', input_illumination.y_area_unit, 'm**-2',
+                                input_illumination.is_spec_density)
+    weights *= _energy_to_photon_flux(input_illumination.core_x, plan.y_factor)
+
+    return weights
+
+
+def calc_jsc_matrix(input_illuminations, qes):
+    """
+    Calculate the Jsc of every QE under every illumination, e.g. the Jsc of all the subcells under the hourly spectra
+    of a year.
+
+    The QEs are sampled once on the union of their grids and the grid of each illumination. Each pair of QE and
+    illumination is integrated with the trapezoidal rule over the intersection of their ranges, as in ``calc_jsc()``.
+    The integration and the interpolation are linear in the illumination, so that they are folded into a matrix of
+    weights on the grid of the illumination, and the Jsc of a whole SpectrumBatch is a single matrix product
+    with its ``core_y``.
+
+    The results are the same as ``calc_jsc()`` when the QEs share the same grid. Otherwise, the common grid is finer
+    than the merged grid of each pair, and the results differ from ``calc_jsc()`` by the discretization error of the
+    trapezoidal rule.
+
+    :param input_illuminations: the illuminations, a Spectrum, a SpectrumBatch, or a list of them
+    :param qes: the QEs, a Spectrum, a SpectrumBatch, or a list of them
+    :return: an (n_qe, n_illumination) array of Jsc (A/m^2)
+    """
+
+    input_illuminations = _spectra_list(input_illuminations)
+    qes = _spectra_list(qes)
+
+    qe_grid = np.unique(np.concatenate([qe.core_x for qe in qes]))
+
+    columns = []
+    for ill in input_illuminations:
+        weights = _jsc_weights(ill, qes, qe_grid)
+        columns.append(weights.dot(np.atleast_2d(ill.core_y).T))
+
+    return sc.e * np.hstack(columns)
+
+
+def _jsc_weight_vector(input_illumination, qe_x):
+    """
+    Calculate the weights v on a QE grid, so that sc.e * v.dot(qe_y) is equal to calc_jsc() of the QE (qe_x, qe_y).
+    The trapezoidal rule on the merged grid and the interpolation of the QE onto it are both linear in qe_y.
+
+    :param input_illumination: illumination spectrum
+    :param qe_x: the sorted wavelengths of the QE in m
+    :return: the weights in an array of the same size as qe_x
+    """
+
+    scale = input_illumination.scale
+    input_illumination = input_illumination.unscaled()
+
+    ix, _ = input_illumination.get_spectrum(to_x_unit='m')
+    new_x = _merge_grids(ix, qe_x)
+
+    ill_array = input_illumination.get_interp_spectrum(new_x, to_x_unit='m', to_y_area_unit='m**-2',
+                                                       to_photon_flux=True,
+                                                       interp_left=0, interp_right=0, raise_error=False)
+
+    half_dx = np.diff(new_x) / 2
+    node_weights = np.zeros(new_x.size)
+    node_weights[:-1] += half_dx
+    node_weights[1:] += half_dx
+
+    return scale * get_resampler(qe_x, new_x).transpose_dot(node_weights * ill_array[1, :])
+
+
+def calc_jsc_thickness_sweep(input_illumination, absorption: List[Spectrum], layer_thicknesses, layer=None,
+                             chunk_size=4096):
+    """
+    Calculate the Jsc of stacked layers for many combinations of layer thicknesses, without creating the whole
+    array of transmissions of ``lambert_abs_sweep()``.
+
+    The QE is the absorptance of the layer stack calculated by Beer-Lambert's law, 1-exp(-sum(alpha_i*t_i)), or the
+    absorptance of one layer in the stack, exp(-sum_(i<k)(alpha_i*t_i))*(1-exp(-alpha_k*t_k)) if ``layer`` is k.
+    The results are the same as ``calc_jsc()`` with the QE on the grid of ``absorption[0]``.
+
+    :param input_illumination: illumination spectrum
+    :type input_illumination: Illumination
+    :param absorption: a list of absorption coefficients (Spectrum) of the layers, the unit of absorption should be 1/m
+    :param layer_thicknesses: a list of the thicknesses (m) of each layer. Each item can be a scalar or an array.
+        See ``lambert_abs_sweep()``.
+    :param layer: the index of the absorbing layer. Use the absorptance of the whole stack if it is None.
+    :param chunk_size: the number of combinations of thicknesses that are calculated at once
+    :return: the values of Jsc (A/m^2) in the broadcast shape of the thicknesses
+    """
+
+    if not isinstance(input_illumination, Spectrum):
+        raise TypeError("input_illumination should be a subclass of Spectrum")
+
+    assert len(absorption) == len(layer_thicknesses)
+
+    standard_x, alpha = _absorption_matrix(absorption)
+    shape, thickness = _thickness_matrix(layer_thicknesses)
+
+    weights = _jsc_weight_vector(input_illumination, standard_x)
+
+    if layer is not None:
+        layer = range(len(absorption))[layer]
+
+    jsc = np.empty(thickness.shape[0])
+    for start in range(0, thickness.shape[0], chunk_size):
+        t = thickness[start:start + chunk_size]
+
+        if layer is None:
+            qe = -np.expm1(-np.dot(t, alpha))
+        else:
+            qe = np.exp(-np.dot(t[:, :layer], alpha[:layer])) * -np.expm1(-np.outer(t[:, layer], alpha[layer]))
+
+        jsc[start:start + chunk_size] = np.dot(qe, weights)
+
+    return sc.e * jsc.reshape(shape)
+
+
+def _band_weights(x, start, end):
+    """
+    Calculate the weights v, so that v.dot(y) is the integral of the linear interpolation of y(x) from start to end.
+    The parts of the band that lie outside the range of x are not counted, as in ``Spectrum.band_integral()``.
+
+    :param x: a sorted grid
+    :param start: the start of the band
+    :param end: the end of the band
+    :return: the weights in an array of the same size as x
+    """
+
+    dx = np.diff(x)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        lo = np.clip(np.where(dx > 0, (start - x[:-1]) / dx, 0), 0, 1)
+        hi = np.clip(np.where(dx > 0, (end - x[:-1]) / dx, 0), 0, 1)
+
+    # The integral of (1-s)*y[i]+s*y[i+1] from s=lo to s=hi on each interval
+    right = dx * (hi ** 2 - lo ** 2) / 2
+    left = dx * (hi - lo) - right
+
+    weights = np.zeros(x.size)
+    weights[:-1] += left
+    weights[1:] += right
+
+    return weights
+
+
+def _jsc_from_eg_weights(input_illumination, eg):
+    """
+    Calculate the weights w on the core_x of the illumination, so that sc.e * w.dot(core_y) is equal to
+    ``calc_jsc_from_eg()`` of the illumination
+
+    :param input_illumination: illumination spectrum
+    :param eg: band gap in eV
+    :return: the weights in an array of the same size as core_x
+    """
+
+    plan = _get_conversion_plan('m', 'eV', input_illumination.y_area_unit, input_illumination.y_area_unit,
+                                input_illumination.is_spec_density)
+    core_x = input_illumination.core_x
+    energy, factor = plan.apply(core_x, np.ones(core_x.size))
+    factor = _energy_to_photon_flux(core_x, factor)
+
+    order = np.argsort(energy)
+    weights = np.empty(core_x.size)
+    weights[order] = _band_weights(energy[order], eg, np.inf)
+
+    return weights * factor
 
 
 def calc_jsc_from_eg(input_illumination, eg):
     """
-    Calculate the Jsc by assuming 100% above-band-gap EQE
+    Calculate the Jsc by assuming 100% above-band-gap EQE.
+    The photon flux above each band gap is looked up in the cumulative photon-flux table of the illumination
+    in eV, which is cached in the illumination object, so that sweeping many band gaps is cheap.
 
     :param input_illumination: illumination (class)
     :type input_illumination: Illumination
-    :param eg: Band gap of the material (in eV)
-    :return: value of Jsc (A/m^2)
+    :param eg: Band gap of the material (in eV). It can be a scalar or an array of band gaps.
+    :return: value of Jsc (A/m^2), or an array of Jsc in the shape of eg
+    """
+
+    if not isinstance(input_illumination, Spectrum):
+        raise TypeError("input_illumination should be a subclass of Spectrum, preferably Illumination class")
+
+    photon_flux = input_illumination.band_integral(eg, np.inf, 'eV', photon_flux=True)
+
+    return sc.e * photon_flux
+
+
+def calc_jsc_from_eg_with_grad(input_illumination, eg):
+    """
+    Calculate the Jsc by assuming 100% above-band-gap EQE, and its derivative with respect to the band gap.
+    The derivative is -q times the photon flux per eV at the band gap, which is looked up in the same cached table as
+    ``calc_jsc_from_eg()``, so no further evaluation of the spectrum is needed.
+
+    :param input_illumination: illumination (class)
+    :type input_illumination: Illumination
+    :param eg: Band gap of the material (in eV). It can be a scalar or an array of band gaps.
+    :return: a tuple (jsc, djsc_deg). jsc is in A/m^2 and djsc_deg is in A/m^2/eV, both in the shape of eg.
     """
 
     if not isinstance(input_illumination, Spectrum):
         raise TypeError("input_illumination should be a subclass of Spectrum, preferably Illumination class")
 
-    bg_m = _energy_to_length(eg, 'eV', 'm')
+    jsc = calc_jsc_from_eg(input_illumination, eg)
+
+    # The photon flux above eg is the integral of the linear interpolation of the photon flux per eV,
+    # so that its derivative is the interpolated photon flux at eg
+    x, y, _, _ = input_illumination.unscaled()._prefix_table('eV', photon_flux=True)
+    photon_flux = input_illumination.scale * np.interp(eg, x, y, left=0, right=0)
+
+    return jsc, -sc.e * photon_flux
+
+
+def calc_jsc_with_grad(input_illumination, qe):
+    """
+    Calculate Jsc from given QE and illumination, and its derivatives with respect to the values of the QE.
+    Jsc is linear in the QE, and the derivatives are the weights w of the QE on its own grid, so that
+    Jsc = w.dot(qe_y), where qe_y are the values of ``qe.get_spectrum('m')``. The result is the same as
+    ``calc_jsc()``.
+
+    :param input_illumination: illumination spectrum
+    :type input_illumination: Illumination
+    :param qe: QE
+    :type qe: Spectrum
+    :return: a tuple (jsc, djsc_dqe). jsc is in A/m^2, and djsc_dqe is an array of the derivatives (A/m^2)
+        on the sorted wavelengths of ``qe.get_spectrum('m')``.
+    """
+
+    if not isinstance(input_illumination, Spectrum):
+        raise TypeError("input_illumination should be a subclass of Spectrum")
+
+    if not isinstance(qe, Spectrum):
+        raise TypeError("qe should be an instance of Spectrum class")
 
-    ill_array = input_illumination.get_interp_spectrum(input_illumination.core_x[input_illumination.core_x <= bg_m],
-                                                       to_x_unit='m',
-                                                       to_y_area_unit='m**-2', to_photon_flux=True)
+    qx, qy = qe.get_spectrum(to_x_unit='m')
 
-    jsc = sc.e * np.trapz(ill_array[1, :], ill_array[0, :])
+    djsc_dqe = sc.e * _jsc_weight_vector(input_illumination, qx)
 
-    return jsc
+    return np.dot(djsc_dqe, qy), djsc_dqe
 
 
 def eqe_to_iqe(eqe, reflectivity):
@@ -16,12 +16,12 @@
 from typing import List
 
 from pypvcell.illumination import Illumination
-from pypvcell.photocurrent import gen_step_qe, calc_jsc_from_eg, calc_jsc
+from pypvcell.photocurrent import gen_step_qe, calc_jsc_from_eg, calc_jsc, _jsc_from_eg_weights, _jsc_weights
 from .ivsolver import calculate_j01, gen_rec_iv_by_rad_eta, one_diode_v_from_i, \
     solve_mj_iv_obj_with_optimization, one_diode_v_from_i_p, \
-    solve_series_connected_ivs, solve_v_from_j_adding_epsilon
+    solve_series_connected_ivs, solve_v_from_j_adding_epsilon, find_root_bracket
 from .fom import max_power
-from .spectrum import Spectrum, _energy_to_length
+from .spectrum import Spectrum, LazySpectrum, _energy_to_length
 from .detail_balanced_MJ import calculate_j01_from_qe
 import numpy as np
 import scipy.constants as sc
@@ -98,6 +98,20 @@ class SolarCell(object):
 
         raise NotImplementedError()
 
+    def get_cascade_terms(self, input_spectrum):
+        """
+        Get the photocurrent and the transmission of the cell as linear functions of the values of the
+        illumination spectrum on its own grid. These are used by ``calc_mj_cascade()`` to solve a stack of cells in
+        one pass.
+
+        :param input_spectrum: the illumination spectrum
+        :type input_spectrum: Spectrum
+        :return: a tuple of arrays (jsc_weights, transmission) on input_spectrum.core_x. For any values y of a
+            spectrum on this grid, Jsc is jsc_weights.dot(y) and the transmitted spectrum is y*transmission.
+        """
+
+        raise NotImplementedError()
+
     def set_description(self, desp):
 
         self.desp = desp
@@ -110,7 +124,86 @@ class SolarCell(object):
             return self.desp
 
 
+def calc_mj_cascade(subcells: List[SolarCell], input_spectrum: Spectrum):
+    """
+    Calculate the Jsc of all the subcells of a stack and the transmission through the stack in one pass.
+    The transmissions of the subcells are multiplied cumulatively on the grid of the input spectrum, and the
+    photocurrents are taken from ``get_cascade_terms()`` of each subcell, so no filtered spectrum is created.
+
+    :param subcells: a list of SolarCell from top to bottom
+    :param input_spectrum: the illumination spectrum
+    :return: a tuple (jsc, transmission). jsc is an array of the Jsc of each subcell. transmission is an
+        (n_subcells+1, L) array on input_spectrum.core_x: row k is the fraction of the input spectrum that reaches
+        subcell k, and the last row is the fraction that is transmitted through the whole stack.
+    """
+
+    terms = [cell.get_cascade_terms(input_spectrum) for cell in subcells]
+
+    transmission = np.ones((len(subcells) + 1, input_spectrum.core_x.size))
+    np.cumprod([t[1] for t in terms], axis=0, out=transmission[1:])
+
+    jsc_weights = np.array([t[0] for t in terms])
+    jsc = np.dot(jsc_weights * transmission[:-1], input_spectrum.core_y)
+
+    return jsc, transmission
+
+
+def _defining_class(cell: SolarCell, name: str):
+    """
+    Get the class in the MRO of the cell that defines the method name
+    """
+
+    for cls in type(cell).__mro__:
+        if name in vars(cls):
+            return cls
+
+    return None
+
+
+def _supports_cascade(cell: SolarCell):
+    """
+    Check if ``get_cascade_terms()`` of the cell describes its ``set_input_spectrum()`` and
+    ``get_transmit_spectrum()``, i.e. get_cascade_terms() is implemented by the class that defines these two methods
+    or by a subclass of it. A subclass that overrides either of them without overriding get_cascade_terms() is
+    solved with its own methods.
+    """
+
+    cascade_cls = _defining_class(cell, 'get_cascade_terms')
+    if cascade_cls is None or cascade_cls is SolarCell:
+        return False
+
+    return all(issubclass(cascade_cls, _defining_class(cell, name))
+               for name in ('set_input_spectrum', 'get_transmit_spectrum'))
+
+
+def _set_cascade_spectrum(subcells: List[SolarCell], input_spectrum: Spectrum):
+    """
+    Set the illumination of each subcell with ``calc_mj_cascade()``. The spectrum that reaches each subcell is
+    a LazySpectrum, which is only evaluated when it is used, e.g. by get_eta() of the subcell.
+
+    :return: the spectrum transmitted through the whole stack, or None if any subcell does not support
+        ``get_cascade_terms()``
+    """
+
+    if not all(_supports_cascade(cell) for cell in subcells):
+        return None
+
+    jsc, transmission = calc_mj_cascade(subcells, input_spectrum)
+
+    for i, cell in enumerate(subcells):
+        if i == 0:
+            cell.ill = input_spectrum
+        else:
+            cell.ill = LazySpectrum(np.multiply, (input_spectrum, transmission[i]))
+        cell.jsc = jsc[i]
+
+    return LazySpectrum(np.multiply, (input_spectrum, transmission[-1]))
+
+
 def set_input_spectrum(subcells: List[SolarCell], input_spectrum: Illumination):
+    if _set_cascade_spectrum(subcells, input_spectrum) is not None:
+        return subcells
+
     filtered_spectrum = None
 
     # Set spectrum for each subcell
@@ -134,6 +227,10 @@ class TransparentCell(SolarCell):
     def get_transmit_spectrum(self):
         return self.ill
 
+    def get_cascade_terms(self, input_spectrum):
+        size = input_spectrum.core_x.size
+        return np.zeros(size), np.ones(size)
+
     def get_eta(self):
         return 0
 
@@ -204,6 +301,13 @@ class SQCell(SolarCell):
 
         return self.ill * filter
 
+    def get_cascade_terms(self, input_spectrum):
+
+        jsc_weights = sc.e * _jsc_from_eg_weights(input_spectrum, self.eg)
+        transmission = input_spectrum.core_x >= _energy_to_length(self.eg, 'eV', 'm')
+
+        return jsc_weights, transmission.astype(float)
+
     def get_eta(self):
         volt = np.linspace(-0.5, self.eg, num=300)
         volt, current = gen_rec_iv_by_rad_eta(self.j01, self.rad_eta, 1, self.cell_T, 1e15, voltage=volt, jsc=self.jsc)
@@ -376,6 +480,13 @@ class DBCell(SolarCell):
 
         return filtered_sp
 
+    def get_cascade_terms(self, input_spectrum):
+
+        jsc_weights = sc.e * _jsc_weights(input_spectrum, [self.qe], np.sort(self.qe.core_x))[0]
+        transmission = 1 - self.qe.get_interp_spectrum(input_spectrum.core_x, 'm')[1, :]
+
+        return jsc_weights, transmission
+
     def get_iv(self, volt=None):
         if volt is None:
             volt = np.linspace(-0.5, 5, num=300)
@@ -407,10 +518,17 @@ class MJCell(SolarCell):
 
         self.subcell = subcell
         self.connect = connect
+        self.transmitted = None
 
     def set_input_spectrum(self, input_spectrum):
 
         self.ill = input_spectrum
+
+        # Solve all the subcells in one pass if they support it
+        self.transmitted = _set_cascade_spectrum(self.subcell, input_spectrum)
+        if self.transmitted is not None:
+            return
+
         filtered_spectrum = None
 
         # Set spectrum for each subcell
@@ -423,6 +541,9 @@ class MJCell(SolarCell):
 
     def get_transmit_spectrum(self):
 
+        if self.transmitted is not None:
+            return self.transmitted
+
         return self.subcell[-1].get_transmit_spectrum()
 
     def get_iv(self, volt=None, verbose=0):
@@ -457,9 +578,11 @@ class MJCell(SolarCell):
             solved_vs = np.empty((len(self.subcell), len(voltage) * 2))
             for subcell_idx, cell in enumerate(self.subcell):
                 if iter_num == 0:
-                    solved_iv = solve_v_from_j_adding_epsilon(cell.get_j_from_v, interped_i, bisect, epsilon=0.1)
+                    solved_iv = solve_v_from_j_adding_epsilon(cell.get_j_from_v, interped_i, find_root_bracket,
+                                                              epsilon=0.1)
                 else:
-                    solved_iv = solve_v_from_j_adding_epsilon(cell.get_j_from_v, interped_i, bisect, epsilon=0)
+                    solved_iv = solve_v_from_j_adding_epsilon(cell.get_j_from_v, interped_i, find_root_bracket,
+                                                              epsilon=0)
                 solved_v = solved_iv[:, 0]
                 solved_i = solved_iv[:, 1]
                 solved_vs[subcell_idx, :] = solved_v
@@ -52,6 +52,36 @@ or ::
 
 This operation multiply all the y values in s1 by 0.5 and return the result to s2.
 
+Each operation creates a new ``Spectrum``. For long expressions, ``lazy()`` defers the evaluation until the values
+are needed, and then interpolates every spectrum in the expression only once: ::
+
+    s4 = s1.lazy() * (1 - s2) * (1 - s3)
+    s4.rsum()  # the expression is evaluated here
+
+
+Batches of spectra
+-------------------
+
+``SpectrumBatch`` holds many spectra that share the same ``x``, for example the hourly solar spectra of a whole year.
+It supports the same unit conversions, interpolation, integration and arithmetic operations as ``Spectrum``,
+but operates on all the spectra at once: ::
+
+    # hourly_y is an (8760, L) array
+    batch = SpectrumBatch(wavelength, hourly_y, x_unit='nm', y_unit='m**-2', is_spec_density=True)
+    power = batch.rsum()  # an array of 8760 values
+    filtered = batch * qe
+
+
+Saving and loading spectra
+---------------------------
+
+``save()`` and ``load()`` store a spectrum in a binary .npz file together with its unit attributes, which is much
+faster to load than parsing a text file. ``save_spectra()`` puts a whole library of spectra into one file, and
+``load_spectra(file, mmap=True)`` memory-maps it, so that only the spectra that are actually used are read: ::
+
+    save_spectra('library.npz', {'am15g': am15g, 'qe_top': qe_top, 'hourly': batch})
+    library = load_spectra('library.npz', mmap=True)
+
    Copyright 2017 Kan-Hua Lee, Toyota Technological Institute
 
    Licensed under the Apache License, Version 2.0 (the "License");
@@ -69,20 +99,93 @@ This operation multiply all the y values in s1 by 0.5 and return the result to s
 """
 import numpy as np
 import scipy.constants as sc
-from pint import UnitRegistry
+from functools import lru_cache
+from collections import OrderedDict
+import hashlib
 import copy
+import json
+import os
+import struct
+import weakref
+import zipfile
+
+# Units of the constants for unit conversions
+_H_UNIT = 'J s'
+_C_UNIT = 'm/s'
+
+
+def _cache_dir():
+    """
+    The directory of the disk caches of pypvcell, which is set by the environment variable PYPVCELL_CACHE_DIR.
+    Nothing is cached on disk if it is not set.
+
+    :return: the directory, or None if disk caches are disabled
+    """
+    return os.environ.get('PYPVCELL_CACHE_DIR') or None
+
+
+@lru_cache(maxsize=None)
+def _unit_registry():
+    """
+    The pint UnitRegistry of this module. Building the registry takes most of the import time of pypvcell,
+    so it is created when the first unit is parsed instead of at import time.
+    If a cache directory is set (see ``_cache_dir()``), pint>=0.18 also keeps the parsed unit definitions in it.
+
+    :return: pint UnitRegistry
+    """
+    from pint import UnitRegistry
+
+    cache_dir = _cache_dir()
+    if cache_dir is None:
+        return UnitRegistry()
+
+    try:
+        return UnitRegistry(cache_folder=os.path.join(cache_dir, 'pint'))
+    except (TypeError, ImportError, OSError):
+        return UnitRegistry()
+
+
+def __getattr__(name):
+    # The unit registry used to be created at import time as ``ug``. Keep it accessible.
+    if name == 'ug':
+        return _unit_registry()
+
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+@lru_cache(maxsize=None)
+def _parse_units(unit):
+    """
+    Cached version of ``ug.parse_units()``. Parsing unit strings with pint is slow, and the same handful of unit
+    strings are parsed over and over again when converting spectra.
+
+    :param unit: unit string, e.g. 'nm', 'm**-2'
+    :type unit: str
+    :return: pint Unit
+    """
+    return _unit_registry().parse_units(unit)
+
+
+@lru_cache(maxsize=None)
+def _unit_dimensionality(unit):
+    """
+    Cached dimensionality of a unit string
+
+    :param unit: unit string, e.g. 'nm', 'eV'
+    :type unit: str
+    :return: pint dimensionality
+    """
+    return _parse_units(unit).dimensionality
 
-ug = UnitRegistry()
 
-# for unit comparision. Declared here for perfomance purpose.
-_lu = ug.parse_units('m').dimensionality  # length
-_eu = ug.parse_units('J').dimensionality  # energy
-_ilu = ug.parse_units('1/m').dimensionality  # 1/length
-_itu = ug.parse_units('1/s').dimensionality  # 1/s, frequency
+@lru_cache(maxsize=None)
+def _reference_dimensionality():
+    """
+    Dimensionality of length, energy, 1/length and frequency (1/s) for unit comparision
 
-# define constants for unit conversions
-_h_unit = ug.parse_expression('J s')
-_c_unit = ug.parse_expression('m/s')
+    :return: a tuple of pint dimensionality
+    """
+    return tuple(_unit_dimensionality(unit) for unit in ('m', 'J', '1/m', '1/s'))
 
 
 def _energy_to_length(value, e_unit, l_unit):
@@ -102,6 +205,7 @@ def _energy_to_length(value, e_unit, l_unit):
     return h * c / value
 
 
+@lru_cache(maxsize=None)
 def _energy_to_length_factor(e_unit, l_unit):
     """
     Convert the units of Planck's constant and speed of light
@@ -113,14 +217,14 @@ def _energy_to_length_factor(e_unit, l_unit):
     :return: c,h
     """
 
-    dest_h_u = ug.parse_units('%s s' % e_unit)
-    dest_c_u = ug.parse_units('%s/s' % l_unit)
-    if dest_h_u.dimensionality != _h_unit.dimensionality:
+    dest_h_u = _parse_units('%s s' % e_unit)
+    dest_c_u = _parse_units('%s/s' % l_unit)
+    if dest_h_u.dimensionality != _unit_dimensionality(_H_UNIT):
         raise ValueError("e_unit should be a valid energy unit")
-    if dest_c_u.dimensionality != _c_unit.dimensionality:
+    if dest_c_u.dimensionality != _unit_dimensionality(_C_UNIT):
         raise ValueError('l_unit should be a valid length unit')
-    h = ug.convert(sc.h, _h_unit, dest_h_u)
-    c = ug.convert(sc.c, _c_unit, dest_c_u)
+    h = _unit_registry().convert(sc.h, _parse_units(_H_UNIT), dest_h_u)
+    c = _unit_registry().convert(sc.c, _parse_units(_C_UNIT), dest_c_u)
     return c, h
 
 
@@ -164,439 +268,1757 @@ def compare_wavelength_dimension(unit_1, unit_2):
     :rtype: bool
     """
 
-    un1 = ug.parse_units(unit_1).dimensionality
-    un2 = ug.parse_units(unit_2).dimensionality
+    un1 = _unit_dimensionality(unit_1)
+    un2 = _unit_dimensionality(unit_2)
+    lu, eu, ilu, itu = _reference_dimensionality()
 
     if un1 == un2:
         return True
-    elif set([un1, un2]) == set([_lu, _eu]):
+    elif set([un1, un2]) == set([lu, eu]):
         return True
-    elif set([un1, un2]) == set([_lu, _ilu]):
+    elif set([un1, un2]) == set([lu, ilu]):
         return True
-    elif set([un1, un2]) == set([_lu, _itu]):
+    elif set([un1, un2]) == set([lu, itu]):
         return True
     else:
         return False
 
 
-class Spectrum(object):
+def _energy_to_photon_flux(wavelength, energy_flux):
     """
-    This class handles the operation of the spectrum y(x), including unit conversion and multiplication.
+    Convert energy flux to photon flux
 
+    :param wavelength: wavelength in m
+    :param energy_flux: energy flux. Can be a 2D array with wavelength along the last axis.
+    :return: photon flux
+    """
+    return energy_flux / (sc.h * sc.c) * wavelength
 
-    It can handle unit conversions of different types of spectrum, including:
 
-    - Standard spectrum. The unit of y is independent of x, e.g. quantum efficiency, absorption spectrum, etc.
-    - Sepctral density. The unit of y is per [x-unit]. For example, the Black-body radiation spectrum is often in the unit of energy/nm/m^2
-    - Photon flux: y is number of photons. When converting y into energy (J), it has to be multiplied by its photon energy.
+def _photon_flux_to_energy(wavelength, photon_flux):
+    """
+    Convert photon flux to energy flux
 
+    :param wavelength: wavelength in m
+    :param photon_flux: photon flux. Can be a 2D array with wavelength along the last axis.
+    :return: energy flux
     """
+    return photon_flux * (sc.h * sc.c) / wavelength
 
-    def __init__(self, x_data, y_data, x_unit, y_unit="", is_spec_density=False, is_photon_flux=False):
-        """
-        Constructor of the spectrum y(x)
 
-        :param is_spec_density:
-        :param x_data: x data of the spectrum (1d numpy array)
-        :param y_data: y data of the spectrum (1d numpy array)
-        :param x_unit: the unit of x (string), e.g. 'nm', 'eV'
-        :param y_unit: (string) If y is per area, put area unit here, e.g. 'm-2' or 'cm-2'.
-                Put null string '' if y does not have area unit
-        :param is_photon_flux: (boolean). True if y is number of photons.
-        """
+# The arrays made read-only by _freeze(), by id. The entries are removed when the arrays are garbage collected,
+# so that a new array that reuses an id is not mistaken for a frozen one.
+_frozen_arrays = weakref.WeakValueDictionary()
 
-        # TODO: fix docstring's y unit
-        self.set_spectrum(x_data=x_data, y_data=y_data, x_unit=x_unit,
-                          y_area_unit=y_unit,
-                          is_photon_flux=is_photon_flux,
-                          is_spec_density=is_spec_density)
 
-    def set_spectrum(self, x_data, y_data, x_unit, y_area_unit, is_photon_flux, is_spec_density):
-        """
-        This is essentially a constructor method that sets up the attributes of the object.
-        It converts everything to standard MKS unit. x_data: 'm', y_data: '[]/m^2-m'
+def _is_immutable(array):
+    """
+    Check whether an array and all the arrays it is a view of are read-only, and one of them was made read-only by
+    ``_freeze()``, which means that its values can never change. Arrays that were made read-only elsewhere are not
+    trusted, because whoever owns their data can make them writable again.
 
-        :param x_data: x data of the spectrum (1d numpy array)
-        :param y_data: y data of the spectrum (1d numpy array)
-        :param x_unit: the unit of x (string), e.g. 'nm', 'eV'
-        :type x_unit: str
-        :param y_area_unit: If y is per area, put area unit here, e.g. 'm**-2' or 'cm**-2'. Put null string '' if y does not have area unit
-        :type y_area_unit: str
-        :param is_photon_flux: True if y is number of photons.
-        :type is_photon_flux: bool
-        :param is_spec_density: True if y is spectral density.
-        :type is_spec_density: bool
-        :return: None
-        """
+    :param array: numpy array
+    :type array: np.ndarray
+    :return: True if the values of the array cannot change
+    """
+    frozen = False
+    while isinstance(array, np.ndarray):
+        if array.flags.writeable:
+            return False
+        frozen = frozen or _frozen_arrays.get(id(array)) is array
+        array = array.base
+    return frozen
 
-        assert isinstance(x_data, np.ndarray)
-        assert isinstance(y_data, np.ndarray)
-        assert isinstance(x_unit, str)
-        assert isinstance(y_area_unit, str)
-        assert isinstance(is_photon_flux, bool)
-        assert isinstance(is_spec_density, bool)
 
-        # Convert everything to photon energy : [arb]/m^2-m
+def _read_only(array, dtype):
+    """
+    Get a read-only array of the given dtype with the values of array. The array is returned as it is if its values
+    can never change (see ``_is_immutable()``). Otherwise, a frozen copy is returned, so that the caller's array stays
+    writable and changing it does not affect the returned one.
 
-        self.is_spec_density = is_spec_density
+    :param array: array-like
+    :param dtype: the dtype of the returned array
+    :return: a read-only numpy array
+    """
+    if isinstance(array, np.ndarray) and array.dtype == dtype and _is_immutable(array):
+        return array
+    return _freeze(np.array(array, dtype=dtype))
 
-        if y_area_unit != '':
-            self.core_x, self.core_y = self.convert_spectrum_unit(x_data, y_data, from_x_unit=x_unit, to_x_unit='m',
-                                                                  from_y_area_unit=y_area_unit, to_y_area_unit='m**-2',
-                                                                  is_spec_density=self.is_spec_density)
-            self.y_area_unit = 'm**-2'
-        else:
-            self.core_x, self.core_y = self.convert_spectrum_unit(x_data, y_data, from_x_unit=x_unit, to_x_unit='m',
-                                                                  from_y_area_unit='', to_y_area_unit='',
-                                                                  is_spec_density=self.is_spec_density)
-            self.y_area_unit = ''
 
-        # Convert photon flux to energy (J) representation
-        if is_photon_flux:
-            self.core_y = self._as_energy(self.core_x, self.core_y)
+def _array_key(array):
+    """
+    Get a hashable key that identifies the values of an array. Immutable arrays (see ``_is_immutable()``) are
+    identified by the memory they occupy, so that different views of the same data, such as the rows returned by
+    ``Spectrum.get_spectrum()``, get the same key. The other arrays are identified by a hash of their contents.
+    Whoever caches anything with this key should also keep a reference to the array, so that the memory cannot be
+    reused by another array.
+
+    :param array: numpy array
+    :type array: np.ndarray
+    :return: a hashable key
+    """
+    if _is_immutable(array):
+        return 'mem', array.__array_interface__['data'][0], array.shape, array.strides, array.dtype.str
 
-    def convert_spectrum_unit(self, x_data, y_data, from_x_unit, to_x_unit,
-                              from_y_area_unit, to_y_area_unit,
-                              is_spec_density):
+    array = np.ascontiguousarray(array)
+    digest = hashlib.blake2b(array.view(np.uint8), digest_size=16).digest()
+    return 'hash', array.shape, array.dtype.str, digest
 
-        """
-        A general method for converting the spectrum y(x) from one set of unit to another.
-        Note that this only supports the conversion of x from:
-        [length]<->[frequency]
-        [length]<-> 1/[length]
-        [length]<->[energy]
 
-        This is because Spectrum class converts the units of x to [length] first when initilizing or new spectrum is set.
-        Therefore this function only implments the bi-direction unit conversions that involves [length].
+class Resampler(object):
+    """
+    Linear interpolation from the grid src_x onto the grid dst_x.
+    The indices and weights of the interpolation are calculated once when the object is created,
+    so that resampling many sets of y values on the same grids is only a gather and a multiply-add.
+    Use ``get_resampler()`` to reuse the Resampler of the same pair of grids.
+    """
 
-        :param x_data: data of x (numpy array)
-        :param y_data: data of y (numpy array)
-        :param from_x_unit: the unit of x_data
-        :param to_x_unit: the unit of x_data to be converted to
-        :param from_y_area_unit: the unit of area of y_data
-        :param to_y_area_unit: the unit of area of y_data tobe converted to
-        :param is_spec_density: True if the data is spectral density.
-        :return: a tuple of 1-d array (new_x_data, new_y_data)
+    def __init__(self, src_x, dst_x):
         """
+        Set up the interpolation
 
-        assert isinstance(x_data, np.ndarray)
-        assert isinstance(y_data, np.ndarray)
-        assert isinstance(from_x_unit, str)
-        assert isinstance(to_x_unit, str)
-        assert isinstance(from_y_area_unit, str)
-        assert isinstance(to_y_area_unit, str)
-        assert isinstance(is_spec_density, bool)
-
-        src_x_u = ug.parse_units(from_x_unit)
-        des_x_u = ug.parse_units(to_x_unit)
-
-        src_x_udim = src_x_u.dimensionality
-        des_x_udim = des_x_u.dimensionality
-
-        au1 = ug.parse_units(from_y_area_unit)
-        au2 = ug.parse_units(to_y_area_unit)
+        :param src_x: the x values of the data, 1D array in increasing order
+        :param dst_x: the x values to be interpolated, 1D array
+        """
 
-        if x_data.size != y_data.size:
-            raise ValueError("The array size of x_data and y_data do not match.")
+        src_x = np.asarray(src_x)
+        dst_x = np.asarray(dst_x)
 
-        if not compare_wavelength_dimension(from_x_unit, to_x_unit):
-            raise ValueError("The dimension of from_x_unit and to_x_unit do not match.")
+        if src_x.ndim != 1 or src_x.size < 2:
+            raise ValueError("src_x should be an 1D array with at least two elements")
 
-        if not au1.dimensionality == au2.dimensionality:
-            raise ValueError("The dimension of from y_area_unit and to_y_area_unit do not match.")
+        self.src_x = src_x
+        self.dst_x = dst_x
 
-        if is_spec_density:
-            from_dx_unit = from_x_unit + "**-1"
-            to_dx_unit = to_x_unit + "**-1"
-        else:
-            from_dx_unit = ""
-            to_dx_unit = ""
+        index = np.clip(np.searchsorted(src_x, dst_x, side='right') - 1, 0, src_x.size - 2)
 
-        orig_y_div_unit = from_y_area_unit + " " + from_dx_unit
-        new_orig_y_div_unit = to_y_area_unit + " " + to_dx_unit
+        dx = src_x[index + 1] - src_x[index]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            weight = np.where(dx > 0, (dst_x - src_x[index]) / dx, 0.0)
 
-        # Simple case
-        if src_x_udim == des_x_udim:
+        self.index = index
+        self.next_index = index + 1
+        self.weight = np.clip(weight, 0, 1)
+        self.below = dst_x < src_x[0]
+        self.above = dst_x > src_x[-1]
+        self.has_below = bool(np.any(self.below))
+        self.has_above = bool(np.any(self.above))
 
-            new_x_data = ug.convert(x_data, ug.parse_units(from_x_unit), ug.parse_units(to_x_unit))
+    def resample(self, y, left=None, right=None):
+        """
+        Interpolate y(src_x) at dst_x, like ``np.interp(dst_x, src_x, y, left, right)``.
 
-            if is_spec_density:
-                new_y_data = ug.convert(y_data, ug.parse_units(orig_y_div_unit),
-                                        ug.parse_units(new_orig_y_div_unit))
-            else:
-                if from_y_area_unit != '' and to_y_area_unit != '':
-                    new_y_data = ug.convert(y_data, au1, au2)
+        :param y: y values on src_x. It can be a 2D array with src_x along the last axis.
+        :param left: value to return for x < src_x[0], default is y[..., 0]
+        :param right: value to return for x > src_x[-1], default is y[..., -1]
+        :return: the interpolated values, with dst_x along the last axis
+        """
 
-                else:
-                    new_y_data = y_data
+        y = np.asarray(y)
+        if y.dtype.kind != 'f':
+            y = y.astype(float)
 
-        elif src_x_udim == _lu and des_x_udim == _eu:
+        y0 = y[..., self.index]
+        result = y[..., self.next_index]
+        result -= y0
+        result *= self.weight
+        result += y0
 
-            new_x_data = _energy_to_length(x_data, to_x_unit, from_x_unit)
+        if self.has_below:
+            result[..., self.below] = y[..., :1] if left is None else left
 
-            new_y_data = ug.convert(y_data, au1, au2)
+        if self.has_above:
+            result[..., self.above] = y[..., -1:] if right is None else right
 
-            if is_spec_density:
-                new_x_data, new_y_data = _spec_density_conversion(new_x_data, new_y_data, to_x_unit, from_x_unit)
+        return result
 
-        elif src_x_udim == _eu and des_x_udim == _lu:
+    def matrix(self, left=None, right=None):
+        """
+        The interpolation as a sparse matrix R, so that R.dot(y) equals resample(y, left, right).
 
-            new_x_data = _energy_to_length(x_data, from_x_unit, to_x_unit)
+        :param left: None to hold the value y[0] for x < src_x[0], or 0 to fill zeros
+        :param right: None to hold the value y[-1] for x > src_x[-1], or 0 to fill zeros
+        :return: a scipy.sparse.csr_matrix of shape (len(dst_x), len(src_x))
+        """
 
-            new_y_data = ug.convert(y_data, au1, au2)
+        from scipy import sparse
 
-            if is_spec_density:
-                new_x_data, new_y_data = _spec_density_conversion(new_x_data, new_y_data, from_x_unit, to_x_unit)
+        if left not in (None, 0) or right not in (None, 0):
+            raise ValueError("left and right can only be None or 0 in the matrix form")
 
-        elif set([src_x_udim, des_x_udim]) == set([_lu, _ilu]):
+        rows = np.arange(self.dst_x.size)
+        w0 = 1 - self.weight
+        w1 = self.weight.copy()
 
-            # The conversion is bi-directional, we use nm -> cm^-1 as the example for the following comments
+        if left == 0:
+            w0[self.below] = 0
+            w1[self.below] = 0
+        if right == 0:
+            w0[self.above] = 0
+            w1[self.above] = 0
 
-            x_data_q = x_data * src_x_u  # attach the unit to the quantities
+        mat = sparse.csr_matrix((np.concatenate((w0, w1)),
+                                 (np.concatenate((rows, rows)), np.concatenate((self.index, self.index + 1)))),
+                                shape=(self.dst_x.size, self.src_x.size))
 
-            inv_scr_x_u = 1 / src_x_u  # get the inverse unit of x for converting y, nm -> nm-1
+        return mat
 
-            x_data_q = 1 / x_data_q  # Do the inverse of x data and its unit
+    def transpose_dot(self, weights):
+        """
+        Multiply the weights of a linear form on dst_x by the interpolation matrix, i.e. ``matrix().T.dot(weights)``
+        for each row of weights, so that ``transpose_dot(w).dot(y)`` equals ``w.dot(resample(y))``.
+        This is how a linear form on dst_x, e.g. the weights of an integral, is carried to src_x.
 
-            new_x_data = x_data_q.to(des_x_u).m  # Do the unit conversion and retrieve the value
+        :param weights: the weights on dst_x. It can be a 2D array with dst_x along the last axis.
+        :return: the weights on src_x, with src_x along the last axis
+        """
 
-            new_y_data = ug.convert(y_data, au1, au2)
+        weights = np.asarray(weights, dtype=np.float64)
+        rows = np.atleast_2d(weights)
 
-            if is_spec_density:
-                # Convert the values of y, for example, from  []/nm to []/cm, assuming that we are converting x from [nm] to [cm]
-                new_y_data = ug.convert(new_y_data, inv_scr_x_u, des_x_u)
+        # Scatter the weights of each row into the two nodes of src_x that each point of dst_x interpolates
+        offset = np.arange(rows.shape[0])[:, np.newaxis] * self.src_x.size
+        size = rows.shape[0] * self.src_x.size
+        result = np.bincount((offset + self.index).ravel(), (rows * (1 - self.weight)).ravel(), minlength=size)
+        result += np.bincount((offset + self.next_index).ravel(), (rows * self.weight).ravel(), minlength=size)
 
-                # Then run dk=d(lambda)/lambda^2
-                new_y_data = new_y_data / new_x_data ** 2
+        return result.reshape(weights.shape[:-1] + (self.src_x.size,))
 
-        elif src_x_udim == _lu and des_x_udim == _itu:
 
-            c = ug.convert(sc.c, 'm/s', from_x_unit + ' ' + to_x_unit)
+class _LRUCache(object):
+    """
+    A dictionary that keeps only the most recently used maxsize items
+    """
 
-            new_x_data = c / x_data
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
 
-            new_y_data = ug.convert(y_data, au1, au2)
+    def get(self, key):
+        value = self._data.get(key)
+        if value is not None:
+            self._data.move_to_end(key)
+        return value
 
-            if is_spec_density:
-                new_y_data = new_y_data * c / new_x_data ** 2
+    def put(self, key, value):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
 
-        elif src_x_udim == _itu and des_x_udim == _lu:
+    def clear(self):
+        self._data.clear()
 
-            c = ug.convert(sc.c, 'm/s', to_x_unit + ' ' + from_x_unit)
+    def __len__(self):
+        return len(self._data)
 
-            new_x_data = c / x_data
 
-            new_y_data = ug.convert(y_data, au1, au2)
+_resampler_cache = _LRUCache(maxsize=256)
 
-            if is_spec_density:
-                new_y_data = new_y_data * c / new_x_data ** 2
 
-        return new_x_data, new_y_data
+def get_resampler(src_x, dst_x):
+    """
+    Get the Resampler from src_x to dst_x. The Resamplers are cached by the fingerprints of the two grids,
+    so the interpolation indices and weights are calculated only once for each pair of grids.
 
-    def get_spectrum(self, to_x_unit, to_y_area_unit=None, to_photon_flux=False):
-        """
-        Retrieve the values of the spectrum based on the given units of x and y.
+    :param src_x: the x values of the data, 1D array in increasing order
+    :param dst_x: the x values to be interpolated
+    :return: the Resampler
+    :rtype: Resampler
+    """
 
-        :param to_x_unit: the unit of x
-        :param to_y_area_unit: the unit of area of y. Default is the y_area_unit of the object.
-        :param to_photon_flux: True if converting y to photon flux.
-        :return: a 2xL numpy array
-        """
+    key = (_array_key(src_x), _array_key(dst_x))
 
-        if to_y_area_unit is None:
-            to_y_area_unit = self.y_area_unit
+    resampler = _resampler_cache.get(key)
+    if resampler is None:
+        # The Resampler keeps the references of src_x and dst_x, so the keys stay valid.
+        resampler = Resampler(src_x, dst_x)
+        _resampler_cache.put(key, resampler)
 
-        x_data, y_data = self.convert_spectrum_unit(self.core_x, self.core_y,
-                                                    from_x_unit='m', to_x_unit=to_x_unit,
-                                                    from_y_area_unit=self.y_area_unit, to_y_area_unit=to_y_area_unit,
-                                                    is_spec_density=self.is_spec_density)
+    return resampler
 
-        # convert the spectrum to photon flux if necessary
-        if to_photon_flux:
-            y_data = self._as_photon_flux(self.core_x, y_data)
 
-        # Sort the spectrum by wavelength
-        sorted_idx = np.argsort(x_data)
-        x_data = x_data[sorted_idx]
-        y_data = y_data[sorted_idx]
+def _check_dtype(dtype):
+    """
+    Check the storage dtype of a spectrum
 
-        return np.vstack((x_data, y_data))
+    :param dtype: numpy floating dtype, e.g. np.float64 or np.float32
+    :return: the dtype as np.dtype
+    """
 
-    def get_interp_spectrum(self, to_x_data, to_x_unit, to_y_area_unit=None, to_photon_flux=False, interp_left=None,
-                            interp_right=None, raise_error=True):
+    dtype = np.dtype(dtype)
+    if not np.issubdtype(dtype, np.floating):
+        raise ValueError("dtype should be a floating type, e.g. np.float64 or np.float32")
 
-        """
-        Get interpolated spectrum.
+    return dtype
 
-        :param raise_error: if to_x_data is not within the range of the spectru, raise ValueError
-        :param to_x_data: (ndarray) x values to be interpolated
-        :param to_x_unit: (string) unit of x of the output value
-        :param to_y_area_unit: (string) unit of area of y of the output value.
-        :param to_photon_flux: (bool) True if converting the value to photon flux as the output
-        :param interp_left: value to return for x < core_x[0], return core_x[0] if set to be None
-        :param interp_right: value to return for x> core_x[-1], return core_y[-1] if set to be None
-        :return: a 2xL array
-        """
 
-        orig_spectrum = self.get_spectrum(to_x_unit, to_y_area_unit, to_photon_flux=to_photon_flux)
+def _trapz64(y, x, axis=-1):
+    """
+    np.trapz(y, x) accumulated in double precision, regardless of the dtype of y and x
+    """
 
-        if np.min(to_x_data) < orig_spectrum[0, 0] or np.max(to_x_data) > orig_spectrum[0, -1]:
-            if raise_error == True:
-                raise ValueError("The interped value is out of bound")
+    return np.trapz(np.asarray(y, dtype=np.float64), np.asarray(x, dtype=np.float64), axis=axis)
 
-        output_spectrum = np.zeros((2, to_x_data.shape[0]))
 
-        output_spectrum[0, :] = to_x_data
-        output_spectrum[1, :] = np.interp(to_x_data, orig_spectrum[0, :],
-                                          orig_spectrum[1, :], left=interp_left, right=interp_right)
+def _is_out_of_bound(x, x_min, x_max, dtype):
+    """
+    Check whether any of x lies outside [x_min, x_max]. If the grid is stored in single precision, allow for the
+    rounding of its end points.
+    """
 
-        return output_spectrum
+    tol = 0.0 if dtype == np.float64 else 4 * np.finfo(dtype).eps
 
-    def __add__(self, s2):
+    return np.min(x) < x_min - abs(x_min) * tol or np.max(x) > x_max + abs(x_max) * tol
 
-        return self._arith_op(s2, np.add)
 
-    def __sub__(self, s2):
+def _freeze(array):
+    """
+    Make a numpy array read-only
 
-        return self._arith_op(s2, np.subtract)
+    :param array: numpy array
+    :type array: np.ndarray
+    :return: the same array
+    """
+    array.flags.writeable = False
+    _frozen_arrays[id(array)] = array
+    return array
 
-    def __truediv__(self, s2):
 
-        return self._arith_op(s2, np.divide)
+class _ConversionPlan(object):
+    """
+    A unit conversion of spectrum y(x) resolved into plain float factors.
+    Instances are created and cached by ``_get_conversion_plan()``, so that converting the data does not
+    touch pint at all.
 
-    def __mul__(self, s2):
+    If ``inverse_x`` is False, the conversion is x'=x_factor*x and y'=y_factor*y.
+    If ``inverse_x`` is True, the conversion is x'=x_factor/x and y'=y_factor*y, and y' is further multiplied by
+    x_factor/x'^2 if the spectrum is spectral density.
+    """
 
-        return self._arith_op(s2, np.multiply)
+    __slots__ = ('inverse_x', 'x_factor', 'y_factor', 'is_spec_density')
 
-    def __radd__(self, s2):
+    def __init__(self, inverse_x, x_factor, y_factor, is_spec_density):
+        self.inverse_x = inverse_x
+        self.x_factor = float(x_factor)
+        self.y_factor = float(y_factor)
+        self.is_spec_density = is_spec_density
 
-        return self._arith_op(s2, np.add)
+    def apply(self, x_data, y_data):
+        """
+        Convert the values of x and y. y_data can be a 2D array with x along its last axis.
 
-    def __rsub__(self, s2):
+        :param x_data: data of x (numpy array)
+        :param y_data: data of y (numpy array)
+        :return: a tuple of arrays (new_x_data, new_y_data)
+        """
 
-        return self._arith_op(s2, np.subtract) * (-1)
+        if self.inverse_x:
+            new_x_data = self.x_factor / x_data
+            new_y_data = y_data * self.y_factor
 
-    def __rmul__(self, s2):
+            if self.is_spec_density:
+                new_y_data = new_y_data * self.x_factor / new_x_data ** 2
+        else:
+            new_x_data = x_data * self.x_factor
+            new_y_data = y_data * self.y_factor
 
-        return self._arith_op(s2, np.multiply)
+        return new_x_data, new_y_data
 
-    def __rtruediv__(self, s2):
 
-        return self._inverse()._arith_op(s2, np.multiply)
+@lru_cache(maxsize=256)
+def _get_conversion_plan(from_x_unit, to_x_unit, from_y_area_unit, to_y_area_unit, is_spec_density):
+    """
+    Resolve the conversion of spectrum y(x) from one set of units to another into a ``_ConversionPlan``.
+    The results are cached, so pint only gets involved the first time a particular conversion is requested.
+    See ``Spectrum.convert_spectrum_unit()`` for the supported conversions.
+
+    :param from_x_unit: the unit of x_data
+    :param to_x_unit: the unit of x_data to be converted to
+    :param from_y_area_unit: the unit of area of y_data
+    :param to_y_area_unit: the unit of area of y_data to be converted to
+    :param is_spec_density: True if the data is spectral density.
+    :return: the conversion plan
+    :rtype: _ConversionPlan
+    """
 
-    def _inverse(self):
+    src_x_u = _parse_units(from_x_unit)
+    des_x_u = _parse_units(to_x_unit)
 
-        if self.y_area_unit != '':
-            print("Warning: y data is not dimensionless!")
+    src_x_udim = src_x_u.dimensionality
+    des_x_udim = des_x_u.dimensionality
+    lu, eu, ilu, itu = _reference_dimensionality()
 
-        newobj = copy.deepcopy(self)
-        newobj.core_y = 1 / newobj.core_y
+    au1 = _parse_units(from_y_area_unit)
+    au2 = _parse_units(to_y_area_unit)
 
-        return newobj
+    if not compare_wavelength_dimension(from_x_unit, to_x_unit):
+        raise ValueError("The dimension of from_x_unit and to_x_unit do not match.")
 
-    def _arith_op(self, s2, op):
-        """
-        Do the arithmetic operations
+    if not au1.dimensionality == au2.dimensionality:
+        raise ValueError("The dimension of from y_area_unit and to_y_area_unit do not match.")
 
-        :param s2: an instance of Spectrum
-        :type s2: Spectrum,float
-        :param op: numpy ufunc, such as np.add, np.substract, np.multiply, np.divide
-        :return: the new Spectrum instance.
-        """
+    # Simple case
+    if src_x_udim == des_x_udim:
 
-        if isinstance(s2, Spectrum):
-            return self._spec_arith_op(s2, op, inplace=False)
+        x_factor = _unit_registry().convert(1.0, src_x_u, des_x_u)
 
+        if is_spec_density:
+            orig_y_div_unit = from_y_area_unit + " " + from_x_unit + "**-1"
+            new_orig_y_div_unit = to_y_area_unit + " " + to_x_unit + "**-1"
+            y_factor = _unit_registry().convert(1.0, _parse_units(orig_y_div_unit), _parse_units(new_orig_y_div_unit))
+        elif from_y_area_unit != '' and to_y_area_unit != '':
+            y_factor = _unit_registry().convert(1.0, au1, au2)
         else:
-            try:
-                newobj = copy.deepcopy(self)
-                newobj.core_y = op(newobj.core_y, s2)
+            y_factor = 1.0
 
-                if newobj.core_x.shape != newobj.core_y.shape:
-                    raise Exception("The multipler should either be a scalar or a Spectrum calss object"
-                                    ", or an ndarray that matches the length of the spectrum")
+        return _ConversionPlan(False, x_factor, y_factor, is_spec_density)
 
-                return newobj
-            except (TypeError, AttributeError) as err:
-                raise err(
-                    "Runtime Error: The multipler should either be a scalar or a Spectrum class object when doing Spectrum multiplication")
+    # All the other cases are x'=K/x, where K comes from h, c or the unit conversion of 1/x
+    y_factor = _unit_registry().convert(1.0, au1, au2)
 
-    def _spec_arith_op(self, s2, op, inplace=True):
-        """
-        Do the arithmetic operations of two Spectrum instances
+    if src_x_udim == lu and des_x_udim == eu:
+        c, h = _energy_to_length_factor(to_x_unit, from_x_unit)
+        x_factor = h * c
 
-        :param s2: an instance of Spectrum
-        :type s2: Spectrum
-        :param op: numpy ufunc, such as np.add, np.substract, np.multiply, np.divide
-        :param inplace: True if the results overwrites the instance itself.
-        :type inplace: bool
-        :return: the new spectrum opject. Return None if inplace is set True
-        """
+    elif src_x_udim == eu and des_x_udim == lu:
+        c, h = _energy_to_length_factor(from_x_unit, to_x_unit)
+        x_factor = h * c
 
-        assert isinstance(s2, Spectrum)
+    elif set([src_x_udim, des_x_udim]) == set([lu, ilu]):
+        # The conversion is bi-directional, e.g. nm -> cm^-1: x'=(1/x)*convert(1/nm->1/cm)
+        x_factor = _unit_registry().convert(1.0, 1 / src_x_u, des_x_u)
 
-        new_spec = s2.get_interp_spectrum(self.core_x, 'm')
+    elif src_x_udim == lu and des_x_udim == itu:
+        x_factor = _unit_registry().convert(sc.c, 'm/s', from_x_unit + ' ' + to_x_unit)
 
-        new_core_spec = op(self.core_y, new_spec[1, :])
+    elif src_x_udim == itu and des_x_udim == lu:
+        x_factor = _unit_registry().convert(sc.c, 'm/s', to_x_unit + ' ' + from_x_unit)
 
-        if inplace:
-            self.core_y = new_core_spec
-            return None
-        else:
-            newobj = copy.deepcopy(self)
-            newobj.core_y = new_core_spec
-            return newobj
+    else:
+        raise ValueError("Unsupported unit conversion: %s to %s" % (from_x_unit, to_x_unit))
 
-    def _as_photon_flux(self, wavelength, energy_flux):
-        return energy_flux / (sc.h * sc.c) * wavelength
+    return _ConversionPlan(True, x_factor, y_factor, is_spec_density)
 
-    def _as_energy(self, wavelength, photon_flux):
-        return photon_flux * (sc.h * sc.c) / wavelength
+
+class Spectrum(object):
+    """
+    This class handles the operation of the spectrum y(x), including unit conversion and multiplication.
+
+
+    It can handle unit conversions of different types of spectrum, including:
+
+    - Standard spectrum. The unit of y is independent of x, e.g. quantum efficiency, absorption spectrum, etc.
+    - Sepctral density. The unit of y is per [x-unit]. For example, the Black-body radiation spectrum is often in the unit of energy/nm/m^2
+    - Photon flux: y is number of photons. When converting y into energy (J), it has to be multiplied by its photon energy.
+
+    The arrays ``core_x`` and ``core_y`` are read-only. Arithmetic operations return new objects that share ``core_x``
+    with their parent and only allocate a new ``core_y``. To change the values of a spectrum, assign a new array to
+    ``core_y`` or call ``set_spectrum()``.
+
+    The arrays returned by ``get_spectrum()`` are cached for each combination of units, so that repeated calls do not
+    redo the unit conversions. Assigning ``core_x`` or ``core_y`` or calling ``set_spectrum()`` clears the cache.
+
+    ``core_x`` and ``core_y`` are stored in ``dtype``, which is np.float64 by default. Pass ``dtype=np.float32`` or call
+    ``astype(np.float32)`` to store a large collection of spectra in half of the memory. The unit conversions are done
+    in double precision before the values are rounded to single precision, so each stored value has a relative error
+    of less than 6e-8. ``rsum()``, ``band_integral()`` and ``calc_jsc()`` accumulate the integrals in double precision,
+    so the relative error of the integrated values stays below 1e-6.
+
+    """
+
+    #: storage dtype of core_x and core_y
+    dtype = np.dtype(np.float64)
+
+    # A scaled view (see scaled()) shares the arrays of its unscaled spectrum _base, and its y is _scale times y of
+    # _base.
+    _scale = 1.0
+    _base = None
+
+    def __init__(self, x_data, y_data, x_unit, y_unit="", is_spec_density=False, is_photon_flux=False,
+                 dtype=np.float64):
+        """
+        Constructor of the spectrum y(x)
+
+        :param is_spec_density:
+        :param x_data: x data of the spectrum (1d numpy array)
+        :param y_data: y data of the spectrum (1d numpy array)
+        :param x_unit: the unit of x (string), e.g. 'nm', 'eV'
+        :param y_unit: (string) If y is per area, put area unit here, e.g. 'm-2' or 'cm-2'.
+                Put null string '' if y does not have area unit
+        :param is_photon_flux: (boolean). True if y is number of photons.
+        :param dtype: storage dtype of core_x and core_y, np.float64 (default) or np.float32
+        """
+
+        # TODO: fix docstring's y unit
+        self.set_spectrum(x_data=x_data, y_data=y_data, x_unit=x_unit,
+                          y_area_unit=y_unit,
+                          is_photon_flux=is_photon_flux,
+                          is_spec_density=is_spec_density,
+                          dtype=dtype)
+
+    def set_spectrum(self, x_data, y_data, x_unit, y_area_unit, is_photon_flux, is_spec_density, dtype=None):
+        """
+        This is essentially a constructor method that sets up the attributes of the object.
+        It converts everything to standard MKS unit. x_data: 'm', y_data: '[]/m^2-m'
+
+        :param x_data: x data of the spectrum (1d numpy array)
+        :param y_data: y data of the spectrum (1d numpy array)
+        :param x_unit: the unit of x (string), e.g. 'nm', 'eV'
+        :type x_unit: str
+        :param y_area_unit: If y is per area, put area unit here, e.g. 'm**-2' or 'cm**-2'. Put null string '' if y does not have area unit
+        :type y_area_unit: str
+        :param is_photon_flux: True if y is number of photons.
+        :type is_photon_flux: bool
+        :param is_spec_density: True if y is spectral density.
+        :type is_spec_density: bool
+        :param dtype: storage dtype of core_x and core_y. Keep the current dtype of the object if it is None.
+        :return: None
+        """
+
+        assert isinstance(x_data, np.ndarray)
+        assert isinstance(y_data, np.ndarray)
+        assert isinstance(x_unit, str)
+        assert isinstance(y_area_unit, str)
+        assert isinstance(is_photon_flux, bool)
+        assert isinstance(is_spec_density, bool)
+
+        if dtype is not None:
+            self.dtype = _check_dtype(dtype)
+
+        # Convert everything to photon energy : [arb]/m^2-m
+
+        self.is_spec_density = is_spec_density
+
+        if y_area_unit != '':
+            core_x, core_y = self.convert_spectrum_unit(x_data, y_data, from_x_unit=x_unit, to_x_unit='m',
+                                                        from_y_area_unit=y_area_unit, to_y_area_unit='m**-2',
+                                                        is_spec_density=self.is_spec_density)
+            self.y_area_unit = 'm**-2'
+        else:
+            core_x, core_y = self.convert_spectrum_unit(x_data, y_data, from_x_unit=x_unit, to_x_unit='m',
+                                                        from_y_area_unit='', to_y_area_unit='',
+                                                        is_spec_density=self.is_spec_density)
+            self.y_area_unit = ''
+
+        # Convert photon flux to energy (J) representation
+        if is_photon_flux:
+            core_y = self._as_energy(core_x, core_y)
+
+        # Round to the storage dtype after all the conversions
+        self.core_x, self.core_y = core_x, core_y
+
+    @property
+    def core_x(self):
+        """
+        x data in the core unit (m). The array is read-only.
+        """
+        return self._core_x
+
+    @core_x.setter
+    def core_x(self, value):
+        # core_x is shared by all the spectra derived from this one, therefore it should never be changed in place
+        self._core_x = _read_only(value, self.dtype)
+        self._reset()
+
+    @property
+    def core_y(self):
+        """
+        y data in the core unit ([]/m^2-m for spectral density). The array is read-only.
+        """
+        if self._scale == 1.0:
+            return self._core_y
+
+        # A scaled view only creates the scaled array when it is needed
+        core_y = self._cache.get('scaled_core_y')
+        if core_y is None:
+            core_y = _freeze(np.asarray(self._core_y * self._scale, dtype=self.dtype))
+            self._cache['scaled_core_y'] = core_y
+
+        return core_y
+
+    @core_y.setter
+    def core_y(self, value):
+        self._core_y = _read_only(value, self.dtype)
+        self._reset()
+
+    def _reset(self):
+        """
+        Clear the cache and detach the object from the spectrum that it is a scaled view of.
+        """
+        self._cache = {}
+        self._scale = 1.0
+        self._base = None
+
+    @property
+    def scale(self):
+        """
+        The multiplier of a scaled view created by ``scaled()``. It is 1.0 for other spectra.
+        """
+        return self._scale
+
+    def scaled(self, factor):
+        """
+        Get a view of this spectrum with y multiplied by factor, e.g. the illumination at a concentration.
+
+        The view shares all the arrays and cached results with this spectrum and only carries the multiplier,
+        so creating it does not allocate any array. ``rsum()``, ``band_integral()``, ``calc_jsc()`` and
+        ``calc_jsc_from_eg()`` work on the unscaled data and multiply the result by the factor. The scaled values of y
+        are only computed when they are accessed, e.g. by ``get_spectrum()`` or an arithmetic operation with another
+        spectrum. Multiplying a spectrum by a scalar, e.g. ``ill * 100``, still returns a normal spectrum.
+        If the data of this spectrum are replaced later, e.g. by ``set_spectrum()``, the view keeps the old data.
+
+        :param factor: the multiplier (scalar)
+        :return: a new object of the same class
+        """
+
+        base = self.unscaled()
+
+        newobj = copy.copy(base)
+        newobj._cache = {}
+        newobj._base = base
+        newobj._scale = self._scale * factor
+
+        return newobj
+
+    def unscaled(self):
+        """
+        Get the spectrum that this object is a scaled view of, i.e. the spectrum with y divided by ``scale``.
+
+        :return: the unscaled spectrum, or this object itself if it is not a scaled view
+        """
+
+        base = self._base
+        if base is None:
+            return self
+
+        if base._core_x is not self._core_x or base._core_y is not self._core_y:
+            # The data of the base were replaced after this view was created. The view keeps the arrays that it
+            # was created with, so it is detached into a base of its own to stay consistent with core_x and core_y.
+            base = copy.copy(self)
+            base._cache = {}
+            base._scale = 1.0
+            base._base = None
+            self._base = base
+
+        return base
+
+    def fingerprint(self):
+        """
+        A hash of the data and the unit attributes of the spectrum. Two spectra have the same fingerprint if and
+        only if they have the same x, y, dtype, y_area_unit and is_spec_density (barring hash collisions).
+        The fingerprint is cached until the spectrum is changed.
+
+        :return: the fingerprint as a hex string
+        :rtype: str
+        """
+
+        fp = self._cache.get('fingerprint')
+        if fp is not None:
+            return fp
+
+        h = hashlib.blake2b(digest_size=16)
+        h.update(json.dumps([self.dtype.str, self.y_area_unit, self.is_spec_density,
+                             self.core_x.size]).encode())
+        h.update(np.ascontiguousarray(self.core_x).view(np.uint8))
+        h.update(np.ascontiguousarray(self.core_y).view(np.uint8))
+
+        fp = h.hexdigest()
+        self._cache['fingerprint'] = fp
+
+        return fp
+
+    def astype(self, dtype):
+        """
+        Get a copy of the spectrum stored in another dtype, e.g. ``sp.astype(np.float32)`` for the compact storage.
+
+        :param dtype: np.float64 or np.float32
+        :return: a new spectrum of the same class. It shares the arrays with this object if the dtype is the same.
+        """
+
+        newobj = copy.copy(self)
+        newobj.dtype = _check_dtype(dtype)
+        newobj.core_x = self.core_x
+        newobj.core_y = self.core_y
+
+        return newobj
+
+    def convert_spectrum_unit(self, x_data, y_data, from_x_unit, to_x_unit,
+                              from_y_area_unit, to_y_area_unit,
+                              is_spec_density):
+
+        """
+        A general method for converting the spectrum y(x) from one set of unit to another.
+        Note that this only supports the conversion of x from:
+        [length]<->[frequency]
+        [length]<-> 1/[length]
+        [length]<->[energy]
+
+        This is because Spectrum class converts the units of x to [length] first when initilizing or new spectrum is set.
+        Therefore this function only implments the bi-direction unit conversions that involves [length].
+
+        :param x_data: data of x (numpy array)
+        :param y_data: data of y (numpy array)
+        :param from_x_unit: the unit of x_data
+        :param to_x_unit: the unit of x_data to be converted to
+        :param from_y_area_unit: the unit of area of y_data
+        :param to_y_area_unit: the unit of area of y_data tobe converted to
+        :param is_spec_density: True if the data is spectral density.
+        :return: a tuple of 1-d array (new_x_data, new_y_data)
+        """
+
+        assert isinstance(x_data, np.ndarray)
+        assert isinstance(y_data, np.ndarray)
+        assert isinstance(from_x_unit, str)
+        assert isinstance(to_x_unit, str)
+        assert isinstance(from_y_area_unit, str)
+        assert isinstance(to_y_area_unit, str)
+        assert isinstance(is_spec_density, bool)
+
+        if x_data.size != y_data.size:
+            raise ValueError("The array size of x_data and y_data do not match.")
+
+        plan = _get_conversion_plan(from_x_unit, to_x_unit, from_y_area_unit, to_y_area_unit, is_spec_density)
+
+        return plan.apply(x_data, y_data)
+
+    def get_spectrum(self, to_x_unit, to_y_area_unit=None, to_photon_flux=False, dtype=np.float64):
+        """
+        Retrieve the values of the spectrum based on the given units of x and y.
+        The values are converted in double precision, whatever the storage dtype of the spectrum is.
+
+        :param to_x_unit: the unit of x
+        :param to_y_area_unit: the unit of area of y. Default is the y_area_unit of the object.
+        :param to_photon_flux: True if converting y to photon flux.
+        :param dtype: the dtype of the returned array, np.float64 (default) or np.float32
+        :return: a 2xL numpy array. The array is cached and read-only.
+        """
+
+        if to_y_area_unit is None:
+            to_y_area_unit = self.y_area_unit
+
+        dtype = _check_dtype(dtype)
+        key = ('view', to_x_unit, to_y_area_unit, to_photon_flux, dtype)
+
+        view = self._cache.get(key)
+        if view is not None:
+            return view
+
+        core_x = np.asarray(self.core_x, dtype=np.float64)
+        x_data, y_data = self.convert_spectrum_unit(core_x, np.asarray(self.core_y, dtype=np.float64),
+                                                    from_x_unit='m', to_x_unit=to_x_unit,
+                                                    from_y_area_unit=self.y_area_unit, to_y_area_unit=to_y_area_unit,
+                                                    is_spec_density=self.is_spec_density)
+
+        # convert the spectrum to photon flux if necessary
+        if to_photon_flux:
+            y_data = self._as_photon_flux(core_x, y_data)
+
+        # Sort the spectrum by wavelength
+        sorted_idx = np.argsort(x_data)
+        x_data = x_data[sorted_idx]
+        y_data = y_data[sorted_idx]
+
+        view = _freeze(np.vstack((x_data, y_data)).astype(dtype, copy=False))
+        self._cache[key] = view
+
+        return view
+
+    def get_interp_spectrum(self, to_x_data, to_x_unit, to_y_area_unit=None, to_photon_flux=False, interp_left=None,
+                            interp_right=None, raise_error=True):
+
+        """
+        Get interpolated spectrum.
+
+        :param raise_error: if to_x_data is not within the range of the spectru, raise ValueError
+        :param to_x_data: (ndarray) x values to be interpolated
+        :param to_x_unit: (string) unit of x of the output value
+        :param to_y_area_unit: (string) unit of area of y of the output value.
+        :param to_photon_flux: (bool) True if converting the value to photon flux as the output
+        :param interp_left: value to return for x < core_x[0], return core_x[0] if set to be None
+        :param interp_right: value to return for x> core_x[-1], return core_y[-1] if set to be None
+        :return: a 2xL array
+        """
+
+        orig_spectrum = self.get_spectrum(to_x_unit, to_y_area_unit, to_photon_flux=to_photon_flux)
+
+        # If to_x_data is read-only, it is probably a grid that will be used again, e.g. core_x of another spectrum.
+        # Use a cached Resampler in this case.
+        resampler = get_resampler(orig_spectrum[0, :], to_x_data) if _is_immutable(to_x_data) else None
+
+        # The resampler already knows whether all the points are within the range
+        if resampler is not None and not (resampler.has_below or resampler.has_above):
+            out_of_bound = False
+        else:
+            out_of_bound = _is_out_of_bound(to_x_data, orig_spectrum[0, 0], orig_spectrum[0, -1], self.dtype)
+
+        if out_of_bound:
+            if raise_error == True:
+                raise ValueError("The interped value is out of bound")
+
+        output_spectrum = np.zeros((2, to_x_data.shape[0]))
+
+        output_spectrum[0, :] = to_x_data
+
+        if resampler is not None:
+            output_spectrum[1, :] = resampler.resample(orig_spectrum[1, :], left=interp_left, right=interp_right)
+        else:
+            output_spectrum[1, :] = np.interp(to_x_data, orig_spectrum[0, :],
+                                              orig_spectrum[1, :], left=interp_left, right=interp_right)
+
+        return output_spectrum
+
+    def __add__(self, s2):
+
+        return self._arith_op(s2, np.add)
+
+    def __sub__(self, s2):
+
+        return self._arith_op(s2, np.subtract)
+
+    def __truediv__(self, s2):
+
+        return self._arith_op(s2, np.divide)
+
+    def __mul__(self, s2):
+
+        return self._arith_op(s2, np.multiply)
+
+    def __radd__(self, s2):
+
+        return self._arith_op(s2, np.add)
+
+    def __rsub__(self, s2):
+
+        return self._arith_op(s2, np.subtract) * (-1)
+
+    def __rmul__(self, s2):
+
+        return self._arith_op(s2, np.multiply)
+
+    def __rtruediv__(self, s2):
+
+        return self._inverse()._arith_op(s2, np.multiply)
+
+    def _inverse(self):
+
+        if self.y_area_unit != '':
+            print("Warning: y data is not dimensionless!")
+
+        return self._derive(1 / self.core_y)
+
+    def lazy(self):
+        """
+        Start a lazy arithmetic expression from this spectrum.
+        Arithmetic operations on the returned object build an expression tree instead of evaluating each operation.
+        The expression is evaluated when its values are needed, e.g. by ``rsum()``, ``get_spectrum()`` or
+        ``calc_jsc()``. See ``LazySpectrum``.
+
+        :return: a LazySpectrum that wraps this spectrum
+        :rtype: LazySpectrum
+        """
+
+        return LazySpectrum(None, (self,))
+
+    def _derive(self, core_y):
+        """
+        Create a new spectrum with new values of y. The new object shares core_x and the unit attributes
+        with this object instead of copying them.
+
+        :param core_y: the new values of y, in the core unit of this spectrum. It should be a new array that is not
+            used anywhere else, because it is made read-only instead of being copied.
+        :type core_y: np.ndarray
+        :return: the new Spectrum instance
+        """
+
+        newobj = copy.copy(self)
+        newobj.core_y = _freeze(core_y)
+
+        return newobj
+
+    def _arith_op(self, s2, op):
+        """
+        Do the arithmetic operations
+
+        :param s2: an instance of Spectrum
+        :type s2: Spectrum,float
+        :param op: numpy ufunc, such as np.add, np.substract, np.multiply, np.divide
+        :return: the new Spectrum instance.
+        """
+
+        if isinstance(s2, LazySpectrum):
+            return LazySpectrum(op, (self, s2))
+
+        elif isinstance(s2, Spectrum):
+            return self._spec_arith_op(s2, op, inplace=False)
+
+        elif isinstance(s2, SpectrumBatch):
+            # Let SpectrumBatch handle the reflected operation
+            return NotImplemented
+
+        else:
+            try:
+                new_core_y = op(self.core_y, s2)
+
+                if self.core_x.shape != new_core_y.shape:
+                    raise Exception("The multipler should either be a scalar or a Spectrum calss object"
+                                    ", or an ndarray that matches the length of the spectrum")
+
+                return self._derive(new_core_y)
+            except (TypeError, AttributeError) as err:
+                raise err(
+                    "Runtime Error: The multipler should either be a scalar or a Spectrum class object when doing Spectrum multiplication")
+
+    def _spec_arith_op(self, s2, op, inplace=True):
+        """
+        Do the arithmetic operations of two Spectrum instances
+
+        :param s2: an instance of Spectrum
+        :type s2: Spectrum
+        :param op: numpy ufunc, such as np.add, np.substract, np.multiply, np.divide
+        :param inplace: True if the results overwrites the instance itself.
+        :type inplace: bool
+        :return: the new spectrum opject. Return None if inplace is set True
+        """
+
+        assert isinstance(s2, Spectrum)
+
+        new_spec = s2.get_interp_spectrum(self.core_x, 'm')
+
+        new_core_spec = op(self.core_y, new_spec[1, :])
+
+        if inplace:
+            self.core_y = _freeze(new_core_spec)
+            return None
+        else:
+            return self._derive(new_core_spec)
+
+    def _as_photon_flux(self, wavelength, energy_flux):
+        return _energy_to_photon_flux(wavelength, energy_flux)
+
+    def _as_energy(self, wavelength, photon_flux):
+        return _photon_flux_to_energy(wavelength, photon_flux)
+
+    def rsum(self):
+        """
+        Integration of the spectrum, i.e., \int y(x)dx
+        Internally, it simply does np.trapz(y,x)
+
+        :return:  The integrated value.
+        """
+
+        if self.is_spec_density == False:
+            raise ArithmeticError("This spectrum instance is not integrable, since self.is_spec_density is false")
+
+        else:
+            # The integral of the unscaled spectrum is cached, so that it is not recomputed for every scaled view
+            base = self.unscaled()
+            total = base._cache.get('rsum')
+            if total is None:
+                total = _trapz64(base.core_y, base.core_x)
+                base._cache['rsum'] = total
+
+            return self._scale * total
+
+    def _prefix_table(self, unit, photon_flux=False):
+        """
+        Get the cumulative integral of the spectrum over x in the given unit.
+        The table is cached until the spectrum is changed.
+
+        :param unit: the unit of x
+        :param photon_flux: True if y is converted to photon flux before integration
+        :return: a tuple of (x, y, slope, prefix), where slope[i] is the slope of y between x[i] and x[i+1],
+            and prefix[i] is the integral of y from x[0] to x[i]
+        """
+
+        key = ('prefix', unit, photon_flux)
+
+        table = self._cache.get(key)
+        if table is not None:
+            return table
+
+        sp = self.get_spectrum(to_x_unit=unit, to_photon_flux=photon_flux)
+
+        # Accumulate in double precision even if the spectrum is stored in single precision
+        x = np.asarray(sp[0, :], dtype=np.float64)
+        y = np.asarray(sp[1, :], dtype=np.float64)
+
+        dx = np.diff(x)
+        slope = np.divide(np.diff(y), dx, out=np.zeros_like(dx), where=dx > 0)
+
+        prefix = np.zeros_like(x)
+        np.cumsum(0.5 * (y[1:] + y[:-1]) * dx, out=prefix[1:])
+
+        table = (_freeze(x), _freeze(y), _freeze(slope), _freeze(prefix))
+        self._cache[key] = table
+
+        return table
+
+    def band_integral(self, starts, ends, unit, photon_flux=False):
+        """
+        Integrate the spectrum over one or many bands [start, end], i.e., \int_{start}^{end} y(x)dx.
+        The result is the same as integrating ``cut(start, end, unit).get_spectrum(unit)``, but all the bands are
+        looked up in a cached cumulative integral of the spectrum.
+        The parts of the bands that lie outside the range of the spectrum are not counted.
+
+        :param starts: the starting x of the bands (scalar or array)
+        :param ends: the end x of the bands (scalar or array), broadcast against ``starts``
+        :param unit: the unit of x
+        :param photon_flux: True if integrating the photon flux instead of the energy flux
+        :return: the integrated values, in the shape of the broadcast ``starts`` and ``ends``
+        """
+
+        if self.is_spec_density == False:
+            raise ArithmeticError("This spectrum instance is not integrable, since self.is_spec_density is false")
+
+        x, y, slope, prefix = self.unscaled()._prefix_table(unit, photon_flux)
+
+        def cumulative(t):
+            t = np.minimum(np.maximum(t, x[0]), x[-1])
+            # index of the interval [x[i], x[i+1]] that contains t
+            idx = np.searchsorted(x[1:-1], t, side='right')
+            dt = t - x[idx]
+            return prefix[idx] + dt * (y[idx] + 0.5 * slope[idx] * dt)
+
+        # starts and ends are broadcast by the subtraction
+        integral = cumulative(np.asarray(ends, dtype=float)) - cumulative(np.asarray(starts, dtype=float))
+
+        return (self._scale * integral)[()]
+
+    def cut(self, start, end, unit):
+        """
+        Cut a particular band of spectrum y(x), where start<x<end
+
+        :param start: the starting x
+        :param end: the end x
+        :param unit: the unit of x
+        :return: a new spectrum
+        """
+
+        bound_sp = self.get_interp_spectrum(to_x_data=np.array([start, end]), to_x_unit=unit)
+
+        center_sp = self.get_spectrum(to_x_unit=unit)
+
+        center_sp = center_sp[:, center_sp[0, :] >= start]
+        center_sp = center_sp[:, center_sp[0, :] <= end]
+
+        c_sp = np.hstack((bound_sp, center_sp))
+
+        # Sort the spectrum by wavelength
+        sorted_idx = np.argsort(c_sp[0, :])
+        c_sp = c_sp[:, sorted_idx]
+
+        new_spec = copy.copy(self)
+
+        new_spec.set_spectrum(c_sp[0, :], c_sp[1, :], x_unit=unit, y_area_unit=self.y_area_unit,
+                              is_spec_density=self.is_spec_density,
+                              is_photon_flux=False)
+
+        return new_spec
+
+    def save(self, file, name='spectrum'):
+        """
+        Save the spectrum into an uncompressed .npz file. See ``save_spectra()``.
+
+        :param file: file name or file object. '.npz' is appended to the file name if it does not have it.
+        :param name: the name of the spectrum in the file
+        :return: None
+        """
+
+        save_spectra(file, {name: self})
+
+    @classmethod
+    def load(cls, file, name=None, mmap=False):
+        """
+        Load a spectrum saved by ``save()`` or ``save_spectra()``.
+
+        :param file: file name or file object
+        :param name: the name of the spectrum in the file. It can be omitted if the file has only one spectrum.
+        :param mmap: True if memory-mapping the arrays instead of reading them into memory
+        :return: an instance of this class
+        """
+
+        return _load_entry(cls, file, name, mmap)
+
+    @classmethod
+    def _from_core(cls, core_x, core_y, y_area_unit, is_spec_density):
+        """
+        Create an object directly from the arrays in the core units, without any conversion.
+        """
+
+        newobj = cls.__new__(cls)
+        newobj.dtype = _check_dtype(core_y.dtype)
+        newobj.y_area_unit = y_area_unit
+        newobj.is_spec_density = is_spec_density
+        newobj.core_x = _freeze(core_x)
+        newobj.core_y = _freeze(core_y)
+
+        return newobj
+
+
+class LazySpectrum(Spectrum):
+    """
+    A spectrum defined by an arithmetic expression of other spectra, which is evaluated only when its values are
+    needed. Create one with ``Spectrum.lazy()``, for example: ::
+
+        transmitted = ill.lazy() * (1 - qe1) * (1 - qe2)
+        jsc = calc_jsc(transmitted, qe3)
+
+    Any arithmetic operation with a LazySpectrum operand returns another LazySpectrum.
+    When the values are needed, every spectrum in the expression is interpolated only once onto the x of the
+    left-most spectrum of the expression, and the whole expression is evaluated on those arrays in a single pass.
+    The x and unit attributes of the result follow the left-most spectrum, the same as evaluating the expression
+    eagerly. The evaluated values are kept, so the expression is evaluated only once.
+    """
+
+    def __init__(self, op, operands):
+        """
+        Create a node of the expression tree. Use ``Spectrum.lazy()`` to create a lazy spectrum instead of calling
+        this directly.
+
+        :param op: numpy ufunc, or None if this is a leaf that wraps a single Spectrum
+        :param operands: a tuple of operands. Each operand is a Spectrum, LazySpectrum, scalar or ndarray.
+        """
+
+        self._op = op
+        self._operands = operands
+        self._core_x = None
+        self._core_y = None
+        self._cache = {}
+
+        # The left-most spectrum determines x and the unit attributes of the expression
+        grid = next(opr for opr in operands if isinstance(opr, Spectrum))
+        if isinstance(grid, LazySpectrum):
+            grid = grid._grid
+        self._grid = grid
+
+        self.y_area_unit = grid.y_area_unit
+        self.is_spec_density = grid.is_spec_density
+        self.dtype = grid.dtype
+
+    @property
+    def is_evaluated(self):
+        """
+        True if the values of this expression have been evaluated.
+        """
+        return self._core_y is not None
+
+    @property
+    def core_x(self):
+        if self._core_y is None:
+            self._evaluate()
+        return self._core_x
+
+    @core_x.setter
+    def core_x(self, value):
+        Spectrum.core_x.fset(self, value)
+        self._op = None
+        self._operands = ()
+
+    @property
+    def core_y(self):
+        if self._core_y is None:
+            self._evaluate()
+        return self._core_y
+
+    @core_y.setter
+    def core_y(self, value):
+        Spectrum.core_y.fset(self, value)
+        self._op = None
+        self._operands = ()
+
+    def lazy(self):
+
+        return self
+
+    def materialize(self):
+        """
+        Evaluate the expression and return it as a normal Spectrum, which has the same class as the left-most
+        spectrum of the expression.
+
+        :return: the evaluated spectrum
+        :rtype: Spectrum
+        """
+
+        return self._grid._derive(self.core_y)
+
+    def _arith_op(self, s2, op):
+
+        if isinstance(s2, SpectrumBatch):
+            return NotImplemented
+
+        return LazySpectrum(op, (self, s2))
+
+    def _inverse(self):
+
+        if self.y_area_unit != '':
+            print("Warning: y data is not dimensionless!")
+
+        return LazySpectrum(np.divide, (1.0, self))
+
+    def scaled(self, factor):
+
+        return LazySpectrum(np.multiply, (self, factor))
+
+    def _evaluate(self):
+        """
+        Interpolate all the spectra in the expression onto the common x and evaluate the expression.
+        """
+
+        core_x = self._grid.core_x
+        leaf_values = {}
+
+        def leaf_value(sp):
+            # Each spectrum is interpolated only once, even if it appears in the expression several times
+            key = id(sp)
+            if key not in leaf_values:
+                if sp.core_x is core_x:
+                    leaf_values[key] = sp.core_y
+                else:
+                    leaf_values[key] = sp.get_interp_spectrum(core_x, 'm')[1, :]
+            return leaf_values[key]
+
+        def evaluate(node):
+            """
+            Return the values of a node and whether the array is a temporary that can be overwritten
+            """
+
+            if isinstance(node, LazySpectrum) and node._core_y is None:
+                if node._op is None:
+                    return leaf_value(node._operands[0]), False
+
+                a, a_is_temp = evaluate(node._operands[0])
+                b, b_is_temp = evaluate(node._operands[1])
+
+                # Reuse the temporary arrays to avoid allocating a new array for every operation
+                if a_is_temp and np.shape(a) == np.broadcast(a, b).shape:
+                    return node._op(a, b, out=a), True
+                elif b_is_temp and np.shape(b) == np.broadcast(a, b).shape:
+                    return node._op(a, b, out=b), True
+                else:
+                    return node._op(a, b), isinstance(a, np.ndarray) or isinstance(b, np.ndarray)
+
+            elif isinstance(node, Spectrum):
+                return leaf_value(node), False
+
+            else:
+                return node, False
+
+        core_y, _ = evaluate(self)
+
+        if np.shape(core_y) != core_x.shape:
+            raise ValueError("The multipler should either be a scalar or a Spectrum calss object"
+                             ", or an ndarray that matches the length of the spectrum")
+
+        # Keep the results and release the expression tree
+        self._core_x = core_x
+        self.core_y = _freeze(core_y)
+
+
+class SpectrumBatch(object):
+    """
+    A collection of N spectra y_i(x) that share the same x, e.g. the hourly solar spectra of a year.
+
+    The values of y are stored in an (N, L) array ``core_y`` on top of a single ``core_x`` of length L.
+    The units follow the same conventions as ``Spectrum``: x is stored in 'm', y is stored per 'm**-2' if it has an
+    area unit, and photon flux is stored as energy. Each row of the batch behaves like a ``Spectrum``, but all the
+    operations are carried out on the whole array at once.
+
+    Arithmetic operations work with scalars, ndarrays that can be broadcast to (N, L), ``Spectrum`` and
+    ``SpectrumBatch``. Like ``Spectrum``, the result is evaluated on x of the left operand, and the right operand is
+    interpolated when necessary. Use an (N, 1) array to multiply each spectrum by a different number.
+
+    Like ``Spectrum``, the arrays can be stored in single precision with ``dtype=np.float32``, while ``rsum()``
+    accumulates the integrals in double precision.
+    """
+
+    #: storage dtype of core_x and core_y
+    dtype = np.dtype(np.float64)
+
+    # Make numpy defer the arithmetic operations, e.g. np.float64(2)*batch, to SpectrumBatch
+    __array_ufunc__ = None
+
+    def __init__(self, x_data, y_data, x_unit, y_unit="", is_spec_density=False, is_photon_flux=False,
+                 dtype=np.float64):
+        """
+        Constructor of the spectrum batch
+
+        :param x_data: x data of the spectra (1d numpy array of length L)
+        :param y_data: y data of the spectra (2d numpy array of shape (N, L))
+        :param x_unit: the unit of x (string), e.g. 'nm', 'eV'
+        :param y_unit: (string) If y is per area, put area unit here, e.g. 'm**-2' or 'cm**-2'.
+                Put null string '' if y does not have area unit
+        :param is_spec_density: True if y is spectral density.
+        :param is_photon_flux: True if y is number of photons.
+        :param dtype: storage dtype of core_x and core_y, np.float64 (default) or np.float32
+        """
+
+        self.set_spectrum(x_data=x_data, y_data=y_data, x_unit=x_unit,
+                          y_area_unit=y_unit,
+                          is_photon_flux=is_photon_flux,
+                          is_spec_density=is_spec_density,
+                          dtype=dtype)
+
+    def set_spectrum(self, x_data, y_data, x_unit, y_area_unit, is_photon_flux, is_spec_density, dtype=None):
+        """
+        Set up the attributes of the object. See ``Spectrum.set_spectrum()``.
+
+        :param x_data: x data of the spectra (1d numpy array of length L)
+        :param y_data: y data of the spectra (2d numpy array of shape (N, L))
+        :param x_unit: the unit of x (string), e.g. 'nm', 'eV'
+        :param y_area_unit: If y is per area, put area unit here, e.g. 'm**-2' or 'cm**-2'.
+        :param is_photon_flux: True if y is number of photons.
+        :param is_spec_density: True if y is spectral density.
+        :param dtype: storage dtype of core_x and core_y. Keep the current dtype of the object if it is None.
+        :return: None
+        """
+
+        assert isinstance(x_data, np.ndarray)
+        assert isinstance(y_data, np.ndarray)
+        assert isinstance(x_unit, str)
+        assert isinstance(y_area_unit, str)
+        assert isinstance(is_photon_flux, bool)
+        assert isinstance(is_spec_density, bool)
+
+        y_data = np.atleast_2d(y_data)
+
+        if x_data.ndim != 1 or y_data.ndim != 2 or y_data.shape[1] != x_data.size:
+            raise ValueError("y_data should be an (N, L) array, where L is the size of x_data.")
+
+        if dtype is not None:
+            self.dtype = _check_dtype(dtype)
+
+        self.is_spec_density = is_spec_density
+
+        if y_area_unit != '':
+            self.y_area_unit = 'm**-2'
+        else:
+            self.y_area_unit = ''
+
+        plan = _get_conversion_plan(x_unit, 'm', y_area_unit, self.y_area_unit, is_spec_density)
+        core_x, core_y = plan.apply(x_data, y_data)
+
+        if is_photon_flux:
+            core_y = _photon_flux_to_energy(core_x, core_y)
+
+        self.core_x = _read_only(core_x, self.dtype)
+        self.core_y = _read_only(core_y, self.dtype)
+
+    @classmethod
+    def from_spectra(cls, spectra, x_data=None, x_unit='m', dtype=np.float64):
+        """
+        Stack a list of Spectrum onto a common x. The spectra should have the same unit attributes.
+
+        :param spectra: a list of Spectrum
+        :type spectra: List[Spectrum]
+        :param x_data: the common x values. Use core_x of the first spectrum if it is None.
+        :param x_unit: the unit of x_data
+        :param dtype: storage dtype of the batch
+        :return: a new SpectrumBatch
+        :rtype: SpectrumBatch
+        """
+
+        first = spectra[0]
+
+        for sp in spectra:
+            if sp.y_area_unit != first.y_area_unit or sp.is_spec_density != first.is_spec_density:
+                raise ValueError("The spectra should have the same y_area_unit and is_spec_density.")
+
+        if x_data is None:
+            x_data = first.core_x
+            x_unit = 'm'
+
+        y_data = np.vstack([sp.get_interp_spectrum(x_data, x_unit)[1, :] for sp in spectra])
+
+        return cls(x_data, y_data, x_unit=x_unit, y_unit=first.y_area_unit,
+                   is_spec_density=first.is_spec_density, is_photon_flux=False, dtype=dtype)
+
+    def __len__(self):
+
+        return self.core_y.shape[0]
+
+    def __getitem__(self, index):
+        """
+        Get a Spectrum by an integer index, or a new SpectrumBatch by a slice or an array of indices
+        """
+
+        if isinstance(index, (int, np.integer)):
+            return Spectrum(self.core_x, self.core_y[index], x_unit='m', y_unit=self.y_area_unit,
+                            is_spec_density=self.is_spec_density, is_photon_flux=False, dtype=self.dtype)
+        else:
+            return self._derive(np.atleast_2d(self.core_y[index]))
+
+    def get_spectrum(self, to_x_unit, to_y_area_unit=None, to_photon_flux=False, dtype=np.float64):
+        """
+        Retrieve the values of the spectra based on the given units of x and y.
+        The values are converted in double precision, whatever the storage dtype of the batch is.
+
+        :param to_x_unit: the unit of x
+        :param to_y_area_unit: the unit of area of y. Default is the y_area_unit of the object.
+        :param to_photon_flux: True if converting y to photon flux.
+        :param dtype: the dtype of the returned arrays, np.float64 (default) or np.float32
+        :return: a tuple (x_data, y_data). x_data is an 1D array of length L, and y_data is an (N, L) array.
+        """
+
+        if to_y_area_unit is None:
+            to_y_area_unit = self.y_area_unit
+
+        dtype = _check_dtype(dtype)
+        core_x = np.asarray(self.core_x, dtype=np.float64)
+
+        plan = _get_conversion_plan('m', to_x_unit, self.y_area_unit, to_y_area_unit, self.is_spec_density)
+        x_data, y_data = plan.apply(core_x, np.asarray(self.core_y, dtype=np.float64))
+
+        if to_photon_flux:
+            y_data = _energy_to_photon_flux(core_x, y_data)
+
+        sorted_idx = np.argsort(x_data)
+
+        return x_data[sorted_idx].astype(dtype, copy=False), y_data[:, sorted_idx].astype(dtype, copy=False)
+
+    def get_interp_spectrum(self, to_x_data, to_x_unit, to_y_area_unit=None, to_photon_flux=False, interp_left=None,
+                            interp_right=None, raise_error=True):
+        """
+        Get the spectra interpolated at to_x_data. See ``Spectrum.get_interp_spectrum()``.
+
+        :param to_x_data: (ndarray) x values to be interpolated
+        :param to_x_unit: (string) unit of x of the output value
+        :param to_y_area_unit: (string) unit of area of y of the output value.
+        :param to_photon_flux: (bool) True if converting the value to photon flux as the output
+        :param interp_left: value to return for x < x_min, return y at x_min if set to be None
+        :param interp_right: value to return for x > x_max, return y at x_max if set to be None
+        :param raise_error: if to_x_data is not within the range of the spectra, raise ValueError
+        :return: a tuple (to_x_data, y_data). y_data is an (N, M) array, where M is the size of to_x_data.
+        """
+
+        x_data, y_data = self.get_spectrum(to_x_unit, to_y_area_unit, to_photon_flux=to_photon_flux)
+
+        if _is_out_of_bound(to_x_data, x_data[0], x_data[-1], self.dtype):
+            if raise_error:
+                raise ValueError("The interped value is out of bound")
+
+        return to_x_data, get_resampler(x_data, to_x_data).resample(y_data, left=interp_left, right=interp_right)
 
     def rsum(self):
         """
-        Integration of the spectrum, i.e., \int y(x)dx
-        Internally, it simply does np.trapz(y,x)
+        Integration of each spectrum, i.e., \\int y_i(x)dx
 
-        :return:  The integrated value.
+        :return: an 1D array of the integrated values
         """
 
         if self.is_spec_density == False:
             raise ArithmeticError("This spectrum instance is not integrable, since self.is_spec_density is false")
 
+        return _trapz64(self.core_y, self.core_x, axis=-1)
+
+    def _derive(self, core_y):
+        """
+        Create a new batch that shares core_x and the unit attributes with this object, but has new values of y.
+
+        :param core_y: the new (N, L) values of y
+        :return: the new SpectrumBatch instance
+        """
+
+        newobj = copy.copy(self)
+        newobj.core_y = _freeze(np.asarray(core_y, dtype=self.dtype))
+
+        return newobj
+
+    def astype(self, dtype):
+        """
+        Get a copy of the batch stored in another dtype, e.g. ``batch.astype(np.float32)``.
+
+        :param dtype: np.float64 or np.float32
+        :return: a new SpectrumBatch
+        """
+
+        newobj = copy.copy(self)
+        newobj.dtype = _check_dtype(dtype)
+        newobj.core_x = _freeze(np.asarray(self.core_x, dtype=newobj.dtype))
+        newobj.core_y = _freeze(np.asarray(self.core_y, dtype=newobj.dtype))
+
+        return newobj
+
+    def save(self, file, name='batch'):
+        """
+        Save the batch into an uncompressed .npz file. See ``save_spectra()``.
+
+        :param file: file name or file object. '.npz' is appended to the file name if it does not have it.
+        :param name: the name of the batch in the file
+        :return: None
+        """
+
+        save_spectra(file, {name: self})
+
+    @classmethod
+    def load(cls, file, name=None, mmap=False):
+        """
+        Load a batch saved by ``save()`` or ``save_spectra()``.
+        With ``mmap=True``, the rows of the batch are only read from the disk when they are used.
+
+        :param file: file name or file object
+        :param name: the name of the batch in the file. It can be omitted if the file has only one entry.
+        :param mmap: True if memory-mapping the arrays instead of reading them into memory
+        :return: a SpectrumBatch
+        """
+
+        return _load_entry(cls, file, name, mmap)
+
+    @classmethod
+    def _from_core(cls, core_x, core_y, y_area_unit, is_spec_density):
+        """
+        Create a batch directly from the arrays in the core units, without any conversion.
+        """
+
+        newobj = cls.__new__(cls)
+        newobj.dtype = _check_dtype(core_y.dtype)
+        newobj.y_area_unit = y_area_unit
+        newobj.is_spec_density = is_spec_density
+        newobj.core_x = _freeze(np.asarray(core_x, dtype=newobj.dtype))
+        newobj.core_y = _freeze(np.asarray(core_y, dtype=newobj.dtype))
+
+        return newobj
+
+    def _operand_values(self, s2, core_x):
+        """
+        Get the values of an operand evaluated at core_x (in 'm')
+        """
+
+        if isinstance(s2, Spectrum):
+            return s2.get_interp_spectrum(core_x, 'm')[1, :]
+        elif isinstance(s2, SpectrumBatch):
+            return s2.get_interp_spectrum(core_x, 'm')[1]
         else:
-            return np.trapz(self.core_y, self.core_x)
+            return s2
 
-    def cut(self, start, end, unit):
+    def _arith_op(self, s2, op):
         """
-        Cut a particular band of spectrum y(x), where start<x<end
+        Do the arithmetic operation op(self, s2) on core_x of this batch.
 
-        :param start: the starting x
-        :param end: the end x
-        :param unit: the unit of x
-        :return: a new spectrum
+        :param s2: scalar, ndarray, Spectrum or SpectrumBatch
+        :param op: numpy ufunc, such as np.add, np.substract, np.multiply, np.divide
+        :return: the new SpectrumBatch instance
         """
 
-        bound_sp = self.get_interp_spectrum(to_x_data=np.array([start, end]), to_x_unit=unit)
+        new_core_y = op(self.core_y, self._operand_values(s2, self.core_x))
 
-        center_sp = self.get_spectrum(to_x_unit=unit)
+        if new_core_y.ndim != 2 or new_core_y.shape[1] != self.core_x.size:
+            raise ValueError("The operand cannot be broadcast to the shape of this batch")
 
-        center_sp = center_sp[:, center_sp[0, :] >= start]
-        center_sp = center_sp[:, center_sp[0, :] <= end]
+        return self._derive(new_core_y)
 
-        c_sp = np.hstack((bound_sp, center_sp))
+    def _reflected_arith_op(self, s2, op):
+        """
+        Do the arithmetic operation op(s2, self). If s2 is a Spectrum, the result is evaluated on core_x of s2.
 
-        # Sort the spectrum by wavelength
-        sorted_idx = np.argsort(c_sp[0, :])
-        c_sp = c_sp[:, sorted_idx]
+        :param s2: scalar, ndarray or Spectrum
+        :param op: numpy ufunc, such as np.add, np.substract, np.multiply, np.divide
+        :return: the new SpectrumBatch instance
+        """
+
+        if isinstance(s2, Spectrum):
+            batch_y = self.get_interp_spectrum(s2.core_x, 'm')[1]
+            newobj = copy.copy(self)
+            newobj.core_x = s2.core_x
+            newobj.y_area_unit = s2.y_area_unit
+            newobj.is_spec_density = s2.is_spec_density
+            newobj.dtype = s2.dtype
+            newobj.core_y = _freeze(np.asarray(op(s2.core_y, batch_y), dtype=s2.dtype))
+            return newobj
 
-        new_spec = copy.deepcopy(self)
+        return self._derive(op(s2, self.core_y))
 
-        new_spec.set_spectrum(c_sp[0, :], c_sp[1, :], x_unit=unit, y_area_unit=self.y_area_unit,
-                              is_spec_density=self.is_spec_density,
-                              is_photon_flux=False)
+    def __add__(self, s2):
 
-        return new_spec
+        return self._arith_op(s2, np.add)
+
+    def __sub__(self, s2):
+
+        return self._arith_op(s2, np.subtract)
+
+    def __mul__(self, s2):
+
+        return self._arith_op(s2, np.multiply)
+
+    def __truediv__(self, s2):
+
+        return self._arith_op(s2, np.divide)
+
+    def __radd__(self, s2):
+
+        return self._reflected_arith_op(s2, np.add)
+
+    def __rsub__(self, s2):
+
+        return self._reflected_arith_op(s2, np.subtract)
+
+    def __rmul__(self, s2):
+
+        return self._reflected_arith_op(s2, np.multiply)
+
+    def __rtruediv__(self, s2):
+
+        return self._reflected_arith_op(s2, np.divide)
+
+
+def save_spectra(file, spectra):
+    """
+    Save a collection of Spectrum and SpectrumBatch objects into a single uncompressed .npz file.
+
+    Each entry is stored as its core arrays plus a small JSON record of its unit attributes, so loading it does
+    not parse any text or convert any unit. Entries that share the same core_x only store it once.
+    The file is not compressed, so that ``load_spectra(file, mmap=True)`` can memory-map the arrays.
+
+    :param file: file name or file object. '.npz' is appended to the file name if it does not have it.
+    :param spectra: a dict of {name: Spectrum or SpectrumBatch}. The names should not contain '/'.
+    :return: None
+    """
+
+    arrays = {}
+    x_names = {}
+
+    for name, sp in spectra.items():
+        if '/' in name:
+            raise ValueError("The name of a spectrum should not contain '/': %s" % name)
+
+        if isinstance(sp, SpectrumBatch):
+            sp_type = 'SpectrumBatch'
+        elif isinstance(sp, Spectrum):
+            sp_type = 'Spectrum'
+        else:
+            raise TypeError("%s is not a Spectrum or SpectrumBatch" % name)
+
+        core_x = sp.core_x
+        if id(core_x) not in x_names:
+            x_names[id(core_x)] = '_x%d' % len(x_names)
+            arrays[x_names[id(core_x)]] = core_x
+
+        meta = {'type': sp_type, 'x': x_names[id(core_x)],
+                'y_area_unit': sp.y_area_unit, 'is_spec_density': sp.is_spec_density}
+
+        arrays[name + '/meta'] = np.array(json.dumps(meta))
+        arrays[name + '/y'] = sp.core_y
+
+    np.savez(file, **arrays)
+
+
+def load_spectra(file, mmap=False):
+    """
+    Load all the spectra saved by ``save_spectra()``.
+
+    With ``mmap=True``, the arrays are memory-mapped read-only from the file, so only the parts that are actually
+    used are read from the disk. This requires file to be a file name.
+
+    :param file: file name or file object
+    :param mmap: True if memory-mapping the arrays instead of reading them into memory
+    :return: a dict of {name: Spectrum or SpectrumBatch}, in the order they were saved
+    """
+
+    arrays = _read_npz(file, mmap)
+
+    spectra = OrderedDict()
+    for name in _entry_names(arrays):
+        meta = json.loads(str(arrays[name + '/meta']))
+        cls = SpectrumBatch if meta['type'] == 'SpectrumBatch' else Spectrum
+        spectra[name] = _build_entry(cls, arrays, name, meta)
+
+    return spectra
+
+
+def _entry_names(arrays):
+    return [member[:-len('/meta')] for member in arrays if member.endswith('/meta')]
+
+
+def _build_entry(cls, arrays, name, meta):
+
+    if (meta['type'] == 'SpectrumBatch') != issubclass(cls, SpectrumBatch):
+        raise TypeError("%s is a %s, which cannot be loaded as %s" % (name, meta['type'], cls.__name__))
+
+    return cls._from_core(arrays[meta['x']], arrays[name + '/y'],
+                          y_area_unit=meta['y_area_unit'], is_spec_density=meta['is_spec_density'])
+
+
+def _load_entry(cls, file, name, mmap):
+    """
+    Load one entry of the file saved by save_spectra() as an instance of cls
+    """
+
+    arrays = _read_npz(file, mmap)
+    names = _entry_names(arrays)
+
+    if name is None:
+        if len(names) != 1:
+            raise ValueError("The file has %d entries. Specify the name of the entry to load." % len(names))
+        name = names[0]
+    elif name not in names:
+        raise KeyError("%s is not found in the file" % name)
+
+    meta = json.loads(str(arrays[name + '/meta']))
+
+    return _build_entry(cls, arrays, name, meta)
+
+
+def _read_npz(file, mmap):
+    """
+    Read all the arrays in an .npz file. If mmap is True, the numeric arrays stored without compression are
+    memory-mapped instead of being read into memory.
+
+    :param file: file name or file object
+    :param mmap: True if memory-mapping the arrays
+    :return: an OrderedDict of {name: array}
+    """
+
+    arrays = OrderedDict()
+
+    if not mmap:
+        with np.load(file, allow_pickle=False) as data:
+            for member in data.files:
+                arrays[member] = data[member]
+        return arrays
+
+    # The whole file is mapped once, and the arrays are views into it at the offsets of their data, so that a library
+    # of many spectra holds only one file descriptor.
+    mapped = None
+
+    with zipfile.ZipFile(file) as zf, open(file, 'rb') as fp:
+        for info in zf.infolist():
+            member = info.filename[:-len('.npy')]
+
+            # Locate the data of the member from its local file header: the name and the extra field
+            # follow the 30-byte fixed part of the header.
+            fp.seek(info.header_offset)
+            name_len, extra_len = struct.unpack('<HH', fp.read(30)[26:30])
+            fp.seek(info.header_offset + 30 + name_len + extra_len)
+
+            if info.compress_type != zipfile.ZIP_STORED:
+                with zf.open(info) as member_fp:
+                    arrays[member] = np.lib.format.read_array(member_fp, allow_pickle=False)
+                continue
+
+            version = np.lib.format.read_magic(fp)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(fp)
+            elif version == (2, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(fp)
+            else:
+                dtype = None
+
+            if dtype is not None and dtype.kind in 'fiu' and np.prod(shape) > 0:
+                if mapped is None:
+                    # The file is mapped read-only, so the members can be shared like frozen arrays
+                    mapped = _freeze(np.memmap(file, dtype=np.uint8, mode='r'))
+
+                offset = fp.tell()
+                array = mapped[offset:offset + int(np.prod(shape)) * dtype.itemsize].view(dtype)
+                if fortran_order:
+                    arrays[member] = array.reshape(shape[::-1]).T
+                else:
+                    arrays[member] = array.reshape(shape)
+            else:
+                fp.seek(info.header_offset + 30 + name_len + extra_len)
+                arrays[member] = np.lib.format.read_array(fp, allow_pickle=False)
+
+    return arrays
 
 
 if __name__ == "__main__":
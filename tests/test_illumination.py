@@ -1,5 +1,13 @@
 import unittest
-from pypvcell.illumination import load_astm
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+import numpy as np
+from pypvcell.illumination import load_astm, load_blackbody, load_blackbody_batch, SpectrumRegistry, \
+    BpFilter, bp_filter_batch, material_filter, material_filter_batch
+from pypvcell.spectrum import Spectrum
 
 
 class MyTestCase(unittest.TestCase):
@@ -15,6 +23,155 @@ class MyTestCase(unittest.TestCase):
         with self.assertRaises(ValueError):
             ill = load_astm(spec)
 
+    def test_load_blackbody_batch(self):
+        temperatures = np.array([300.0, 1500.0, 5778.0, 6000.0])
+
+        batch = load_blackbody_batch(temperatures)
+        self.assertEqual(len(batch), temperatures.size)
+        for i, T in enumerate(temperatures):
+            expected = load_blackbody(T).get_spectrum('nm')
+            x, y = batch.get_spectrum('nm')
+            assert np.allclose(x, expected[0, :])
+            assert np.allclose(y[i], expected[1, :], rtol=1e-10, atol=0)
+
+        # per-row normalization on a user-chosen grid
+        batch = load_blackbody_batch(temperatures[1:], normalize_to=[1000, 500, 100],
+                                     x_data=np.linspace(0.3, 4, num=500), x_unit='eV')
+        assert np.allclose(batch.rsum(), [1000, 500, 100])
+
+    def test_bp_filter_batch(self):
+        ill = load_astm("AM1.5g")
+        edges = np.linspace(1.0, 2.0, num=5)
+        ods = np.array([1, 2, 3, 2, 1])
+
+        for f_type in ["high_pass", "low_pass"]:
+            filters = bp_filter_batch(edges, f_type, OD=ods, energy_bound=(0.3, 6))
+            filtered = ill * filters
+            self.assertEqual(len(filtered), edges.size)
+
+            for i in range(edges.size):
+                expected = ill * BpFilter(edges[i], f_type, OD=ods[i], energy_bound=(0.3, 6))
+                assert np.allclose(filtered.core_y[i], expected.core_y, rtol=1e-10, atol=0)
+
+        self.assertRaises(ValueError, bp_filter_batch, edges, "band_pass")
+
+        # The same grid ends as BpFilter, up to the highest energy that every filter covers
+        for f_type in ["high_pass", "low_pass"]:
+            filters = bp_filter_batch(edges, f_type, OD=ods, energy_bound=(0.3, 6))
+            x, _ = filters.get_spectrum('eV')
+            scalar_x = BpFilter(edges[0], f_type, OD=ods[0], energy_bound=(0.3, 6)).get_spectrum('eV')[0, :]
+            self.assertEqual((x[0], x[-1]), (scalar_x[0], scalar_x[-1]))
+
+            flat = Spectrum(np.linspace(x[0], x[-1], num=500), np.ones(500), x_unit='eV')
+            filtered = flat * filters
+            for i in range(edges.size):
+                expected = flat * BpFilter(edges[i], f_type, OD=ods[i], energy_bound=(0.3, 6))
+                assert np.allclose(filtered.core_y[i], expected.core_y, rtol=1e-10, atol=0)
+
+            beyond = Spectrum(np.linspace(1, 6, num=50), np.ones(50), x_unit='eV')
+            with self.assertRaises(ValueError):
+                beyond * filters
+            with self.assertRaises(ValueError):
+                beyond * BpFilter(edges[0], f_type, OD=ods[0], energy_bound=(0.3, 6))
+
+    def test_material_filter_batch(self):
+        wl = np.linspace(300, 1200, num=100)
+        alpha = Spectrum(wl, np.linspace(1e7, 1e3, num=100), x_unit='nm')
+        thicknesses = np.array([1e-7, 1e-6, 1e-5])
+
+        filters = material_filter_batch(alpha, thicknesses)
+        for i, t in enumerate(thicknesses):
+            assert np.allclose(filters[i].core_y, material_filter(alpha, t).core_y)
+
+    def test_spectrum_registry(self):
+        registry = SpectrumRegistry()
+
+        ill = load_astm("AM1.5g")
+        self.assertIs(registry.add(ill), ill)
+        # identical spectra loaded elsewhere are deduplicated
+        self.assertIs(registry.add(load_astm("AM1.5g")), ill)
+        self.assertIsNot(registry.add(load_astm("AM0")), ill)
+        self.assertEqual(len(registry), 2)
+        self.assertIn(load_astm("AM1.5g"), registry)
+        self.assertIs(registry.get(ill.fingerprint()), ill)
+
+        self.assertAlmostEqual(registry.total_power(ill), ill.rsum())
+        self.assertAlmostEqual(registry.total_power(load_astm("AM1.5g")), ill.rsum())
+        info = registry.cache_info()
+        self.assertEqual((info.hits, info.misses, info.entries), (1, 1, 1))
+
+        x, flux = registry.photon_flux(ill, 'nm')
+        expected = ill.get_spectrum('nm', to_photon_flux=True)
+        assert np.allclose(x, expected[0, :]) and np.allclose(flux, expected[1, :])
+
+        x, cumulative = registry.cumulative_integral(ill, 'eV', photon_flux=True)
+        self.assertAlmostEqual(cumulative[-1], ill.band_integral(0, np.inf, 'eV', photon_flux=True))
+
+        # the least recently used results are evicted beyond the memory limit
+        registry = SpectrumRegistry(max_bytes=3 * ill.core_x.nbytes)
+        registry.photon_flux(ill, 'nm')
+        registry.photon_flux(ill, 'eV')
+        info = registry.cache_info()
+        self.assertEqual(info.entries, 1)
+        self.assertLessEqual(info.nbytes, info.max_bytes)
+        registry.photon_flux(ill, 'eV')
+        self.assertEqual(registry.cache_info().hits, 1)
+
+        registry = SpectrumRegistry(max_entries=2)
+        for unit in ['nm', 'eV', 'm']:
+            registry.photon_flux(ill, unit)
+        self.assertEqual(registry.cache_info().entries, 2)
+
+    def test_lazy_import(self):
+        # Importing the package should neither build the pint registry nor read the default spectra
+        code = ("import sys; import pypvcell.solarcell, pypvcell.illumination as ill; "
+                "print('pint' in sys.modules, ill._spec_data is not None)")
+        package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+        output = subprocess.check_output([sys.executable, '-c', code], cwd=package_dir)
+        self.assertEqual(output.split(), [b'False', b'False'])
+
+        # but they are still available as before
+        import pypvcell.illumination
+        import pypvcell.spectrum
+        self.assertIn("AM1.5g", pypvcell.illumination.spec_data)
+        self.assertEqual(pypvcell.spectrum.ug.parse_units('nm'), pypvcell.spectrum.ug.nm)
+
+    def test_disk_cache_opt_in(self):
+        # The spectrum and unit caches are only written when PYPVCELL_CACHE_DIR is set
+        code = ("import pypvcell.illumination as ill, pypvcell.spectrum as sp; "
+                "ill.load_astm('AM1.5g'); sp.ug.parse_units('nm')")
+        package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            env = dict(os.environ, HOME=tmpdir, XDG_CACHE_HOME=tmpdir)
+            env.pop('PYPVCELL_CACHE_DIR', None)
+            subprocess.check_call([sys.executable, '-c', code], cwd=package_dir, env=env)
+            self.assertEqual(os.listdir(tmpdir), [])
+
+            cache_dir = os.path.join(tmpdir, 'pypvcell')
+            env['PYPVCELL_CACHE_DIR'] = cache_dir
+            subprocess.check_call([sys.executable, '-c', code], cwd=package_dir, env=env)
+            self.assertIn('default_spectrum_cache.npz', os.listdir(cache_dir))
+
+    def test_broken_spec_data_cache(self):
+        import pypvcell.illumination as illumination
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_file = os.path.join(tmpdir, 'default_spectrum_cache.npz')
+
+            # a truncated cache that is newer than the text files
+            with open(cache_file, 'wb') as fp:
+                fp.write(b'PK\x03\x04')
+
+            with mock.patch.object(illumination, '_spec_data_cache_file', cache_file), \
+                    mock.patch.object(illumination, '_spec_data', None):
+                self.assertAlmostEqual(load_astm("AM1.5g").rsum(), 1000.370, places=2)
+
+            # the cache is rewritten without leaving temporary files behind
+            self.assertEqual(os.listdir(tmpdir), ['default_spectrum_cache.npz'])
+            with np.load(cache_file) as data:
+                self.assertIn("AM1.5g", data.files)
+
 
 if __name__ == '__main__':
     unittest.main()
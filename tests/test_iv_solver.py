@@ -4,8 +4,10 @@ import scipy.constants as sc
 import matplotlib.pyplot as plt
 import copy
 
+from scipy.optimize import bisect
 from pypvcell.ivsolver import solve_series_connected_ivs, \
-    solve_v_from_j_by_bracket_root_finding, solve_parallel_connected_ivs
+    solve_v_from_j_by_bracket_root_finding, solve_parallel_connected_ivs, find_root_bracket, \
+    solve_v_from_j_adding_epsilon
 from pypvcell.illumination import load_astm
 from pypvcell.solarcell import SQCell, MJCell
 
@@ -64,6 +66,62 @@ class SeriesConnectedCellTestCase(unittest.TestCase):
         plt.ylabel("currnet (A/m^2)")
         plt.show()
 
+    def test_find_root_bracket(self):
+        sq_cell = SQCell(eg=1.42, cell_T=300)
+        sq_cell.set_input_spectrum(load_astm("AM1.5d"))
+
+        current = np.linspace(-300, 150, num=100)
+        solved_v = find_root_bracket(sq_cell.get_j_from_v, current, -23, 5)
+
+        # The same steps as scipy's bisect
+        for v, j in zip(solved_v, current):
+            self.assertEqual(v, bisect(lambda x: sq_cell.get_j_from_v(x) - j, -23, 5))
+
+        # No root in the bracket
+        self.assertTrue(np.isnan(find_root_bracket(sq_cell.get_j_from_v, 1e10, -1, 1)))
+
+        solved_iv = solve_v_from_j_adding_epsilon(sq_cell.get_j_from_v, current, find_root_bracket, epsilon=0.1)
+        self.assertEqual(solved_iv.shape, (200, 2))
+        assert np.array_equal(solved_iv,
+                              solve_v_from_j_adding_epsilon(sq_cell.get_j_from_v, current, bisect, epsilon=0.1))
+        assert np.allclose(sq_cell.get_j_from_v(solved_iv[:, 0]), solved_iv[:, 1], atol=1e-6)
+
+        solved_iv = solve_v_from_j_by_bracket_root_finding(sq_cell.get_j_from_v, current, -23, 5, find_root_bracket)
+        assert np.array_equal(solved_iv,
+                              solve_v_from_j_by_bracket_root_finding(sq_cell.get_j_from_v, current, -23, 5, bisect))
+
+        # No current can be solved
+        solved_iv = solve_v_from_j_adding_epsilon(sq_cell.get_j_from_v, [1e10], find_root_bracket, 0,
+                                                  v_min=-1, v_max=1)
+        self.assertEqual(solved_iv.shape, (0,))
+
+    def test_find_root_bracket_fallback(self):
+        sq_cell = SQCell(eg=1.42, cell_T=300)
+        sq_cell.set_input_spectrum(load_astm("AM1.5d"))
+        current = np.linspace(-300, 150, num=10)
+        expected = solve_v_from_j_adding_epsilon(sq_cell.get_j_from_v, current, bisect, epsilon=0)
+
+        # An I(V) function that only takes scalars
+        def scalar_iv(v):
+            if np.ndim(v) != 0:
+                raise ValueError("only scalar voltages are supported")
+            return sq_cell.get_j_from_v(v)
+
+        assert np.array_equal(solve_v_from_j_adding_epsilon(scalar_iv, current, find_root_bracket, epsilon=0),
+                              expected)
+        assert np.array_equal(solve_v_from_j_by_bracket_root_finding(scalar_iv, current, -23, 5, find_root_bracket),
+                              expected.T)
+
+        # An I(V) function that raises for some of the currents only drops those currents
+        def failing_iv(v):
+            j = sq_cell.get_j_from_v(v)
+            if np.any(np.abs(j - current[3]) < 1e-3):
+                raise ValueError("out of range")
+            return j
+
+        solved_iv = solve_v_from_j_adding_epsilon(failing_iv, current, find_root_bracket, epsilon=0)
+        assert np.array_equal(solved_iv, np.delete(expected, 3, axis=0))
+
     def test_mj_cell_iv(self):
         """
         Test solving multi-junction cells, by breaking it down into series-connected subcells.
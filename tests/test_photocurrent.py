@@ -1,9 +1,10 @@
 __author__ = 'kanhua'
 
 import unittest
-from pypvcell.photocurrent import conv_abs_to_qe, calc_jsc, gen_step_qe, calc_jsc_from_eg,lambert_abs
-from pypvcell.illumination import Illumination
-from pypvcell.spectrum import Spectrum
+from pypvcell.photocurrent import conv_abs_to_qe, calc_jsc, gen_step_qe, calc_jsc_from_eg,lambert_abs, calc_jsc_matrix, \
+    lambert_abs_sweep, calc_jsc_thickness_sweep, calc_jsc_from_eg_with_grad, calc_jsc_with_grad
+from pypvcell.illumination import Illumination, load_astm
+from pypvcell.spectrum import Spectrum, SpectrumBatch
 import numpy as np
 import matplotlib.pyplot as plt
 
@@ -59,6 +60,60 @@ class MyTestCase(unittest.TestCase):
 
         assert np.isclose(jsc, jsc2, rtol=5.e-3)
 
+    def test_calc_jsc_from_eg_array(self):
+        ill = load_astm("AM1.5g")
+        egs = np.linspace(0.6, 3.0, num=25)
+
+        jscs = calc_jsc_from_eg(ill, egs)
+        self.assertEqual(jscs.shape, egs.shape)
+
+        for eg, jsc in zip(egs, jscs):
+            self.assertAlmostEqual(jsc, calc_jsc_from_eg(ill, eg))
+            assert np.isclose(jsc, calc_jsc(ill, gen_step_qe(eg, 1)), rtol=5.e-3)
+
+    def test_calc_jsc_matrix(self):
+        ill = load_astm("AM1.5g")
+        batch = SpectrumBatch.from_spectra([ill, load_astm("AM1.5d")]) * np.array([[1.0], [2.0]])
+        illuminations = [ill, load_astm("AM0"), batch]
+
+        qes = [gen_step_qe(1.1, 0.9), gen_step_qe(1.9, 0.8),
+               Spectrum(np.linspace(300, 900, num=50), np.linspace(0.2, 0.9, num=50), x_unit='nm')]
+
+        jscs = calc_jsc_matrix(illuminations, qes)
+        self.assertEqual(jscs.shape, (3, 4))
+
+        spectra = [ill, load_astm("AM0"), batch[0], batch[1]]
+        for i, qe in enumerate(qes):
+            expected = np.array([calc_jsc(sp, qe) for sp in spectra])
+            # each QE alone is integrated on the same grid as calc_jsc()
+            assert np.allclose(calc_jsc_matrix(illuminations, qe)[0], expected, rtol=1e-12)
+            assert np.allclose(jscs[i], expected, rtol=1e-6)
+
+    def test_jsc_with_grad(self):
+        ill = load_astm("AM1.5g")
+
+        egs = np.array([0.7, 1.1, 1.42, 1.8, 2.5])
+        jsc, djsc_deg = calc_jsc_from_eg_with_grad(ill, egs)
+        assert np.allclose(jsc, calc_jsc_from_eg(ill, egs))
+
+        h = 1e-6
+        fd = (calc_jsc_from_eg(ill, egs + h) - calc_jsc_from_eg(ill, egs - h)) / (2 * h)
+        assert np.allclose(djsc_deg, fd, rtol=1e-6)
+
+        # The derivative is zero outside the range of the spectrum
+        self.assertEqual(calc_jsc_from_eg_with_grad(ill, 10)[1], 0)
+
+        wl = np.linspace(300, 1100, num=80)
+        qe = Spectrum(wl, np.clip((1100 - wl) / 600, 0, 0.95), x_unit='nm')
+        jsc, djsc_dqe = calc_jsc_with_grad(ill, qe)
+        self.assertAlmostEqual(jsc / calc_jsc(ill, qe), 1, places=12)
+
+        qx, qy = qe.get_spectrum('m')
+        dqe = np.zeros_like(qy)
+        dqe[40] = 1e-3
+        fd = (calc_jsc(ill, Spectrum(qx, qy + dqe, x_unit='m')) - jsc) / 1e-3
+        self.assertAlmostEqual(djsc_dqe[40] / fd, 1, places=8)
+
     def test_lambert_abs(self):
 
         abs_file='./si_alpha.csv'
@@ -74,8 +129,33 @@ class MyTestCase(unittest.TestCase):
         for i in range(10):
             self.assertEqual(T[np.random.randint(abs_array.shape[0])],np.exp(-0.5))
 
+    def test_thickness_sweep(self):
+
+        abs_array = np.loadtxt('./si_alpha.csv', delimiter=',')
+        si_abs = Spectrum(abs_array[:, 0], abs_array[:, 1], x_unit='m')
+        window_abs = Spectrum(abs_array[:, 0], np.full(abs_array.shape[0], 1e5), x_unit='m')
+        ill = load_astm("AM1.5g")
+
+        si_t = np.logspace(-7, -4, num=7)
+        window_t = np.linspace(0, 1e-5, num=4)
+
+        qes = conv_abs_to_qe(si_abs, si_t)
+        self.assertEqual(len(qes), si_t.size)
+        assert np.allclose(qes.core_y[3], conv_abs_to_qe(si_abs, si_t[3]).core_y)
+
+        t = lambert_abs_sweep([window_abs, si_abs], [window_t[:, np.newaxis], si_t])
+        self.assertEqual(t.shape, (4, 7, abs_array.shape[0]))
+        assert np.allclose(t[2, 5], lambert_abs([window_abs, si_abs], [window_t[2], si_t[5]]))
 
+        jsc = calc_jsc_thickness_sweep(ill, [si_abs], [si_t], chunk_size=3)
+        for i in range(si_t.size):
+            self.assertAlmostEqual(jsc[i] / calc_jsc(ill, conv_abs_to_qe(si_abs, si_t[i])), 1, places=10)
 
+        jsc = calc_jsc_thickness_sweep(ill, [window_abs, si_abs], [window_t[:, np.newaxis], si_t], layer=1)
+        self.assertEqual(jsc.shape, (4, 7))
+        x, alpha = si_abs.get_spectrum('m')
+        qe = Spectrum(x, np.exp(-1e5 * window_t[2]) * (1 - np.exp(-alpha * si_t[5])), x_unit='m')
+        self.assertAlmostEqual(jsc[2, 5] / calc_jsc(ill, qe), 1, places=10)
 
 
 if __name__ == '__main__':
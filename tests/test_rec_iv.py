@@ -71,6 +71,59 @@ class MyTestCase(unittest.TestCase):
         assert np.all(np.isclose(ia,ib,rtol=rtol))
         print("passed the I-V test, the error is within %s"%rtol)
 
+    def test_j01_from_qe_exact(self):
+        """
+        Compare the exact integration of QE in calculate_j01_from_qe() with the trapz() integration on a fine grid
+        """
+
+        energy = np.linspace(0.5, 4, num=300)
+
+        # a smooth QE, and a QE that drops below the threshold in the middle
+        qes = [Spectrum(energy, 0.9 / (1 + np.exp(-(energy - 1.2) / 0.03)), 'eV'),
+               Spectrum(energy, np.abs(np.sin(energy * 5)), 'eV')]
+
+        for qe in qes:
+            a = calculate_j01_from_qe(qe)
+            b = calculate_j01_from_qe(qe, method='trapz', step_in_ev=1e-6)
+            self.assertTrue(np.isclose(a, b, rtol=1e-4))
+
+            # memoized result
+            self.assertEqual(a, calculate_j01_from_qe(qe))
+
+            a = calculate_j01_from_qe(qe, T=320)
+            b = calculate_j01_from_qe(qe, T=320, method='trapz')
+            self.assertTrue(np.isclose(a, b, rtol=1e-4))
+
+        self.assertRaises(ValueError, calculate_j01_from_qe, qes[0], method='simpson')
+
+    def test_j01_from_eg_array(self):
+        """
+        calculate_j01() broadcasts arrays of band gaps, temperatures and refractive indices,
+        and the exact Bose-Einstein integral matches the numerical integration
+        """
+
+        eg = np.linspace(0.1, 3, num=10)[:, np.newaxis, np.newaxis]
+        temperature = np.array([200, 300, 400])[np.newaxis, :, np.newaxis]
+        n_c = np.array([1, 3.5])
+
+        for exact in (False, True):
+            j01 = calculate_j01(eg, temperature, 1, n_c=n_c, exact=exact)
+            self.assertEqual(j01.shape, (10, 3, 2))
+
+            for i, j, k in np.ndindex(*j01.shape):
+                self.assertTrue(np.isclose(j01[i, j, k], calculate_j01(eg[i, 0, 0], temperature[0, j, 0], 1,
+                                                                       n_c=n_c[k], exact=exact), rtol=1e-12))
+
+        for test_eg in (0.1, 1.1):
+            qe = Spectrum(np.array([test_eg, 10]), np.array([1, 1]), 'eV')
+            a = calculate_j01(test_eg, 300, 1, exact=True)
+            b = calculate_j01_from_qe(qe, threshold=0)
+            self.assertTrue(np.isclose(a, b, rtol=1e-10))
+
+        # the Boltzmann approximation is good for large band gaps only
+        self.assertTrue(np.isclose(calculate_j01(1.1, 300, 1), calculate_j01(1.1, 300, 1, exact=True), rtol=1e-12))
+        self.assertFalse(np.isclose(calculate_j01(0.1, 300, 1), calculate_j01(0.1, 300, 1, exact=True), rtol=1e-3))
+
     def test_i_from_v(self):
 
         j01=calculate_j01(1.42,300,1)
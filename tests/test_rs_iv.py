@@ -7,7 +7,8 @@ __author__ = 'kanhua'
 import unittest
 import numpy as np
 import matplotlib.pyplot as plt
-from pypvcell.ivsolver import gen_rec_iv_with_rs_by_newton, gen_rec_iv
+from pypvcell.ivsolver import gen_rec_iv_with_rs_by_newton, gen_rec_iv, gen_rec_iv_with_rs_by_lambertw, \
+    solve_v_from_j_with_rs, one_diode_j_from_v, one_diode_v_from_j, gen_rec_iv_batch, solve_v_from_j_batch
 
 
 I01_array = (1e-20, 1e-18, 1e-17)
@@ -87,6 +88,104 @@ class MyTestCase(unittest.TestCase):
         plt.legend(["with resistance", "no resistance"], loc='best')
         plt.close()
 
+    def test_lambertw_iv(self):
+
+        testv = np.linspace(-1, 1.6, num=50)
+
+        # Rs=0 reduces to gen_rec_iv()
+        _, testj_rs = gen_rec_iv_with_rs_by_lambertw(I01_array[0], I02_array[0], 1, 2, 300, 1e20, 0, testv,
+                                                     jsc=140000)
+        _, testj_no_rs = gen_rec_iv(I01_array[0], I02_array[0], 1, 2, 300, 1e20, testv, jsc=140000)
+        assert np.allclose(testj_rs, testj_no_rs, rtol=1e-12)
+
+        vt = 1.380649e-23 * 300 / 1.602176634e-19
+
+        def is_solved(j, j01, j02, rs, rsh):
+            # the residual of the diode equation is at the rounding error of either the current or the voltage,
+            # which is amplified by the slope dJ/dV of the diode and the series resistance
+            x = testv - rs * j
+            expected = j01 * np.expm1(x / vt) + j02 * np.expm1(x / (2 * vt)) + x / rsh - 140000
+            slope = j01 * np.exp(x / vt) / vt + j02 * np.exp(x / (2 * vt)) / (2 * vt) + 1 / rsh
+            return np.all(np.abs(j - expected) < np.maximum(1e-12 * np.abs(j), 1e-12 * slope * (1 + rs * slope)))
+
+        for rs in [1e-7, 1.5e-6, 1e-3]:
+            for rsh in [np.inf, 1e3]:
+                # the solved currents satisfy the diode equation
+                _, j = one_diode_j_from_v(I01_array[0], 1, 300, rsh, rs, testv, jsc=140000)
+                assert is_solved(j, I01_array[0], 0, rs, rsh)
+
+                _, j = gen_rec_iv_with_rs_by_lambertw(I01_array[0], I02_array[0], 1, 2, 300, rsh, rs, testv,
+                                                      jsc=140000)
+                assert is_solved(j, I01_array[0], I02_array[0], rs, rsh)
+
+                # V(I) inverts I(V) in forward bias
+                dark_v = np.linspace(0.2, 1.6, num=50)
+                _, j = one_diode_j_from_v(I01_array[0], 1, 300, rsh, rs, dark_v)
+                v, _ = one_diode_v_from_j(I01_array[0], 1, 300, rsh, rs, j)
+                assert np.allclose(v, dark_v, rtol=1e-9)
+
+                _, j = gen_rec_iv_with_rs_by_lambertw(I01_array[0], I02_array[0], 1, 2, 300, rsh, rs, dark_v)
+                v, _ = solve_v_from_j_with_rs(I01_array[0], I02_array[0], 1, 2, 300, rsh, rs, j)
+                assert np.allclose(v, dark_v, rtol=1e-9)
+
+        # agree with the Newton solver
+        _, testj_1 = gen_rec_iv_with_rs_by_newton(I01_array[0], I02_array[0], 1, 2, 300, 1e20, 1.5e-6, testv,
+                                                  jsc=140000, verbose=False)
+        _, testj_2 = gen_rec_iv_with_rs_by_lambertw(I01_array[0], I02_array[0], 1, 2, 300, 1e20, 1.5e-6, testv,
+                                                    jsc=140000)
+        assert np.allclose(testj_1, testj_2, rtol=1e-3)
+
+        # no overflow at large voltages
+        _, j = one_diode_j_from_v(I01_array[0], 1, 300, 1e20, 1e-3, np.array([5.0, 100.0]))
+        assert np.all(np.isfinite(j))
+
+        # no solution below the reverse saturation current without shunt
+        v, _ = one_diode_v_from_j(I01_array[0], 1, 300, np.inf, 0, np.array([-1.0, 1.0]))
+        assert np.isnan(v[0]) and np.isfinite(v[1])
+
+    def test_gen_rec_iv_batch(self):
+
+        j01 = np.array(I01_array)
+        j02 = np.array([I02_array[0], 0, I02_array[2]])
+        temperature = np.array([280, 300, 320])
+        rshunt = np.array([np.inf, 1e20, 1e3])
+        rseries = np.array([0, 1.5e-6, 1e-3])
+        jsc = np.array(jsc_array) * 1000
+
+        testv = np.linspace(-1, 1.6, num=50)
+        v, j = gen_rec_iv_batch(j01, j02, 1, 2, temperature, rshunt, rseries, testv, jsc)
+        self.assertEqual(j.shape, (3, 50))
+
+        for i in range(3):
+            _, expected = gen_rec_iv_with_rs_by_lambertw(j01[i], j02[i], 1, 2, temperature[i], rshunt[i],
+                                                         rseries[i], testv, jsc[i])
+            assert np.allclose(j[i], expected, rtol=1e-10)
+
+        # Rs=0 is the same as gen_rec_iv()
+        _, expected = gen_rec_iv(j01[0], j02[0], 1, 2, temperature[0], rshunt[0], testv, jsc[0])
+        assert np.allclose(j[0], expected, rtol=1e-12)
+
+        testj = np.linspace(-100, 1000, num=12)
+        v, _ = solve_v_from_j_batch(j01, j02, 1, 2, temperature, rshunt, rseries, testj)
+        self.assertEqual(v.shape, (3, 12))
+        _, j = gen_rec_iv_batch(j01, j02, 1, 2, temperature, rshunt, rseries, v[1])
+        assert np.allclose(j[1], testj, rtol=1e-9)
+
+        # the current at the reverse saturation limit without shunt is not reachable
+        assert np.isnan(v[0, 0]) and np.all(np.isfinite(v[0, 1:])) and np.all(np.isfinite(v[1:]))
+
+        # exponentials do not overflow
+        _, j = gen_rec_iv_batch(j01, j02, 1, 2, 300, rshunt, rseries, np.array([50.0]))
+        assert np.all(np.isfinite(j))
+
+        # rseries is broadcast even if all the values are zero
+        for j02_value in [0, I02_array[0]]:
+            _, j = gen_rec_iv_batch(j01[0], j02_value, 1, 2, 300, np.inf, np.zeros(3), testv, jsc[0])
+            self.assertEqual(j.shape, (3, 50))
+            _, j = gen_rec_iv_with_rs_by_lambertw(j01[0], j02_value, 1, 2, 300, np.inf, np.zeros((3, 1)), testv)
+            self.assertEqual(j.shape, (3, 50))
+            self.assertRaises(ValueError, gen_rec_iv_batch, j01, j02_value, 1, 2, 300, np.inf, np.zeros(2), testv)
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -3,8 +3,9 @@ import numpy as np
 import matplotlib.pyplot as plt
 
 from pypvcell.illumination import load_astm
-from pypvcell.solarcell import SQCell, MJCell, DBCell
+from pypvcell.solarcell import SQCell, MJCell, DBCell, TransparentCell
 from pypvcell.photocurrent import gen_step_qe
+from pypvcell.spectrum import Spectrum
 
 
 class SolarCellTestCase(unittest.TestCase):
@@ -49,6 +50,55 @@ class SolarCellTestCase(unittest.TestCase):
 
         print("3J eta: %s" % tj_cell.get_eta())
 
+    def test_mj_cascade(self):
+
+        wl = np.linspace(200, 5000, num=300)
+        qe = Spectrum(wl, np.clip((1100 - wl) / 600, 0, 0.95), x_unit='nm')
+
+        def make_cells():
+            return [SQCell(eg=1.9, cell_T=293), TransparentCell(), DBCell(qe, rad_eta=1, T=293),
+                    SQCell(eg=0.7, cell_T=293)]
+
+        for ill in [self.input_ill, load_astm("AM1.5d") * 30]:
+            # Propagate the spectrum through the subcells one by one
+            cells = make_cells()
+            filtered = ill
+            for cell in cells:
+                cell.set_input_spectrum(filtered)
+                filtered = cell.get_transmit_spectrum()
+
+            mj_cells = make_cells()
+            mj_cell = MJCell(mj_cells)
+            mj_cell.set_input_spectrum(ill)
+
+            for cell, mj_subcell in zip(cells, mj_cells):
+                if isinstance(cell, TransparentCell):
+                    self.assertEqual(mj_subcell.jsc, 0)
+                else:
+                    self.assertAlmostEqual(mj_subcell.jsc / cell.jsc, 1, places=12)
+                self.assertAlmostEqual(mj_subcell.ill.rsum() / cell.ill.rsum(), 1, places=12)
+
+            assert np.allclose(mj_cell.get_transmit_spectrum().core_y, filtered.core_y, rtol=1e-12, atol=0)
+
+    def test_mj_cascade_subclass(self):
+
+        class HalfTransmitSQCell(SQCell):
+            def get_transmit_spectrum(self):
+                return super().get_transmit_spectrum() * 0.5
+
+        top_cell = HalfTransmitSQCell(eg=1.9, cell_T=293)
+        top_cell.set_input_spectrum(self.input_ill)
+        bottom_cell = SQCell(eg=1.1, cell_T=293)
+        bottom_cell.set_input_spectrum(top_cell.get_transmit_spectrum())
+
+        mj_cell = MJCell([HalfTransmitSQCell(eg=1.9, cell_T=293), SQCell(eg=1.1, cell_T=293)])
+        mj_cell.set_input_spectrum(self.input_ill)
+
+        # The overridden get_transmit_spectrum() is used instead of the cascade terms of SQCell
+        self.assertAlmostEqual(mj_cell.subcell[1].jsc / bottom_cell.jsc, 1, places=12)
+        self.assertAlmostEqual(mj_cell.get_transmit_spectrum().rsum() / bottom_cell.get_transmit_spectrum().rsum(), 1,
+                               places=12)
+
     def test_dbcell(self):
 
         gaas_qe = gen_step_qe(1.42, 1)
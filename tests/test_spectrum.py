@@ -1,10 +1,13 @@
 __author__ = 'kanhua'
 
 import unittest
+import os
+import tempfile
 import numpy as np
-from pypvcell.spectrum import Spectrum, _energy_to_length
+from pypvcell.spectrum import Spectrum, LazySpectrum, _energy_to_length, _get_conversion_plan, \
+    get_resampler, _freeze, _array_key, save_spectra, load_spectra, SpectrumBatch
 import scipy.constants as sc
-from pypvcell.photocurrent import gen_step_qe
+from pypvcell.photocurrent import gen_step_qe, calc_jsc
 from pypvcell.illumination import Illumination
 #import matplotlib.pyplot as plt
 from pint import UnitRegistry
@@ -117,6 +120,27 @@ class SpectrumTestCases(unittest.TestCase):
 
         self.assertTrue(np.isclose(area_before_conv, area_after_conv * 10000, rtol=1e-2))
 
+    def test_conversion_plan(self):
+        """
+        Test that the cached conversion plans give the same results as converting with pint
+        """
+
+        plan = _get_conversion_plan('nm', 'cm**-1', 'm**-2', 'cm**-2', True)
+
+        # The plan should be resolved only once
+        self.assertIs(plan, _get_conversion_plan('nm', 'cm**-1', 'm**-2', 'cm**-2', True))
+
+        x_data = np.linspace(300, 1000, num=10)
+        y_data = np.linspace(1, 2, num=10)
+
+        new_x_data, new_y_data = plan.apply(x_data, y_data)
+
+        x_q = (1 / (x_data * ug.nm)).to(ug.parse_units('cm**-1')).m
+        y_q = ug.convert(y_data, 'm**-2', 'cm**-2') * 1e7 / x_q ** 2
+
+        self.assertTrue(np.allclose(new_x_data, x_q))
+        self.assertTrue(np.allclose(new_y_data, y_q))
+
     def test_1(self):
         spectrum = self.spec_base.get_spectrum(to_x_unit="nm", to_y_area_unit='m**-2')
         assert np.all(np.isclose(spectrum[0, :], self.init_wl))
@@ -283,6 +307,275 @@ class SpectrumTestCases(unittest.TestCase):
 
         self.assertTrue(np.allclose(s4.core_y, s4_c.core_y))
 
+    def test_arith_op_shares_x(self):
+        init_wl = np.linspace(300, 500, num=10)
+        init_spec = np.ones(init_wl.shape)
+
+        s1 = Spectrum(init_wl, init_spec, 'nm', is_photon_flux=False)
+        s2 = Spectrum(init_wl, init_spec * 0.5, 'nm', is_photon_flux=False)
+
+        for s3 in [s1 * 2, 1 - s1, 1 / s1, s1 * s2]:
+            self.assertIs(s3.core_x, s1.core_x)
+            self.assertTrue(np.all(s1.core_y == 1))
+
+        # core arrays are read-only, new values have to be assigned as new arrays
+        with self.assertRaises(ValueError):
+            s1.core_x[0] = 0
+        with self.assertRaises(ValueError):
+            s1.core_y[0] = 0
+
+        # assigning an array keeps the caller's array writable and independent of the spectrum
+        new_y = np.full(init_wl.shape, 2.0)
+        s1.core_y = new_y
+        new_y[0] = 5
+        self.assertEqual(s1.core_y[0], 2)
+
+        base = np.full(2 * init_wl.size, 3.0)
+        s1.core_y = base[::2]
+        base[:] = 0
+        self.assertTrue(np.all(s1.core_y == 3))
+
+        # immutable arrays are shared instead of copied
+        s2.core_y = s1.core_y
+        self.assertIs(s2.core_y, s1.core_y)
+
+    def test_cached_views(self):
+        init_wl = np.linspace(300, 500, num=10)
+        init_spec = np.ones(init_wl.shape)
+
+        s1 = Spectrum(init_wl, init_spec, 'nm', is_photon_flux=False)
+
+        view = s1.get_spectrum('eV', to_photon_flux=True)
+        self.assertIs(view, s1.get_spectrum('eV', to_photon_flux=True))
+        self.assertIsNot(view, s1.get_spectrum('eV', to_photon_flux=False))
+
+        # Assigning new values clears the cache
+        s1.core_y = init_spec * 2
+        self.assertTrue(np.allclose(s1.get_spectrum('eV', to_photon_flux=True)[1, :], view[1, :] * 2))
+
+        s1.set_spectrum(init_wl, init_spec * 3, x_unit='nm', y_area_unit='',
+                        is_photon_flux=False, is_spec_density=False)
+        self.assertTrue(np.allclose(s1.get_spectrum('eV', to_photon_flux=True)[1, :], view[1, :] * 3))
+
+        # Derived spectra do not share the cache with the parent
+        s2 = s1 * 2
+        self.assertTrue(np.allclose(s2.get_spectrum('nm')[1, :], 6))
+        self.assertTrue(np.allclose(s1.get_spectrum('nm')[1, :], 3))
+
+    def test_lazy_arith_op(self):
+        ill = Illumination("AM1.5g")
+        qe1 = gen_step_qe(1.9, 0.9)
+        qe2 = gen_step_qe(1.42, 0.8)
+
+        eager = ill * (1 - qe1) * (1 - qe2) * 0.5 + ill / 4
+        lazy = ill.lazy() * (1 - qe1) * (1 - qe2) * 0.5 + ill / 4
+
+        self.assertIsInstance(lazy, LazySpectrum)
+        self.assertFalse(lazy.is_evaluated)
+
+        self.assertTrue(np.isclose(lazy.rsum(), eager.rsum()))
+        self.assertTrue(lazy.is_evaluated)
+        self.assertTrue(np.allclose(lazy.get_spectrum('eV'), eager.get_spectrum('eV')))
+        self.assertIs(lazy.core_x, ill.core_x)
+
+        # A concrete spectrum on the left also builds a lazy expression
+        lazy2 = ill * (1 - qe1.lazy())
+        self.assertIsInstance(lazy2, LazySpectrum)
+        self.assertTrue(np.allclose(lazy2.core_y, (ill * (1 - qe1)).core_y))
+
+        mat = lazy.materialize()
+        self.assertIsInstance(mat, Illumination)
+        self.assertTrue(np.allclose(mat.core_y, eager.core_y))
+
+    def test_resampler(self):
+        src_x = _freeze(np.linspace(300, 1200, num=50))
+        dst_x = _freeze(np.linspace(250, 1300, num=200))
+        y = np.sin(src_x / 100)
+
+        resampler = get_resampler(src_x, dst_x)
+        self.assertIs(resampler, get_resampler(src_x, dst_x))
+
+        assert np.allclose(resampler.resample(y), np.interp(dst_x, src_x, y))
+        assert np.allclose(resampler.resample(y, left=0, right=0), np.interp(dst_x, src_x, y, left=0, right=0))
+        assert np.allclose(resampler.matrix(left=0, right=0).dot(y), np.interp(dst_x, src_x, y, left=0, right=0))
+
+        ys = np.vstack((y, 2 * y))
+        assert np.allclose(resampler.resample(ys)[1, :], 2 * np.interp(dst_x, src_x, y))
+
+        weights = np.vstack((np.cos(dst_x), np.ones_like(dst_x)))
+        assert np.allclose(resampler.transpose_dot(weights).dot(y), weights.dot(resampler.resample(y)))
+        assert np.allclose(resampler.transpose_dot(weights[0]), resampler.matrix().T.dot(weights[0]))
+
+        s1 = Spectrum(src_x, y, x_unit='nm')
+        s2 = Spectrum(dst_x, np.ones_like(dst_x), x_unit='nm')
+        interp = s1.get_interp_spectrum(s2.core_x, 'm', interp_left=0, interp_right=0, raise_error=False)
+        assert np.allclose(interp[1, :], np.interp(s2.core_x, s1.core_x, y, left=0, right=0))
+
+    def test_array_key(self):
+        frozen = Spectrum(np.linspace(300, 1200, num=50), np.ones(50), x_unit='nm').core_x
+        self.assertEqual(_array_key(frozen)[0], 'mem')
+        self.assertEqual(_array_key(frozen[::2])[0], 'mem')
+
+        # Arrays that are read-only but not frozen by pypvcell can be changed, so they are keyed by their values
+        array = np.linspace(300, 1200, num=50)
+        array.flags.writeable = False
+        key = _array_key(array)
+        self.assertEqual(key[0], 'hash')
+        array.flags.writeable = True
+        array[0] = 0
+        array.flags.writeable = False
+        self.assertNotEqual(_array_key(array), key)
+
+        self.assertEqual(_array_key(np.frombuffer(b'\0' * 80))[0], 'hash')
+
+        # A frozen view of a writable array is not immutable either
+        self.assertEqual(_array_key(_freeze(np.ones(10)[::2]))[0], 'hash')
+
+    def test_band_integral(self):
+        ill = Illumination("AM1.5g")
+
+        for start, end, unit in [(400, 1000, 'nm'), (1.1, 2.5, 'eV'), (1e6, 3e6, 'm**-1')]:
+            sp = ill.cut(start, end, unit).get_spectrum(unit)
+            expected = np.trapz(sp[1, :], sp[0, :])
+            self.assertAlmostEqual(ill.band_integral(start, end, unit) / expected, 1.0, places=10)
+
+        # photon flux and many bands at once
+        ends = np.linspace(500, 1500, num=20)
+        values = ill.band_integral(300, ends, 'nm', photon_flux=True)
+        self.assertEqual(values.shape, ends.shape)
+        for end, value in zip(ends, values):
+            sp = ill.cut(300, end, 'nm').get_spectrum('nm', to_photon_flux=True)
+            self.assertAlmostEqual(value / np.trapz(sp[1, :], sp[0, :]), 1.0, places=6)
+
+        # bands outside the spectrum are not counted
+        self.assertAlmostEqual(ill.band_integral(0, 1e5, 'nm') / ill.rsum(), 1.0, places=10)
+
+        qe = gen_step_qe(1.42, 0.9)
+        self.assertRaises(ArithmeticError, qe.band_integral, 300, 500, 'nm')
+
+    def test_compact_dtype(self):
+        ill = Illumination("AM1.5g")
+        ill32 = ill.astype(np.float32)
+        self.assertIsInstance(ill32, Illumination)
+        self.assertEqual(ill32.core_x.dtype, np.float32)
+        self.assertEqual(ill32.core_y.dtype, np.float32)
+
+        self.assertAlmostEqual(ill32.rsum() / ill.rsum(), 1.0, places=6)
+        self.assertAlmostEqual(ill32.band_integral(300, 900, 'nm', photon_flux=True) /
+                               ill.band_integral(300, 900, 'nm', photon_flux=True), 1.0, places=6)
+
+        qe = gen_step_qe(1.42, 0.9)
+        self.assertAlmostEqual(calc_jsc(ill32, qe) / calc_jsc(ill, qe), 1.0, places=6)
+
+        # the results of arithmetic operations are stored in the dtype of the left operand
+        self.assertEqual((ill32 * qe).core_y.dtype, np.float32)
+        self.assertEqual((ill32 * 2).core_y.dtype, np.float32)
+        self.assertEqual((ill * ill32).core_y.dtype, np.float64)
+
+        sp = Spectrum(np.array([1.0, 2.0, 3.0]), np.array([1.0, 2.0, 3.0]), x_unit='eV', dtype=np.float32)
+        self.assertEqual(sp.get_spectrum('eV').dtype, np.float64)
+        self.assertEqual(sp.get_spectrum('eV', dtype=np.float32).dtype, np.float32)
+
+        # The unit conversions are done in double precision on the stored values
+        x32 = ill32.core_x.astype(np.float64)
+        y32 = ill32.core_y.astype(np.float64)
+        expected = ill.convert_spectrum_unit(x32, y32, 'm', 'eV', 'm**-2', 'm**-2', True)
+        flux = ill32.get_spectrum('eV', to_photon_flux=True)
+        assert np.array_equal(flux[0, :], np.sort(expected[0]))
+        assert np.allclose(flux[1, :], ill._as_photon_flux(x32, expected[1])[::-1], rtol=1e-15, atol=0)
+
+        x, y = SpectrumBatch(ill32.core_x, ill32.core_y[np.newaxis, :], x_unit='m', is_spec_density=True,
+                             dtype=np.float32).get_spectrum('eV', to_photon_flux=True)
+        assert np.array_equal(x, flux[0, :]) and np.allclose(y[0], flux[1, :], rtol=1e-15, atol=0)
+        self.assertRaises(ValueError, Spectrum, np.array([1.0]), np.array([1.0]), 'eV', dtype=int)
+
+    def test_save_and_load(self):
+        ill = Illumination("AM1.5g")
+        qe = gen_step_qe(1.42, 0.9)
+        batch = SpectrumBatch.from_spectra([ill, ill * 0.5])
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            file = os.path.join(tmpdir, 'spectrum.npz')
+            ill.save(file)
+            for mmap in [False, True]:
+                loaded = Illumination.load(file, mmap=mmap)
+                self.assertIsInstance(loaded, Illumination)
+                self.assertEqual(loaded.y_area_unit, ill.y_area_unit)
+                self.assertEqual(loaded.is_spec_density, ill.is_spec_density)
+                assert np.array_equal(loaded.get_spectrum('nm'), ill.get_spectrum('nm'))
+
+            file = os.path.join(tmpdir, 'library.npz')
+            save_spectra(file, {'ill': ill, 'ill2': ill * 2, 'qe': qe, 'batch': batch})
+            library = load_spectra(file, mmap=True)
+            self.assertEqual(list(library.keys()), ['ill', 'ill2', 'qe', 'batch'])
+
+            # all the memory-mapped arrays are views of a single mapping of the file
+            def mapping(array):
+                while isinstance(array.base, np.ndarray):
+                    array = array.base
+                return array
+
+            self.assertIsInstance(mapping(library['ill'].core_y), np.memmap)
+            self.assertIs(mapping(library['ill'].core_y), mapping(library['qe'].core_y))
+            self.assertIsInstance(library['batch'], SpectrumBatch)
+            self.assertAlmostEqual(library['ill2'].rsum(), 2 * ill.rsum())
+            assert np.allclose(library['batch'].rsum(), batch.rsum())
+            self.assertAlmostEqual(Spectrum.load(file, name='qe').core_y[0], qe.core_y[0])
+
+            self.assertRaises(ValueError, Spectrum.load, file)
+            self.assertRaises(TypeError, Spectrum.load, file, name='batch')
+
+            del library
+
+    def test_scaled_view(self):
+        ill = Illumination("AM1.5g")
+        qe = gen_step_qe(1.42, 0.9)
+
+        ill_100 = ill.scaled(100)
+        self.assertIsInstance(ill_100, Illumination)
+        self.assertEqual(ill_100.scale, 100)
+        self.assertIs(ill_100.unscaled(), ill)
+        self.assertIs(ill_100.scaled(0.5).unscaled(), ill)
+        self.assertEqual(ill_100.scaled(0.5).scale, 50)
+
+        self.assertAlmostEqual(ill_100.rsum(), 100 * ill.rsum())
+        self.assertAlmostEqual(ill_100.total_power(), 100 * ill.total_power())
+        self.assertAlmostEqual(calc_jsc(ill_100, qe), 100 * calc_jsc(ill, qe))
+        self.assertAlmostEqual(ill_100.band_integral(300, 900, 'nm'), 100 * ill.band_integral(300, 900, 'nm'))
+
+        # The scaled values are available when needed, and other operations give normal spectra
+        assert np.allclose(ill_100.get_spectrum('nm')[1, :], 100 * ill.get_spectrum('nm')[1, :])
+        ill_100_qe = ill_100 * qe
+        self.assertEqual(ill_100_qe.scale, 1.0)
+        assert np.allclose(ill_100_qe.core_y, 100 * (ill * qe).core_y)
+
+        # The original spectrum is not affected
+        self.assertEqual(ill.scale, 1.0)
+        self.assertAlmostEqual(ill.rsum(), Illumination("AM1.5g").rsum())
+
+        # Multiplying by a scalar does not create a view
+        for factor in [100, 0, -1]:
+            ill_times = ill * factor
+            self.assertEqual(ill_times.scale, 1.0)
+            self.assertIs(ill_times.unscaled(), ill_times)
+            assert np.array_equal(ill_times.core_y, ill_100.unscaled().core_y * factor)
+
+        # A view keeps the data that it was created with when the data of the original spectrum are replaced
+        ill_2 = ill.scaled(2)
+        jsc_2 = calc_jsc(ill_2, qe)
+        ill.core_y = ill.core_y * 0
+        self.assertAlmostEqual(ill_2.rsum(), np.trapz(ill_2.core_y, ill_2.core_x))
+        self.assertAlmostEqual(ill_2.rsum(), 2 * Illumination("AM1.5g").rsum())
+        self.assertAlmostEqual(ill_2.band_integral(300, 900, 'nm'),
+                               2 * Illumination("AM1.5g").band_integral(300, 900, 'nm'))
+        self.assertAlmostEqual(calc_jsc(ill_2, qe), jsc_2)
+        self.assertIsNot(ill_2.unscaled(), ill)
+        self.assertEqual(ill.rsum(), 0.0)
+
+        ill_2 = ill_100.scaled(0.02)
+        ill_100.set_spectrum(np.array([300.0, 400.0]), np.array([1.0, 1.0]), 'nm', 'm**-2', False, True)
+        self.assertAlmostEqual(ill_2.rsum(), 2 * Illumination("AM1.5g").rsum())
+
     def test_evnm_conversion(self):
         val = _energy_to_length(1.42, 'eV', 'nm')
 
@@ -0,0 +1,88 @@
+import unittest
+import numpy as np
+from pypvcell.spectrum import Spectrum, SpectrumBatch
+from pypvcell.illumination import load_astm
+
+
+class SpectrumBatchTestCase(unittest.TestCase):
+    def setUp(self):
+        self.wl = np.linspace(300, 1000, num=50)
+        self.scale = np.array([0.5, 1.0, 2.0])
+        self.y = np.outer(self.scale, np.linspace(1, 2, num=50))
+
+        self.batch = SpectrumBatch(self.wl, self.y, x_unit='nm', y_unit='m**-2', is_spec_density=True)
+        self.spectra = [Spectrum(self.wl, self.y[i], x_unit='nm', y_unit='m**-2', is_spec_density=True)
+                        for i in range(self.y.shape[0])]
+
+    def test_get_spectrum(self):
+        for to_x_unit in ['nm', 'eV', 'cm**-1']:
+            for to_photon_flux in [False, True]:
+                x, y = self.batch.get_spectrum(to_x_unit, 'cm**-2', to_photon_flux=to_photon_flux)
+                for i, sp in enumerate(self.spectra):
+                    sp_a = sp.get_spectrum(to_x_unit, 'cm**-2', to_photon_flux=to_photon_flux)
+                    self.assertTrue(np.allclose(x, sp_a[0, :]))
+                    self.assertTrue(np.allclose(y[i], sp_a[1, :]))
+
+    def test_get_interp_spectrum(self):
+        test_x = np.linspace(1.3, 4, num=33)
+        x, y = self.batch.get_interp_spectrum(test_x, 'eV', to_photon_flux=True)
+
+        for i, sp in enumerate(self.spectra):
+            sp_a = sp.get_interp_spectrum(test_x, 'eV', to_photon_flux=True)
+            self.assertTrue(np.allclose(y[i], sp_a[1, :]))
+
+        with self.assertRaises(ValueError):
+            self.batch.get_interp_spectrum(np.array([200, 500]), 'nm')
+
+    def test_rsum(self):
+        expected = np.array([sp.rsum() for sp in self.spectra])
+        self.assertTrue(np.allclose(self.batch.rsum(), expected))
+
+    def test_compact_dtype(self):
+        batch32 = SpectrumBatch(self.wl, self.y, x_unit='nm', y_unit='m**-2', is_spec_density=True,
+                                dtype=np.float32)
+        self.assertEqual(batch32.core_y.dtype, np.float32)
+        self.assertEqual((batch32 * 2).core_y.dtype, np.float32)
+        self.assertEqual(batch32[0].core_y.dtype, np.float32)
+        self.assertTrue(np.allclose(batch32.rsum(), self.batch.rsum(), rtol=1e-6))
+        self.assertEqual(self.batch.astype(np.float32).core_x.dtype, np.float32)
+
+    def test_arith_op(self):
+        ill = load_astm("AM1.5g")
+        qe = Spectrum(np.linspace(200, 1200, num=20), np.linspace(0, 1, num=20), x_unit='nm')
+
+        factors = SpectrumBatch(self.wl, np.vstack((np.ones(50), np.ones(50) * 0.5)), x_unit='nm')
+
+        # Spectrum on the left: evaluated on the grid of the spectrum
+        filtered = ill.cut(400, 900, 'nm') * factors
+        self.assertEqual(len(filtered), 2)
+        self.assertTrue(filtered.is_spec_density)
+        self.assertTrue(np.allclose(filtered.rsum()[1], filtered.rsum()[0] * 0.5))
+
+        # Batch on the left
+        for result, expected in [(self.batch * qe, [sp * qe for sp in self.spectra]),
+                                 (self.batch - qe, [sp - qe for sp in self.spectra]),
+                                 (1 - self.batch, [1 - sp for sp in self.spectra]),
+                                 (2 / self.batch, [2 / sp for sp in self.spectra]),
+                                 (self.batch * self.scale[:, np.newaxis],
+                                  [sp * self.scale[i] for i, sp in enumerate(self.spectra)])]:
+            for i, sp in enumerate(expected):
+                self.assertTrue(np.allclose(result.core_y[i], sp.core_y))
+
+        doubled = self.batch + self.batch
+        self.assertTrue(np.allclose(doubled.rsum(), self.batch.rsum() * 2))
+        self.assertIs(doubled.core_x, self.batch.core_x)
+
+    def test_from_spectra(self):
+        batch = SpectrumBatch.from_spectra(self.spectra)
+
+        self.assertTrue(np.allclose(batch.core_y, self.batch.core_y))
+
+        sp = batch[1]
+        self.assertIsInstance(sp, Spectrum)
+        self.assertTrue(np.isclose(sp.rsum(), self.spectra[1].rsum()))
+        self.assertEqual(len(batch[1:]), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()